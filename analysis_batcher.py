@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+
+from gemini_client import CLIENT_POOL
+from metrics import log
+import prompt_templates
+from prompts import RESPONSE_ANALYSIS_BATCH_PROMPT, RESPONSE_ANALYSIS_BATCH_ITEM
+
+# Keys an analysis must have to be used as is; anything else falls back to an individual call
+REQUIRED_KEYS = ("quality_score", "suggested_action")
+
+
+class _Item:
+    """One conversation's analysis request waiting in a batch."""
+    __slots__ = ("template", "context_vars", "persona_name", "client", "submitted_at", "result", "error", "done")
+
+    def __init__(self, template, context_vars, persona_name, client):
+        self.template = template
+        self.context_vars = context_vars
+        self.persona_name = persona_name
+        self.client = client
+        self.submitted_at = time.monotonic()
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.full = threading.Event()
+
+
+class AnalysisBatcher:
+    """
+    Collects RESPONSE_ANALYSIS_PROMPT requests from concurrent conversations for
+    `window` seconds (or until `max_batch` are waiting) and sends them as one
+    RESPONSE_ANALYSIS_BATCH_PROMPT call returning a JSON array.
+    The first request of a batch waits out the window and makes the call on its
+    own thread; the others block until their result is in. Items missing from a
+    malformed batch response are retried as individual calls.
+    """
+    def __init__(self, window=0.1, max_batch=8):
+        self.window = window
+        self.max_batch = max_batch
+        self._open = None
+        self._lock = threading.Lock()
+        self._metrics = {"batches": 0, "items": 0, "calls": 0, "fallbacks": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+    def analyze(self, template, context_vars, persona_name, client=None):
+        """
+        Returns the analysis dict for one turn, like client.generate_json(template, context_vars).
+        persona_name is the value bound into `template`; `client` is used for the
+        individual fallback call (default: the shared client).
+        """
+        item = _Item(template, context_vars, persona_name, client)
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            batch.items.append(item)
+            if len(batch.items) >= self.max_batch:
+                self._open = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            self._run(batch.items)
+        else:
+            item.done.wait()
+
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["avg_batch_size"] = metrics["items"] / metrics["batches"] if metrics["batches"] else 0.0
+        metrics["avg_added_wait_seconds"] = metrics["wait_total"] / metrics["items"] if metrics["items"] else 0.0
+        metrics["requests_saved"] = metrics["items"] - metrics["calls"]
+        return metrics
+
+    def _run(self, items):
+        dispatched_at = time.monotonic()
+        fallbacks = 0
+        try:
+            try:
+                results = self._call_batch(items) if len(items) > 1 else [None] * len(items)
+            except Exception as e:
+                for item in items:
+                    item.error = e
+                return
+            # Covered items get their result before any fallback call, so a failing fallback only fails its own item
+            for item, result in zip(items, results):
+                item.result = result
+            for item in items:
+                if item.result is not None:
+                    continue
+                # A lone item, or one the batch response did not cover
+                fallbacks += len(items) > 1
+                try:
+                    item.result = self._call_single(item)
+                except Exception as e:
+                    item.error = e
+        finally:
+            with self._lock:
+                self._metrics["batches"] += 1
+                self._metrics["items"] += len(items)
+                self._metrics["calls"] += 1 + fallbacks
+                self._metrics["fallbacks"] += fallbacks
+                for item in items:
+                    wait = dispatched_at - item.submitted_at
+                    self._metrics["wait_total"] += wait
+                    self._metrics["wait_max"] = max(self._metrics["wait_max"], wait)
+            for item in items:
+                item.done.set()
+
+    def _call_batch(self, items):
+        """Returns one analysis dict (or None when missing/malformed) per item."""
+        item_template = prompt_templates.get_template(RESPONSE_ANALYSIS_BATCH_ITEM)
+        rendered_items = "".join(
+            item_template.render({
+                "index": index,
+                "persona_name": item.persona_name,
+                "difficulty": item.context_vars["difficulty"],
+                "last_question": item.context_vars["last_question"],
+                "user_response": item.context_vars["user_response"],
+            })
+            for index, item in enumerate(items, 1)
+        )
+        response = CLIENT_POOL.get().generate_json(
+            RESPONSE_ANALYSIS_BATCH_PROMPT, {"count": len(items), "items": rendered_items}, use_cache=False
+        )
+        if not isinstance(response, list):
+            log(f"Analysis batch of {len(items)} returned no array; falling back to individual calls.")
+            return [None] * len(items)
+
+        results = [None] * len(items)
+        for position, result in enumerate(response):
+            if not isinstance(result, dict) or not all(key in result for key in REQUIRED_KEYS):
+                continue
+            index = result.pop("item", position + 1)
+            if isinstance(index, int) and 1 <= index <= len(items) and results[index - 1] is None:
+                results[index - 1] = result
+        return results
+
+    @staticmethod
+    def _call_single(item):
+        return (item.client or CLIENT_POOL.get()).generate_json(item.template, item.context_vars)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """
+    The process-wide batcher, or None when batching is off.
+    Configured by ANALYSIS_BATCH_WINDOW_MS (0 disables batching) and ANALYSIS_BATCH_SIZE.
+    """
+    global _batcher
+    window_ms = float(os.environ.get("ANALYSIS_BATCH_WINDOW_MS", "0"))
+    if window_ms <= 0:
+        return None
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = AnalysisBatcher(
+                    window=window_ms / 1000,
+                    max_batch=int(os.environ.get("ANALYSIS_BATCH_SIZE", "8")),
+                )
+    return _batcher
@@ -0,0 +1,366 @@
+"""
+Columnar export of completed assessments.
+
+Every report produced by RESULT_GENERATION_PROMPT becomes one row: completion
+time, interview duration, persona, question and answer counts, and the score of
+each assessment dimension (NaN when the report has none). Rows are buffered and
+appended in batches, ANALYTICS_BATCH rows or every ANALYTICS_FLUSH seconds,
+whichever comes first, by a background thread.
+
+The store is a directory under ANALYTICS_DIR with one raw little-endian file per
+column (`<column>.bin`) and `personas.txt`, the dictionary the persona column's
+codes index into. Writers in different processes take an exclusive lock on
+`.lock` around each batch. A batch cut short by a crash leaves some columns
+longer than others; readers only see the rows every column has, and the next
+batch truncates the partial tail away.
+
+Queries memory-map only the columns they use and aggregate them with numpy, so
+millions of assessments are summarized without building a Python object per row:
+
+    python analytics.py --dir analytics [--since-days 30] [--json]
+    python analytics.py --dir analytics --backfill conversations.db
+
+Requires numpy; without it the export is disabled (like the WebSocket transport
+without flask-sock).
+"""
+import argparse
+import atexit
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # The analytics export is optional (pip install numpy)
+    np = None
+
+from metrics import log
+
+# Report score keys (see RESULT_GENERATION_PROMPT), one float32 column each
+SCORE_COLUMNS = ("logical_thinking", "communication", "adaptability")
+# Column name -> numpy dtype of its file
+COLUMNS = {
+    "completed_at": "<f8",  # Unix time the report was recorded
+    "duration": "<f4",  # Seconds from the start of the conversation to the report
+    "persona": "<u2",  # Index into personas.txt
+    "questions": "<u2",
+    "answers": "<u2",
+    **{name: "<f4" for name in SCORE_COLUMNS},
+}
+# Percentiles reported by default
+PERCENTILES = (10, 50, 90)
+
+
+class AnalyticsWriter:
+    """Buffers assessment rows and appends them to the column files in batches."""
+    def __init__(self, directory, batch_size=256, flush_interval=30.0):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._oldest = 0.0
+        self._writing = False
+        self._flush_requested = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {"recorded": 0, "written": 0, "batches": 0, "errors": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, row):
+        """Queues one row: a dict with a value for every column, persona as the persona id."""
+        with self._cond:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(row)
+            self._stats["recorded"] += 1
+            # Wakes the writer to start the flush interval, or to write a full batch
+            if len(self._rows) == 1 or len(self._rows) >= self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self, timeout=10.0):
+        """Writes every queued row now; blocks until they are on disk. Returns False if that took longer than `timeout`."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._rows or self._writing:
+                left = deadline - time.monotonic()
+                if left <= 0 or not self._thread.is_alive():
+                    log(f"[analytics] Gave up flushing {len(self._rows)} buffered assessments")
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def close(self, timeout=10.0):
+        """Flushes and stops the writer thread; never blocks shutdown for much longer than `timeout`."""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            return {**self._stats, "buffered": len(self._rows)}
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (self._closed or self._flush_requested or len(self._rows) >= self.batch_size):
+                    if not self._rows:
+                        self._cond.wait()
+                        continue
+                    left = self._oldest + self.flush_interval - time.monotonic()
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)
+                self._flush_requested = False
+                if not self._rows:
+                    if self._closed:
+                        return
+                    continue
+                rows, self._rows = self._rows, []
+                self._writing = True
+            written, batches, errors = 0, 0, 1
+            try:
+                append(self.directory, rows)
+                written, batches, errors = len(rows), 1, 0
+            except Exception as e:
+                # The batch is dropped; the thread must live on, or flush() and close() would wait for it
+                log(f"[analytics] Error writing {len(rows)} assessments: {e!r}")
+            finally:
+                with self._cond:
+                    self._stats["written"] += written
+                    self._stats["batches"] += batches
+                    self._stats["errors"] += errors
+                    self._writing = False
+                    self._cond.notify_all()
+
+
+def append(directory, rows):
+    """Appends rows to the store in one locked batch."""
+    with open(os.path.join(directory, ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        codes = _persona_codes(directory, [row["persona"] for row in rows])
+        length = _row_count(directory)
+        for name, dtype in COLUMNS.items():
+            values = codes if name == "persona" else [row[name] for row in rows]
+            data = np.asarray(values, dtype=dtype).tobytes()
+            path = _column_path(directory, name)
+            with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+                # Drop rows a crashed batch left in some columns only
+                f.truncate(length * np.dtype(dtype).itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def _persona_codes(directory, persona_ids):
+    """Dictionary codes for persona ids, adding new ids to personas.txt (caller holds the lock)."""
+    personas = _read_personas(directory)
+    index = {persona_id: code for code, persona_id in enumerate(personas)}
+    new = []
+    for persona_id in persona_ids:
+        if persona_id not in index:
+            index[persona_id] = len(index)
+            new.append(persona_id)
+    if new:
+        with open(os.path.join(directory, "personas.txt"), "a", encoding="utf-8") as f:
+            f.writelines(f"{persona_id}\n" for persona_id in new)
+    return [index[persona_id] for persona_id in persona_ids]
+
+
+def _read_personas(directory):
+    path = os.path.join(directory, "personas.txt")
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def _column_path(directory, name):
+    return os.path.join(directory, f"{name}.bin")
+
+
+def _row_count(directory):
+    """Rows present in every column file."""
+    counts = []
+    for name, dtype in COLUMNS.items():
+        path = _column_path(directory, name)
+        counts.append(os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0)
+    return min(counts)
+
+
+def report_row(report, persona_id, started_at, completed_at, question_count, answer_count):
+    """The row for one report (a RESULT_GENERATION_PROMPT result)."""
+    row = {
+        "completed_at": completed_at,
+        "duration": completed_at - started_at if started_at else math.nan,
+        "persona": persona_id or "unknown",
+        "questions": min(question_count, 65535),
+        "answers": min(answer_count, 65535),
+    }
+    scores = report.get("scores") if isinstance(report.get("scores"), dict) else {}
+    for name in SCORE_COLUMNS:
+        entry = scores.get(name)
+        score = entry.get("score") if isinstance(entry, dict) else entry
+        try:
+            row[name] = float(score)
+        except (TypeError, ValueError):
+            row[name] = math.nan
+    return row
+
+
+class Assessments:
+    """Read-only, memory-mapped view of the store as of when it was opened."""
+    def __init__(self, directory):
+        if np is None:
+            raise RuntimeError("analytics queries require numpy")
+        self.directory = directory
+        self.personas = _read_personas(directory)
+        self.rows = _row_count(directory) if os.path.isdir(directory) else 0
+
+    def column(self, name):
+        """The column as a read-only array backed by its file (only touched pages are read)."""
+        dtype = COLUMNS[name]
+        if self.rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(_column_path(self.directory, name), dtype=dtype, mode="r", shape=(self.rows,))
+
+    def summary(self, columns=SCORE_COLUMNS + ("duration",), percentiles=PERCENTILES, since=None):
+        """
+        Per persona: the number of assessments and, for each column, the count of
+        values present, their mean and the given percentiles. `since` (Unix time)
+        keeps the assessments completed from then on.
+        """
+        codes = self.column("persona")
+        mask = None
+        if since is not None:
+            mask = self.column("completed_at") >= since
+            codes = codes[mask]
+        # Sorting the codes once gives every persona's rows as a contiguous run
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        present = np.unique(sorted_codes)
+        starts = np.searchsorted(sorted_codes, present, side="left")
+        ends = np.searchsorted(sorted_codes, present, side="right")
+        result = {self._persona(code): {"assessments": int(end - start)} for code, start, end in zip(present, starts, ends)}
+
+        for name in columns:
+            values = self.column(name)
+            if mask is not None:
+                values = values[mask]
+            values = values[order]
+            for code, start, end in zip(present, starts, ends):
+                group = values[start:end]
+                group = group[~np.isnan(group)]
+                stats = {"count": int(group.size)}
+                if group.size:
+                    stats["mean"] = float(group.mean())
+                    for q, value in zip(percentiles, np.percentile(group, percentiles)):
+                        stats[f"p{q:g}"] = float(value)
+                result[self._persona(code)][name] = stats
+        return result
+
+    def _persona(self, code):
+        return self.personas[code] if code < len(self.personas) else f"#{code}"
+
+
+def from_env():
+    """The writer for ANALYTICS_DIR, or None when it is unset or numpy is missing."""
+    directory = os.environ.get("ANALYTICS_DIR")
+    if not directory:
+        return None
+    if np is None:
+        log("[analytics] ANALYTICS_DIR is set but numpy is not installed; the export is disabled.")
+        return None
+    writer = AnalyticsWriter(
+        directory,
+        batch_size=int(os.environ.get("ANALYTICS_BATCH", "256")),
+        flush_interval=float(os.environ.get("ANALYTICS_FLUSH", "30")),
+    )
+    # Rows still buffered at shutdown are written, not lost
+    atexit.register(writer.close)
+    return writer
+
+
+WRITER = from_env()
+
+
+def record(report, persona_id, started_at, completed_at, question_count, answer_count):
+    """Exports a completed report (no-op unless ANALYTICS_DIR is set)."""
+    if WRITER is None or not report:
+        return
+    WRITER.record(report_row(report, persona_id, started_at, completed_at, question_count, answer_count))
+
+
+def backfill(directory, store_path):
+    """Appends the reports of the finished conversations in a conversation store; returns the row count."""
+    import conversation_store
+
+    store = conversation_store.ConversationStore(store_path)
+    rows = []
+    total = 0
+    for _, state, history in store.iter_conversations():
+        report = state.get("report")
+        if state.get("state") != "ENDED" or not isinstance(report, dict) or not report:
+            continue
+        profile = state.get("persona_engine", {}).get("profile", {})
+        answers = sum(1 for message in history if message.get("role") == "user")
+        started_at = state.get("started_at")
+        # Conversations stored before completion times were kept count as completed when they started
+        completed_at = state.get("completed_at") or started_at or 0.0
+        rows.append(report_row(report, profile.get("persona_id"), started_at, completed_at, state.get("question_count", 0), answers))
+        if len(rows) >= 4096:
+            append(directory, rows)
+            total += len(rows)
+            rows = []
+    if rows:
+        append(directory, rows)
+        total += len(rows)
+    return total
+
+
+def _print_summary(summary):
+    print(f"{'persona':<24}{'column':<18}{'n':>9}{'mean':>8}" + "".join(f"{f'p{q}':>8}" for q in PERCENTILES))
+    for persona, columns in sorted(summary.items()):
+        for name, stats in columns.items():
+            if name == "assessments":
+                continue
+            cells = "".join(f"{stats.get(key, math.nan):>8.2f}" for key in ["mean"] + [f"p{q}" for q in PERCENTILES])
+            print(f"{persona[:23]:<24}{name:<18}{stats['count']:>9}{cells}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=os.environ.get("ANALYTICS_DIR", "analytics"))
+    parser.add_argument("--since-days", type=float, help="only assessments completed in the last N days")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    parser.add_argument("--backfill", metavar="STORE", help="first append the reports of a conversation store")
+    args = parser.parse_args()
+    if np is None:
+        parser.error("numpy is required (pip install numpy)")
+
+    if args.backfill:
+        os.makedirs(args.dir, exist_ok=True)
+        print(f"[analytics] backfilled {backfill(args.dir, args.backfill)} assessments")
+    since = time.time() - args.since_days * 86400 if args.since_days is not None else None
+    started = time.perf_counter()
+    assessments = Assessments(args.dir)
+    summary = assessments.summary(since=since)
+    elapsed = time.perf_counter() - started
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        _print_summary(summary)
+        print(f"{assessments.rows} assessments, summarized in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,590 @@
-from flask import Flask, render_template, request, jsonify, session
-from flask_session import Session
-from conversation_controller import ConversationController
+from flask import Flask, Response, g, render_template, request, jsonify, session, stream_with_context
+from conversation_controller import ConversationController, AsyncConversationController
+from gemini_client import CLIENT_POOL
+from metrics import log, span
+import analysis_batcher
+import analytics
+import chat_context
+import conversation_store
+import question_pool
+import question_index
+import rate_scheduler
+import report_jobs
+import resilience
+import speculation
+import contextvars
+import json
+import metrics
 import os
+import time
 import uuid
 
+try:
+    from flask_sock import Sock
+except ImportError:  # The WebSocket transport is optional (pip install flask-sock)
+    Sock = None
+
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "super_secret_dev_key")
-app.config["SESSION_TYPE"] = "filesystem"
 app.config["SESSION_PERMANENT"] = False
 
-# Initialize Flask-Session
-Session(app)
+# The signed session cookie only carries the conversation id; state lives in the store
+STORE = conversation_store.from_env()
+STORE.start_expiry()
+# One turn at a time per conversation, across threads and worker processes
+TURN_LOCKS = conversation_store.turn_locks_from_env(STORE)
+
+# The Gemini SDK is imported lazily; load it off the request path once the worker is up
+if os.environ.get("GEMINI_PREWARM", "1") != "0":
+    CLIENT_POOL.warm_in_background()
+
+# Final reports are generated by a bounded worker pool instead of inside /api/chat
+BACKGROUND_REPORTS = os.environ.get("BACKGROUND_REPORTS", "1") != "0"
+REPORT_JOBS = report_jobs.from_env() if BACKGROUND_REPORTS else None
+
+# Chat responses carry only the messages after the client's cursor.
+# LEGACY_HISTORY=1 also returns the full "history" for clients written against the old protocol.
+LEGACY_HISTORY = os.environ.get("LEGACY_HISTORY", "0") == "1"
+
+# Chat over a WebSocket that keeps the controller in memory (needs flask-sock; WEBSOCKETS=0 turns it off)
+WEBSOCKETS = Sock is not None and os.environ.get("WEBSOCKETS", "1") != "0"
+
+# Pre-generate first interview questions per persona (FIRST_QUESTION_POOL_SIZE > 0)
+question_pool.start_from_env(CLIENT_POOL.get())
+
+
+def _load_controller(controller_class=ConversationController):
+    """Rehydrate controller from the conversation store"""
+    gemini_client = CLIENT_POOL.get(controller_class.client_class)
+    with span("session_load"):
+        stored = STORE.load(session["conversation_id"])
+    if stored is None:
+        controller = controller_class(gemini_client=gemini_client)
+    else:
+        state, history = stored
+        controller = controller_class.from_dict(state, history, gemini_client=gemini_client)
+        controller.saved_messages = len(history)
+    controller.defer_report = BACKGROUND_REPORTS
+    controller.conversation_id = session["conversation_id"]
+    return controller
+
+
+def _save_controller(controller, conversation_id=None, turns=()):
+    """
+    Save state back to the store (only new messages are written). Under a turn lock the
+    save fails with LeaseLostError if the lock's lease expired meanwhile.
+    """
+    conversation_id = conversation_id or session["conversation_id"]
+    with span("session_save"):
+        controller.saved_messages = STORE.save(
+            conversation_id, controller.to_dict(), controller.history, controller.saved_messages, turns,
+            lease=TURN_LOCKS.lease(conversation_id),
+        )
+
+
+def _turn_record(turn_id, message, report_job, cursor):
+    """The stored result of a turn submitted with an idempotency key (none without one)."""
+    if turn_id is None:
+        return []
+    return [(turn_id, {"message": message, "report_job": report_job, "cursor": cursor})]
+
+
+def _finish_turn(controller, turn_id=None, response="", cursor=0):
+    """
+    Saves the turn, with its result under the client's idempotency key, and hands a
+    deferred report to the job queue.
+    Returns (job id, "") or, if the queue is full, (None, summary text) after generating it inline.
+    """
+    if controller.state == "ENDED" and controller.saved_messages == len(controller.history):
+        return None, ""  # Nothing happened (conversation already over)
+    # Background report jobs are keyed by conversation id
+    report_job = session["conversation_id"] if controller.report_pending else None
+    _save_controller(controller, turns=_turn_record(turn_id, response, report_job, cursor))
+    if not controller.report_pending:
+        return None, ""
+
+    conversation_id = session["conversation_id"]
+
+    def job():
+        # The report is not part of the turn, so it is not held to the turn's deadline
+        resilience.clear_deadline()
+        result = controller.report_job()
+        # Commit the report to the stored conversation, which may have moved on meanwhile
+        with TURN_LOCKS.hold(conversation_id):
+            _store_report(controller, conversation_id)
+        return result
+
+    def failed(error):
+        # Persisted so /api/report still answers "failed" after the job has expired
+        controller.report_failed(error)
+        with TURN_LOCKS.hold(conversation_id):
+            _store_report(controller, conversation_id)
+
+    # The job logs under the trace id of the turn that ended the interview
+    context = contextvars.copy_context()
+    try:
+        REPORT_JOBS.submit(conversation_id, lambda: context.run(job), lambda error: context.run(failed, error))
+        return conversation_id, ""
+    except report_jobs.QueueFullError as e:
+        log(f"{e}; generating report inline.")
+    try:
+        resilience.clear_deadline()
+        report_text = controller.report_job()["message"]
+    except Exception as e:
+        log(f"Error generating report: {e}")
+        controller.report_failed(e)
+        report_text = "\n(Report generation failed due to an error)."
+    _save_controller(controller, turns=_turn_record(turn_id, response + report_text, None, cursor))
+    return None, report_text
+
+
+def _store_report(controller, conversation_id):
+    """
+    Writes the outcome of a background report onto the stored conversation (the caller
+    holds its turn lock). Nothing is written if the conversation was restarted, expired
+    or already got the outcome since the report was queued.
+    """
+    stored = STORE.load(conversation_id)
+    if stored is None or not stored[0].get("report_pending") or stored[0].get("started_at") != controller.started_at:
+        log(f"Conversation {conversation_id} changed since its report was queued; not storing the report.")
+        return
+    state, history = stored
+    current = ConversationController.from_dict(state, history, gemini_client=controller.gemini_client)
+    current.saved_messages = len(history)
+    current.report_pending = controller.report_pending
+    current.report = controller.report
+    current.report_error = controller.report_error
+    current.completed_at = controller.completed_at
+    # The summary message, if the report was generated
+    current.history.extend(controller.history[controller.saved_messages:])
+    _save_controller(current, conversation_id)
+    controller.saved_messages = current.saved_messages
+
+
+def _request_cursor(data, default):
+    """The client's cursor (number of messages it already has), defaulting to `default`."""
+    cursor = data.get("cursor", default)
+    if not isinstance(cursor, int) or isinstance(cursor, bool) or cursor < 0:
+        return default
+    return cursor
+
+
+def _message_delta(history, cursor, start=0):
+    """
+    Response fields for the messages from `cursor` on: `messages` (each with its `seq`)
+    and the new `cursor`. `history` holds the conversation from sequence number `start`.
+    """
+    messages = [
+        {"seq": seq, "role": msg["role"], "content": msg["content"]}
+        for seq, msg in enumerate(history[max(0, cursor - start):], start=max(cursor, start))
+    ]
+    payload = {"messages": messages, "cursor": start + len(history)}
+    if LEGACY_HISTORY and start == 0:
+        payload["history"] = history
+    return payload
+
+
+def _turn_id(value):
+    """A client-supplied idempotency key, or None if missing or malformed."""
+    return value if isinstance(value, str) and 0 < len(value) <= 128 else None
+
+
+def _replayed_turn(conversation_id, turn_id, data, contended):
+    """
+    The response of an earlier submission of the same turn (same idempotency key), with
+    the messages after this request's cursor, or None if the key has not been seen.
+    Call it holding the conversation's turn lock, so a submission still running has finished.
+    """
+    if turn_id is None:
+        return None
+    result = STORE.load_turn(conversation_id, turn_id)
+    if result is None:
+        return None
+    metrics.TURNS_DEDUPLICATED.inc(source="in_flight" if contended else "completed")
+    log(f"Duplicate submission of turn {turn_id}; answering with its stored result.")
+    cursor = _request_cursor(data, result["cursor"])
+    stored = STORE.load(conversation_id, since=cursor)
+    history = stored[1] if stored else []
+    return {"message": result["message"], "report_job": result["report_job"], **_message_delta(history, cursor, start=cursor)}
+
+
+def _sse(event, data):
+    """Formats one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _busy_payload(error):
+    return {"error": "busy", "message": "The interviewer is busy right now, please send your answer again in a moment.", "retry_after": round(error.retry_after, 1)}
+
+
+def _conversation_busy_payload(error):
+    return {"error": "conversation_busy", "message": "Your previous answer is still being processed, please wait a moment.", "retry_after": round(error.retry_after, 1)}
+
+
+@app.errorhandler(conversation_store.ConversationBusyError)
+def conversation_busy(error):
+    """Another turn of the same conversation held its lock for too long. Nothing was changed."""
+    log(f"Rejected request: {error}")
+    response = jsonify(_conversation_busy_payload(error))
+    response.status_code = 409
+    response.headers["Retry-After"] = str(max(1, round(error.retry_after)))
+    return response
+
+
+@app.errorhandler(rate_scheduler.SchedulerBusyError)
+def scheduler_busy(error):
+    """The Gemini scheduler could not admit a call in time. The turn was not saved, so the client can resend it."""
+    log(f"Rejected request: {error}")
+    response = jsonify(_busy_payload(error))
+    response.status_code = 503
+    response.headers["Retry-After"] = str(max(1, round(error.retry_after)))
+    return response
+
+
+@app.before_request
+def start_trace():
+    """
+    Every request (one chat turn) gets a trace id for its log lines and the X-Trace-Id header,
+    and a deadline (TURN_DEADLINE) that bounds its LLM calls.
+    """
+    g.started = time.perf_counter()
+    g.trace_id = metrics.new_trace()
+    resilience.start_deadline()
+
+
+@app.after_request
+def finish_trace(response):
+    # For streamed replies this is the time to the first byte
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.started, endpoint=endpoint, status=response.status_code)
+    response.headers["X-Trace-Id"] = g.trace_id
+    return response
+
 
 @app.route("/")
 def home():
     # Clear session on load/reload for fresh start in this simple version
     session.clear()
     session["conversation_id"] = str(uuid.uuid4())
-    # Initialize basic state
-    session["history"] = []
-    session["state"] = "IDLE"
-    return render_template("index.html")
+    return render_template("index.html", websocket=WEBSOCKETS)
 
 @app.route("/api/start", methods=["POST"])
 def start_chat():
-    controller = ConversationController()
-    response = controller.start_conversation()
-    
-    # Save state to session
-    session["history"] = controller.history
-    session["state"] = controller.state
-    # Save persona engine state
-    session["persona_engine_state"] = controller.persona_engine.to_dict()
-    
-    return jsonify({"message": response, "history": session["history"]})
+    if not session.get("conversation_id"):
+        return jsonify({"error": "No active session"}), 400
+
+    with TURN_LOCKS.hold(session["conversation_id"]):
+        controller = ConversationController(gemini_client=CLIENT_POOL.get())
+        controller.conversation_id = session["conversation_id"]
+        response = controller.start_conversation()
+
+        _save_controller(controller)
+
+    return jsonify({"message": response, **_message_delta(controller.history, 0)})
 
 @app.route("/api/chat", methods=["POST"])
 def chat():
+    """
+    Runs one turn. Turns of a conversation run one at a time; a request carrying the
+    "turn_id" (or Idempotency-Key header) of a turn already run gets that turn's result
+    back instead of running it again.
+    """
+    if not session.get("conversation_id"):
+        return jsonify({"error": "No active session"}), 400
+
+    data = request.json
+    user_input = data.get("message", "")
+    turn_id = _turn_id(data.get("turn_id") or request.headers.get("Idempotency-Key"))
+
+    with TURN_LOCKS.hold(session["conversation_id"]) as contended:
+        replay = _replayed_turn(session["conversation_id"], turn_id, data, contended)
+        if replay is not None:
+            return jsonify(replay)
+        controller = _load_controller()
+        cursor = _request_cursor(data, len(controller.history))
+        response = controller.handle_response(user_input)
+        report_job, report_text = _finish_turn(controller, turn_id, response, cursor)
+
+    return jsonify({"message": response + report_text, "report_job": report_job, **_message_delta(controller.history, cursor)})
+
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Same as /api/chat, but streams the reply as Server-Sent Events:
+    `token` frames with partial text, then a `done` frame with the full message
+    and the new messages after the client's cursor. A replayed turn (see /api/chat)
+    comes as one `token` frame with the whole reply.
+    """
     if not session.get("conversation_id"):
         return jsonify({"error": "No active session"}), 400
 
     data = request.json
     user_input = data.get("message", "")
-    
-    # Rehydrate controller from session
-    # Pass the saved persona_engine_state if it exists
-    persona_state = session.get("persona_engine_state")
-    controller = ConversationController(persona_engine_state=persona_state)
-    
-    controller.history = session.get("history", [])
-    controller.state = session.get("state", "IDLE")
-    
-    response = controller.handle_response(user_input)
-    
-    # Save state back to session
-    session["history"] = controller.history
-    session["state"] = controller.state
-    session["persona_engine_state"] = controller.persona_engine.to_dict()
-    
-    return jsonify({"message": response, "history": session["history"]})
+    turn_id = _turn_id(data.get("turn_id") or request.headers.get("Idempotency-Key"))
+    conversation_id = session["conversation_id"]
+
+    def events():
+        try:
+            # Held until the stream ends or the client disconnects
+            with TURN_LOCKS.hold(conversation_id) as contended:
+                replay = _replayed_turn(conversation_id, turn_id, data, contended)
+                if replay is not None:
+                    yield _sse("token", {"text": replay["message"]})
+                    yield _sse("done", replay)
+                    return
+                yield from _stream_turn(user_input, data, turn_id)
+        except conversation_store.ConversationBusyError as e:
+            log(f"Rejected request: {e}")
+            yield _sse("busy", _conversation_busy_payload(e))
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _stream_turn(user_input, data, turn_id):
+    """The SSE frames of one streamed turn (the caller holds the turn lock)."""
+    controller = _load_controller()
+    cursor = _request_cursor(data, len(controller.history))
+    chunks = controller.handle_response_stream(user_input)
+    parts = []
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            yield _sse("token", {"text": chunk})
+    except rate_scheduler.SchedulerBusyError as e:
+        # Headers are already out; report it in-band and leave the turn unsaved
+        log(f"Rejected request: {e}")
+        yield _sse("busy", _busy_payload(e))
+        return
+    finally:
+        # On client disconnect this closes the Gemini stream as well
+        chunks.close()
+
+    report_job, report_text = _finish_turn(controller, turn_id, "".join(parts), cursor)
+    if report_text:
+        parts.append(report_text)
+        yield _sse("token", {"text": report_text})
+    yield _sse("done", {"message": "".join(parts), "report_job": report_job, **_message_delta(controller.history, cursor)})
+
+
+def chat_socket(ws):
+    """
+    WebSocket counterpart of /api/chat/stream. One controller stays in memory for the
+    whole connection; each turn is checkpointed to the store in the background, so the
+    HTTP endpoints can take over if the socket drops.
+    Client frames: {"message": ..., "cursor": n, "turn_id": ...}. Server frames: {"event": token|done|busy|error, "data": {...}},
+    with the same payloads as the SSE events. The socket is closed once the interview has ended.
+    """
+    if not session.get("conversation_id"):
+        _ws_send(ws, "error", {"error": "No active session"})
+        return
+
+    controller = _load_controller()
+    checkpointer = conversation_store.Checkpointer(STORE, session["conversation_id"], controller.saved_messages)
+    try:
+        while controller.state != "ENDED":
+            frame = ws.receive()
+            if frame is None:
+                break  # Closed by the client
+            try:
+                data = json.loads(frame)
+            except ValueError:
+                _ws_send(ws, "error", {"error": "Invalid JSON frame"})
+                continue
+            controller = _socket_turn(ws, controller, checkpointer, data if isinstance(data, dict) else {})
+    finally:
+        checkpointer.close()
+
+
+def _socket_turn(ws, controller, checkpointer, data):
+    """
+    Runs one turn on the live controller under the conversation's turn lock and returns
+    the controller to use for the next one. Frames may carry a "turn_id" like /api/chat.
+    """
+    metrics.new_trace()
+    resilience.start_deadline()
+    conversation_id = session["conversation_id"]
+    turn_id = _turn_id(data.get("turn_id"))
+    try:
+        with TURN_LOCKS.hold(conversation_id) as contended:
+            if STORE.message_count(conversation_id) != checkpointer.flush():
+                # Another tab or an HTTP retry ran a turn meanwhile; go on from the stored state
+                controller = _load_controller()
+                checkpointer.saved_count = controller.saved_messages
+            replay = _replayed_turn(conversation_id, turn_id, data, contended)
+            if replay is not None:
+                _ws_send(ws, "token", {"text": replay["message"]})
+                _ws_send(ws, "done", replay)
+                return controller
+            controller = _run_socket_turn(ws, controller, checkpointer, data, turn_id)
+            # Written before the next holder of the lock can load the conversation
+            checkpointer.flush()
+            return controller
+    except conversation_store.ConversationBusyError as e:
+        log(f"Rejected request: {e}")
+        _ws_send(ws, "busy", _conversation_busy_payload(e))
+        return controller
+
+
+def _run_socket_turn(ws, controller, checkpointer, data, turn_id):
+    started = time.perf_counter()
+    status = 200
+    cursor = _request_cursor(data, len(controller.history))
+    chunks = controller.handle_response_stream(data.get("message", ""))
+    parts = []
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            _ws_send(ws, "token", {"text": chunk})
+    except rate_scheduler.SchedulerBusyError as e:
+        log(f"Rejected request: {e}")
+        status = 503
+        _ws_send(ws, "busy", _busy_payload(e))
+    except Exception as e:
+        log(f"Error handling WebSocket message: {e}")
+        status = 500
+        _ws_send(ws, "error", {"error": "Error getting response."})
+    finally:
+        chunks.close()
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="/ws/chat:message", status=status)
+
+    if status != 200:
+        # Drop the half-applied turn: go back to the last checkpoint, as an HTTP retry would
+        checkpointer.flush()
+        return _load_controller()
+
+    if controller.state == "ENDED":
+        # Saved synchronously before the report job can write to the same conversation
+        controller.saved_messages = checkpointer.flush()
+        report_job, report_text = _finish_turn(controller, turn_id, "".join(parts), cursor)
+        if report_text:
+            parts.append(report_text)
+            _ws_send(ws, "token", {"text": report_text})
+    else:
+        checkpointer.submit(
+            controller.to_dict(), list(controller.history), _turn_record(turn_id, "".join(parts), None, cursor),
+            lease=TURN_LOCKS.lease(session["conversation_id"]),
+        )
+        report_job = None
+    _ws_send(ws, "done", {"message": "".join(parts), "report_job": report_job, **_message_delta(controller.history, cursor)})
+    return controller
+
+
+def _ws_send(ws, event, data):
+    ws.send(json.dumps({"event": event, "data": data}))
+
+
+if WEBSOCKETS:
+    Sock(app).route("/ws/chat")(chat_socket)
+
+@app.route("/api/report/<conversation_id>")
+def report_status(conversation_id):
+    """
+    Status of the background report for this conversation:
+    queued, running, retrying, pending (running in another worker), done (with `message` and `report`) or failed.
+    """
+    if conversation_id != session.get("conversation_id"):
+        return jsonify({"error": "Unknown report"}), 404
+
+    # Jobs in flight are only known to the worker process running them
+    job = REPORT_JOBS.get(conversation_id) if REPORT_JOBS else None
+    if job is not None and job.status != "done":
+        return jsonify(job.to_dict())
+
+    stored = STORE.load(conversation_id)
+    if stored is None:
+        return jsonify({"error": "Unknown report"}), 404
+    state, history = stored
+    if state.get("report"):
+        return jsonify({"job_id": conversation_id, "status": "done", "report": state["report"], "message": history[-1]["content"]})
+    if state.get("report_pending"):
+        return jsonify({"job_id": conversation_id, "status": "pending"})
+    if state.get("report_error"):
+        return jsonify({"job_id": conversation_id, "status": "failed", "error": state["report_error"]})
+    return jsonify({"error": "Unknown report"}), 404
+
+@app.route("/api/conversation")
+def conversation_snapshot():
+    """
+    Snapshot of the current conversation for clients reconnecting: its state and every
+    message (or only those from ?cursor=N on, to catch up after a dropped response).
+    """
+    if not session.get("conversation_id"):
+        return jsonify({"error": "No active session"}), 400
+
+    cursor = request.args.get("cursor", 0, type=int)
+    stored = STORE.load(session["conversation_id"], since=max(0, cursor))
+    if stored is None:
+        return jsonify({"error": "Unknown conversation"}), 404
+    state, history = stored
+    return jsonify({
+        "conversation_id": session["conversation_id"],
+        "state": state["state"],
+        "report_pending": state.get("report_pending", False),
+        **_message_delta(history, cursor, start=max(0, cursor)),
+    })
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Request, phase and LLM call histograms and counters in the Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/stats")
+def stats():
+    """Process-level counters for speculation, the response cache, the first-question pool, report jobs, the Gemini scheduler, analysis batching, chat contexts, the question index, the circuit breaker and the analytics export."""
+    pool = question_pool.get_pool()
+    batcher = analysis_batcher.get_batcher()
+    return jsonify({
+        "speculation": speculation.STATS.snapshot(),
+        "first_question_pool": pool.stats() if pool else None,
+        "report_jobs": REPORT_JOBS.metrics() if REPORT_JOBS else None,
+        "response_cache": CLIENT_POOL.cache.stats() if CLIENT_POOL.cache else None,
+        "scheduler": CLIENT_POOL.scheduler.metrics() if CLIENT_POOL.scheduler else None,
+        "analysis_batching": batcher.metrics() if batcher else None,
+        "chat_contexts": chat_context.CONTEXTS.stats() if chat_context.ENABLED else None,
+        "question_index": question_index.INDEX.stats() if question_index.INDEX else None,
+        "circuit_breaker": CLIENT_POOL.breaker.metrics() if CLIENT_POOL.breaker else None,
+        "analytics": analytics.WRITER.stats() if analytics.WRITER else None,
+    })
+
+# Async counterparts of /api/start and /api/chat (require flask[async]).
+# Gemini calls and 429 backoff are awaited instead of sleeping in the request thread.
+@app.route("/api/async/start", methods=["POST"])
+async def async_start_chat():
+    if not session.get("conversation_id"):
+        return jsonify({"error": "No active session"}), 400
+
+    async with TURN_LOCKS.hold_async(session["conversation_id"]):
+        controller = AsyncConversationController(gemini_client=CLIENT_POOL.get(AsyncConversationController.client_class))
+        controller.conversation_id = session["conversation_id"]
+        response = controller.start_conversation()
+
+        _save_controller(controller)
+
+    return jsonify({"message": response, **_message_delta(controller.history, 0)})
+
+@app.route("/api/async/chat", methods=["POST"])
+async def async_chat():
+    if not session.get("conversation_id"):
+        return jsonify({"error": "No active session"}), 400
+
+    data = request.json
+    user_input = data.get("message", "")
+
+    turn_id = _turn_id(data.get("turn_id") or request.headers.get("Idempotency-Key"))
+
+    async with TURN_LOCKS.hold_async(session["conversation_id"]) as contended:
+        replay = _replayed_turn(session["conversation_id"], turn_id, data, contended)
+        if replay is not None:
+            return jsonify(replay)
+        controller = _load_controller(AsyncConversationController)
+        cursor = _request_cursor(data, len(controller.history))
+        response = await controller.handle_response(user_input)
+        report_job, report_text = _finish_turn(controller, turn_id, response, cursor)
+
+    return jsonify({"message": response + report_text, "report_job": report_job, **_message_delta(controller.history, cursor)})
 
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
@@ -0,0 +1,118 @@
+"""
+Analytics export benchmark.
+
+Appends synthetic assessments to a temporary analytics store and reports:
+  - append throughput at the writer's batch size (each batch is locked and fsynced)
+  - the time and peak memory of analytics.Assessments.summary() over all rows
+  - for comparison, the same per-persona percentiles computed from report JSON
+    lines (what scraping stored reports amounts to), on a sample
+Requires numpy.
+
+Usage:
+    python benchmarks/bench_analytics.py [--rows 2000000] [--batch 256] [--baseline-rows 100000]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+
+PERSONAS = ["senior", "mid", "junior", "machine-learning", "data-engineering", "frontend", "devops"]
+# Rows per append() when filling the store (the throughput run uses --batch)
+FILL_BATCH = 65536
+
+
+def synthetic_rows(count, rng, start=1.7e9):
+    for i in range(count):
+        row = {
+            "completed_at": start + i * 30.0,
+            "duration": rng.uniform(300, 1800),
+            "persona": rng.choice(PERSONAS),
+            "questions": 5,
+            "answers": rng.randint(8, 12),
+        }
+        for name in analytics.SCORE_COLUMNS:
+            row[name] = float(rng.randint(1, 5)) if rng.random() > 0.02 else float("nan")
+        yield row
+
+
+def report_json(row):
+    """The RESULT_GENERATION_PROMPT-shaped record a scraper would have to parse."""
+    return json.dumps({
+        "persona_id": row["persona"],
+        "report": {"scores": {name: {"score": row[name], "justification": "..."} for name in analytics.SCORE_COLUMNS}},
+    })
+
+
+def baseline(lines):
+    """Per-persona percentiles of each dimension from report JSON lines, in plain Python."""
+    groups = {}
+    for line in lines:
+        record = json.loads(line)
+        scores = record["report"]["scores"]
+        for name in analytics.SCORE_COLUMNS:
+            score = scores[name]["score"]
+            if score == score:  # Not NaN
+                groups.setdefault((record["persona_id"], name), []).append(score)
+    return {key: statistics.quantiles(values, n=10) for key, values in groups.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--baseline-rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if analytics.np is None:
+        parser.error("numpy is required")
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Append throughput at the writer's batch size, on a slice of the rows
+        sample = list(synthetic_rows(min(args.rows, args.batch * 200), rng))
+        start = time.perf_counter()
+        for i in range(0, len(sample), args.batch):
+            analytics.append(directory, sample[i:i + args.batch])
+        elapsed = time.perf_counter() - start
+        print(f"append: {len(sample)} rows in batches of {args.batch}: {len(sample) / elapsed:,.0f} rows/s")
+
+        remaining = args.rows - len(sample)
+        rows = synthetic_rows(remaining, rng, start=1.7e9 + len(sample) * 30.0)
+        while remaining > 0:
+            batch = [next(rows) for _ in range(min(FILL_BATCH, remaining))]
+            analytics.append(directory, batch)
+            remaining -= len(batch)
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"store: {args.rows:,} rows, {size / 1e6:.1f} MB ({size / args.rows:.0f} B/row)")
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        summary = analytics.Assessments(directory).summary()
+        elapsed = time.perf_counter() - start
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(f"summary: {len(summary)} personas x {len(analytics.SCORE_COLUMNS) + 1} columns in {elapsed:.2f}s "
+              f"({elapsed / args.rows * 1e9:.0f} ns/row), peak RSS +{(rss_after - rss_before) / 1024:.0f} MB")
+
+        start = time.perf_counter()
+        since = analytics.Assessments(directory).summary(since=1.7e9 + args.rows * 30.0 * 0.9)
+        elapsed = time.perf_counter() - start
+        print(f"summary of the last 10%: {sum(p['assessments'] for p in since.values()):,} rows in {elapsed:.2f}s")
+
+    lines = [report_json(row) for row in synthetic_rows(args.baseline_rows, rng)]
+    start = time.perf_counter()
+    baseline(lines)
+    elapsed = time.perf_counter() - start
+    print(f"JSON baseline: {args.baseline_rows:,} rows in {elapsed:.2f}s ({elapsed / args.baseline_rows * 1e9:.0f} ns/row)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Persona matching benchmark.
+
+Compares, on the shipped catalog and on a synthetic catalog with many roles:
+  - the previous linear scan (substring check of every keyword of every domain)
+  - the precompiled alias index (persona_catalog.RoleMatcher)
+and, per profile completion, building a fresh persona dict vs. the interned one.
+First checks that the shipped catalog maps a set of known roles (including ones
+with ordinary words like "go" or "testing" in them) to the expected domain, and
+exits with status 1 if any does not.
+
+Usage:
+    python benchmarks/bench_persona_match.py [--domains 2000] [--aliases 6] [--roles 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persona_catalog import CATALOG, PersonaCatalog
+
+# Role descriptions and the domain they must be matched to
+EXPECTED_DOMAINS = (
+    ("Python Backend", "backend"),
+    ("Python backend, I want to go deeper into APIs", "backend"),
+    ("Python backend developer, strong on testing", "backend"),
+    ("frontend react (not sure where to go next)", "frontend"),
+    ("Frontend (React), I express ideas in TypeScript", "frontend"),
+    ("I mean, mostly backend work", "backend"),
+    ("React Native developer", "mobile"),
+    ("Go backend", "go"),
+    ("Golang microservices", "go"),
+    ("Spring Boot services in Java", "java"),
+    ("Node.js with Express.js", "node"),
+    ("Game developer using Unity", "game"),
+    ("Oracle DBA", "database"),
+    ("QA engineer, test automation with Playwright", "qa"),
+    ("Data pipelines", "data-engineering"),
+    ("Something else entirely", "general"),
+)
+FILLER = ("senior", "engineer", "developer", "with", "experience", "in", "and", "team", "lead", "remote")
+
+
+def linear_match(domains, role, default):
+    """The matching PersonaEngine.assign_persona used before the catalog."""
+    role = role.lower()
+    for domain in domains:
+        if any(keyword in role for keyword in domain.get("keywords", ())):
+            return domain["id"]
+    return default
+
+
+def synthetic_catalog(domains, aliases, rng):
+    """The shipped tiers with `domains` made-up domains of `aliases` one- or two-word keywords each."""
+    def word():
+        return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 9)))
+
+    data = {"seniority_levels": list(CATALOG.tiers), "default_domain": "general", "domains": []}
+    for index in range(domains):
+        data["domains"].append({
+            "id": f"role{index}",
+            "keywords": [word() if rng.random() < 0.7 else f"{word()} {word()}" for _ in range(aliases)],
+            "domain": f"Role {index}",
+            "expected_skills": ["A", "B", "C"],
+            "struggles": ["D", "E", "F"],
+            "education": "Any",
+        })
+    data["domains"].append({"id": "general", "keywords": [], "domain": "General", "expected_skills": [], "struggles": [], "education": "Any"})
+    return data
+
+
+def sample_roles(data, count, rng):
+    """Role descriptions: mostly one catalog keyword among filler words, some with none."""
+    keywords = [keyword for domain in data["domains"] for keyword in domain.get("keywords", ())]
+    roles = []
+    for _ in range(count):
+        words = rng.sample(FILLER, 3)
+        if rng.random() < 0.8:
+            words.insert(rng.randint(0, 3), rng.choice(keywords))
+        roles.append(" ".join(words).title())
+    return roles
+
+
+def per_second(fn, items):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return len(items) / (time.perf_counter() - start)
+
+
+def compare(label, data, roles):
+    catalog = PersonaCatalog(data)
+    domains = data["domains"]
+    # Only the speed is compared: the linear scan picks the first listed domain, the index scores the matches
+    linear = per_second(lambda role: linear_match(domains, role, catalog.default_domain), roles)
+    indexed = per_second(lambda role: catalog.matcher.match(role, catalog.default_domain), roles)
+    print(f"{label:<30}{len(domains):>8}{linear:>14,.0f}{indexed:>14,.0f}{indexed / linear:>9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--domains", type=int, default=2000)
+    parser.add_argument("--aliases", type=int, default=6)
+    parser.add_argument("--roles", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    wrong = [(role, expected, CATALOG.matcher.match(role, CATALOG.default_domain)) for role, expected in EXPECTED_DOMAINS]
+    wrong = [case for case in wrong if case[1] != case[2]]
+    for role, expected, matched in wrong:
+        print(f"MISMATCH {role!r}: expected {expected}, matched {matched}")
+    print(f"role matching: {len(EXPECTED_DOMAINS) - len(wrong)}/{len(EXPECTED_DOMAINS)} known roles matched\n")
+
+    shipped = {"seniority_levels": CATALOG.tiers, "default_domain": CATALOG.default_domain, "domains": list(CATALOG.domains.values())}
+    large = synthetic_catalog(args.domains, args.aliases, rng)
+
+    print(f"{'catalog':<30}{'domains':>8}{'linear/s':>14}{'indexed/s':>14}{'speedup':>10}")
+    compare("shipped (personas.json)", shipped, sample_roles(shipped, args.roles, rng))
+    compare(f"synthetic ({args.aliases} aliases/domain)", large, sample_roles(large, args.roles, rng))
+
+    persona_ids = [rng.choice(CATALOG.persona_ids) for _ in range(args.roles * 10)]
+    built = per_second(CATALOG._build, persona_ids)
+    interned = per_second(CATALOG.get, persona_ids)
+    print(f"\npersona definition per profile: build {built:,.0f}/s, interned {interned:,.0f}/s ({interned / built:.1f}x)")
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Prompt rendering micro-benchmark.
+
+Compares, for a typical QUESTION_GENERATION_PROMPT turn:
+  - the previous str.replace loop (one pass over the prompt per variable)
+  - the compiled template (single join)
+  - the compiled template with the persona variables pre-rendered
+
+Usage:
+    python benchmarks/bench_prompt_render.py [--iterations 100000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompt_templates
+from conversation_controller import persona_question_vars
+from persona_engine import PersonaEngine
+from prompts import QUESTION_GENERATION_PROMPT
+
+
+def replace_loop(prompt, context_vars):
+    """The rendering GeminiClient.generate_content used before compiled templates."""
+    for key, value in context_vars.items():
+        prompt = prompt.replace(f"{{{{{key}}}}}", str(value))
+    return prompt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    persona_id = "mid-backend"
+    persona_vars = persona_question_vars(PersonaEngine.build_persona(persona_id))
+    turn_vars = {
+        "target_dimension": "Communication",
+        "last_answer": "I would start by profiling the slow endpoint and then look at the query plan. " * 3,
+        "strengths": "structured reasoning, clear trade-offs",
+        "weaknesses": "limited testing strategy",
+        "difficulty": "Medium",
+        "adaptive_instruction": "Continue with the interview flow.",
+    }
+    full_vars = {**persona_vars, **turn_vars}
+
+    compiled = prompt_templates.get_template(QUESTION_GENERATION_PROMPT)
+    bound = prompt_templates.bind_persona(QUESTION_GENERATION_PROMPT, persona_id, persona_vars)
+    assert replace_loop(QUESTION_GENERATION_PROMPT, full_vars) == compiled.render(full_vars) == bound.render(turn_vars)
+
+    cases = [
+        ("replace loop", lambda: replace_loop(QUESTION_GENERATION_PROMPT, full_vars)),
+        ("compiled template", lambda: compiled.render(full_vars)),
+        ("persona pre-rendered", lambda: prompt_templates.bind_persona(QUESTION_GENERATION_PROMPT, persona_id, persona_vars).render(turn_vars)),
+    ]
+    baseline = None
+    for label, fn in cases:
+        per_call = min(timeit.repeat(fn, number=args.iterations, repeat=3)) / args.iterations * 1e6
+        baseline = baseline or per_call
+        print(f"{label:<24}{per_call:>8.2f} us/render  ({baseline / per_call:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
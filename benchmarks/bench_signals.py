@@ -0,0 +1,106 @@
+"""
+Strength/weakness aggregation benchmark.
+
+Replays synthetic long interviews (a few recurring signals phrased several ways,
+plus a long tail of one-off phrases) through:
+  - the previous aggregation (append, keep the last 20, `list(set(...))[:3]`)
+  - signals.SignalAggregator
+and reports the per-turn cost (observe + top 3), the serialized state size, how
+often the top 3 put into the prompt changes between turns (every change is a
+different prompt), and how many of the top 3 slots are near-duplicates of
+another slot.
+
+Usage:
+    python benchmarks/bench_signals.py [--interviews 200] [--turns 100]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from signals import SignalAggregator, normalize
+
+# Recurring signals, each as the phrasings an analysis model tends to vary between
+RECURRING = [
+    ["Clear communication", "clear communication", "Communicates clearly", "clear and concise communication"],
+    ["Structured thinking", "structured thinking", "Thinks in a structured way"],
+    ["Good use of examples", "uses concrete examples", "Concrete examples"],
+    ["Strong debugging skills", "strong debugging skill", "Debugging skills"],
+    ["Considers trade-offs", "considers tradeoffs", "Weighs trade-offs"],
+    ["Ownership", "takes ownership", "Shows ownership"],
+]
+TAIL = ["curiosity", "calm under pressure", "domain knowledge", "testing mindset", "mentoring", "pragmatism",
+        "documentation habits", "security awareness", "cost awareness", "estimation", "prioritization"]
+MAX_SIGNALS = 20
+
+
+def interview(turns, rng):
+    """Per-turn phrase lists: 1-3 recurring signals (skewed towards the first ones) and sometimes a one-off."""
+    for _ in range(turns):
+        phrases = []
+        for _ in range(rng.randint(1, 3)):
+            group = RECURRING[min(int(rng.expovariate(0.6)), len(RECURRING) - 1)]
+            phrases.append(rng.choice(group))
+        if rng.random() < 0.5:
+            phrases.append(f"{rng.choice(TAIL)} {rng.randint(1, 1000)}")
+        yield phrases
+
+
+class Previous:
+    """The aggregation ConversationController used before SignalAggregator."""
+    def __init__(self):
+        self.items = []
+
+    def observe(self, phrases):
+        self.items = (self.items + phrases)[-MAX_SIGNALS:]
+
+    def top(self, k=3):
+        return list(set(self.items))[:k]
+
+    def to_state(self):
+        return self.items
+
+
+def replay(factory, sessions):
+    """Returns (seconds, turns, state bytes per interview, top-3 changes per turn, duplicate slot share)."""
+    elapsed = turns = state_bytes = changes = duplicates = slots = 0
+    for session in sessions:
+        aggregator = factory()
+        previous_top = None
+        for phrases in session:
+            start = time.perf_counter()
+            aggregator.observe(phrases)
+            top = aggregator.top(3)
+            elapsed += time.perf_counter() - start
+            turns += 1
+            changes += top != previous_top
+            previous_top = top
+            keys = [normalize(phrase) for phrase in top]
+            duplicates += len(keys) - len(set(keys))
+            slots += len(keys)
+        state_bytes += len(json.dumps(aggregator.to_state(), separators=(",", ":")))
+    return elapsed, turns, state_bytes / len(sessions), changes / turns, duplicates / slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interviews", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    sessions = [list(interview(args.turns, rng)) for _ in range(args.interviews)]
+
+    print(f"{args.interviews} interviews x {args.turns} turns")
+    print(f"{'aggregation':<22}{'us/turn':>10}{'state B':>10}{'top-3 churn':>13}{'dup slots':>11}")
+    for label, factory in (("previous (set)", Previous), ("SignalAggregator", lambda: SignalAggregator(capacity=MAX_SIGNALS))):
+        elapsed, turns, state_bytes, churn, duplicates = replay(factory, sessions)
+        print(f"{label:<22}{elapsed / turns * 1e6:>10.1f}{state_bytes:>10.0f}{churn:>12.0%}{duplicates:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
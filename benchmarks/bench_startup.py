@@ -0,0 +1,73 @@
+"""
+Startup and per-request client construction benchmark.
+
+Compares:
+  - time to `import app` (worker boot) vs. importing the Gemini SDK eagerly
+  - building a new GeminiClient + GenerativeModel per request vs. CLIENT_POOL.get()
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--requests 2000]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def time_import(statement, runs):
+    """Median wall time of a fresh interpreter running `statement`."""
+    env = dict(os.environ, GEMINI_PREWARM="0")
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], cwd=ROOT, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def time_per_request(factory, requests):
+    """Mean microseconds per call of `factory`."""
+    start = time.perf_counter()
+    for _ in range(requests):
+        factory()
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    baseline = time_import("pass", args.runs)
+    app_import = time_import("import app", args.runs)
+    eager_import = time_import("import app, gemini_client; gemini_client.load_sdk()", args.runs)
+
+    print(f"{'interpreter startup':<40}{baseline * 1000:>10.1f} ms")
+    print(f"{'import app (lazy SDK)':<40}{app_import * 1000:>10.1f} ms")
+    print(f"{'import app + SDK (previous behaviour)':<40}{eager_import * 1000:>10.1f} ms")
+
+    from gemini_client import CLIENT_POOL, MODEL_NAME, load_sdk
+
+    def per_request_client():
+        # What every /api/chat used to do: reconfigure the SDK and build a new model
+        genai = load_sdk()
+        genai.configure(api_key=os.environ.get("GEMINI_API_KEY", "benchmark"))
+        return genai.GenerativeModel(MODEL_NAME)
+
+    def pooled_client():
+        return CLIENT_POOL.get().model
+
+    CLIENT_POOL.warm()
+    print(f"{'new client + model per request':<40}{time_per_request(per_request_client, args.requests):>10.1f} us")
+    print(f"{'CLIENT_POOL.get()':<40}{time_per_request(pooled_client, args.requests):>10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Concurrent-candidate load test.
+
+Drives N simulated candidates through the whole flow over HTTP:
+GET / -> POST /api/start -> profiling answers -> interview answers until the
+report is queued -> polling /api/report/<id> until it is done. Then fetches
+/api/stats and /metrics once. Reports throughput, p50/p95/p99 latency and error
+rate per endpoint, and exits with status 1 if the stats or metrics endpoints fail.
+
+By default the app is started in-process on a free port with the offline stub
+backend (LLM_BACKEND=stub) and no rate budget, so no Gemini quota is used. Stub
+behaviour is set with STUB_LATENCY_MS, STUB_LATENCY_SIGMA, STUB_429_RATE,
+STUB_ERROR_RATE and STUB_SEED (see stub_backend.py); the usual app settings
+(GEMINI_RPM, ANALYSIS_BATCH_WINDOW_MS, TURN_DEADLINE, ...) apply as well.
+
+Usage:
+    python benchmarks/load_test.py [--candidates 50] [--concurrency 10] [--stream]
+    python benchmarks/load_test.py --url http://127.0.0.1:5000   # an already running server
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROFILE_ANSWERS = (
+    ("Alex Doe", "Jordan Lee", "Sam Patel", "Riley Chen"),
+    ("Python Backend", "Frontend React", "DevOps", "Data pipelines"),
+    ("1", "3", "6", "12"),
+)
+ANSWERS = (
+    "I would start by reproducing the issue, then compare metrics before and after to narrow down the cause.",
+    "I'm not sure.",
+    "First I would list the constraints, then weigh two options against them and pick the simpler one, "
+    "because it is easier to roll back if my assumption about the load turns out to be wrong.",
+    "I would ask the team what changed and check the logs.",
+)
+# Safety net in case the interview never ends (e.g. every analysis failed)
+MAX_TURNS = 20
+
+
+class Recorder:
+    """Latency samples and error counts per endpoint."""
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.busy = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, status):
+        with self._lock:
+            self.samples[endpoint].append(seconds)
+            if status == 503:
+                self.busy[endpoint] += 1
+            elif status is None or status >= 400:
+                self.errors[endpoint] += 1
+
+
+class Candidate:
+    """One simulated candidate with its own cookie jar."""
+    def __init__(self, base_url, recorder, rng, stream=False, poll_interval=0.5):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.rng = rng
+        self.stream = stream
+        self.poll_interval = poll_interval
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def run(self):
+        """Returns True when the candidate got a finished report."""
+        self.request("GET /", "GET", "/")
+        self.request("POST /api/start", "POST", "/api/start")
+        for answers in PROFILE_ANSWERS:
+            self.chat(self.rng.choice(answers))
+
+        report_job = None
+        for _ in range(MAX_TURNS):
+            payload = self.chat(self.rng.choice(ANSWERS))
+            if payload is None:
+                continue
+            message = payload.get("message", "")
+            if "ASSESSMENT REPORT" in message:
+                return True  # Report generated inline (BACKGROUND_REPORTS=0)
+            report_job = payload.get("report_job")
+            if report_job or "has ended" in message:
+                break
+        if not report_job:
+            return False
+
+        while True:
+            time.sleep(self.poll_interval)
+            status, body = self.request("GET /api/report", "GET", f"/api/report/{report_job}")
+            if status != 200:
+                return False
+            result = json.loads(body)
+            if result["status"] == "done":
+                return True
+            if result["status"] == "failed":
+                return False
+
+    def chat(self, message):
+        """Sends one answer (retrying on 503 busy) and returns the response payload, or None."""
+        endpoint = "POST /api/chat/stream" if self.stream else "POST /api/chat"
+        for _ in range(5):
+            status, body = self.request(endpoint, "POST", endpoint.split(" ", 1)[1], {"message": message})
+            if status == 503:
+                time.sleep(1)
+                continue
+            if status != 200:
+                return None
+            if not self.stream:
+                return json.loads(body)
+            # The last SSE frame is `done` (or `busy`)
+            event, _, data = body.strip().rpartition("\n\n")[2].partition("\n")
+            if event == "event: busy":
+                time.sleep(1)
+                continue
+            return json.loads(data[len("data: "):])
+        return None
+
+    def request(self, endpoint, method, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"} if data else {})
+        start = time.perf_counter()
+        status, body = None, ""
+        try:
+            with self.opener.open(req, timeout=120) as response:
+                status, body = response.status, response.read().decode()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read().decode()
+        except OSError as e:
+            print(f"{endpoint} failed: {e}")
+        self.recorder.record(endpoint, time.perf_counter() - start, status)
+        return status, body
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def start_local_server():
+    """Starts app.py with the stub backend on a free port; returns its base URL."""
+    os.environ.setdefault("LLM_BACKEND", "stub")
+    os.environ.setdefault("CONVERSATION_DB", os.path.join(tempfile.mkdtemp(), "conversations.db"))
+    os.environ.setdefault("GEMINI_PREWARM", "0")
+    # The stub has no quota; set GEMINI_RPM/GEMINI_TPM explicitly to load-test the scheduler
+    os.environ.setdefault("GEMINI_RPM", "0")
+    os.environ.setdefault("GEMINI_TPM", "0")
+    import logging
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    import app
+
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-test-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--url", help="Base URL of a running server (default: start one in-process with the stub backend)")
+    parser.add_argument("--stream", action="store_true", help="Answer through /api/chat/stream instead of /api/chat")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/") if args.url else start_local_server()
+    recorder = Recorder()
+    seeds = random.Random(args.seed)
+    candidates = [Candidate(base_url, recorder, random.Random(seeds.random()), args.stream) for _ in range(args.candidates)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        completed = sum(pool.map(lambda candidate: candidate.run(), candidates))
+    elapsed = time.perf_counter() - start
+
+    # The monitoring endpoints must keep working after a run (every subsystem has reported into them)
+    monitor = Candidate(base_url, recorder, seeds)
+    monitoring_ok = True
+    for path in ("/api/stats", "/metrics"):
+        status, body = monitor.request(f"GET {path}", "GET", path)
+        if status != 200:
+            print(f"GET {path} returned {status}: {body[:200]}")
+            monitoring_ok = False
+
+    requests = sum(len(samples) for samples in recorder.samples.values())
+    print(f"{args.candidates} candidates, concurrency {args.concurrency}, {elapsed:.1f}s")
+    print(f"completed interviews: {completed}/{args.candidates} ({completed / elapsed:.2f}/s), requests: {requests / elapsed:.1f}/s")
+    print(f"{'endpoint':<24}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'busy':>6}")
+    for endpoint, samples in sorted(recorder.samples.items()):
+        samples.sort()
+        errors = recorder.errors[endpoint]
+        print(
+            f"{endpoint:<24}{len(samples):>7}"
+            f"{percentile(samples, 50) * 1000:>9.0f}{percentile(samples, 95) * 1000:>9.0f}{percentile(samples, 99) * 1000:>9.0f}"
+            f"{errors / len(samples):>8.1%}{recorder.busy[endpoint]:>6}"
+        )
+    if not monitoring_ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
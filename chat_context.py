@@ -0,0 +1,134 @@
+"""
+Conversation-scoped question contexts (CHAT_CONTEXT=1).
+
+Instead of sending the whole QUESTION_GENERATION_PROMPT every turn, each
+conversation keeps one long-lived context: the persona prompt
+(INTERVIEWER_PERSONA_PROMPT + QUESTION_TURN_RULES, rendered once per persona)
+is the model's system instruction, and a turn sends only the last few
+exchanges plus QUESTION_TURN_PROMPT (the latest answer, signals, adaptive
+instruction and target dimension). The system instruction is an identical
+prefix across every turn of every conversation with that persona, which is
+what Gemini's prefix caching reuses.
+
+Contexts live in process memory and are evicted when idle (CHAT_CONTEXT_TTL)
+or when there are too many (CHAT_CONTEXT_MAX, least recently used first). An
+evicted context is simply rebuilt: every delta carries the signals needed to
+generate the next question, so eviction only drops the recent exchanges.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import prompt_templates
+from persona_catalog import CATALOG
+from prompts import INTERVIEWER_PERSONA_PROMPT, QUESTION_TURN_RULES
+
+ENABLED = os.environ.get("CHAT_CONTEXT", "0") == "1"
+# Seconds a context may stay unused before it is evicted
+IDLE_TTL = float(os.environ.get("CHAT_CONTEXT_TTL", "900"))
+# Most contexts kept per process
+MAX_CONTEXTS = int(os.environ.get("CHAT_CONTEXT_MAX", "1000"))
+# Exchanges (turn message + question) replayed before each new turn
+MAX_TURNS = int(os.environ.get("CHAT_CONTEXT_TURNS", "6"))
+
+
+@lru_cache(maxsize=None)
+def system_instruction(persona_id):
+    """The persona prompt for an id, rendered once and shared by every conversation with that persona."""
+    persona = CATALOG.get(persona_id)
+    background = persona["background_assumptions"]
+    return prompt_templates.get_template(INTERVIEWER_PERSONA_PROMPT).render({
+        "persona_name": persona["persona_name"],
+        "target_users": persona["target_users"],
+        "education": background["education"],
+        "experience_level": background["experience_level"],
+        "domain_exposure": background["domain_exposure"],
+        "expected_skills": "\n".join(f"- {skill}" for skill in persona["what_persona_should_be_good_at"]),
+        "struggles": "\n".join(f"- {struggle}" for struggle in persona["what_persona_may_struggle_with"]),
+        "start_difficulty": persona["difficulty_level"]["start_level"],
+        "max_difficulty": persona["difficulty_level"]["max_level"],
+    }) + QUESTION_TURN_RULES
+
+
+class ChatContext:
+    """One conversation's question context: the persona system instruction and its recent exchanges."""
+    def __init__(self, persona_id):
+        self.persona_id = persona_id
+        self.system_instruction = system_instruction(persona_id)
+        self.turns = []
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+    def contents(self, message):
+        """The chat contents to send for a new turn message: the recent exchanges, then the message."""
+        with self._lock:
+            turns = list(self.turns)
+        contents = []
+        for sent, reply in turns:
+            contents.append({"role": "user", "parts": [sent]})
+            contents.append({"role": "model", "parts": [reply]})
+        contents.append({"role": "user", "parts": [message]})
+        return contents
+
+    def commit(self, message, reply):
+        """Records the exchange that was kept (speculative replies that lose are never committed)."""
+        with self._lock:
+            self.turns.append((message, reply))
+            del self.turns[:-MAX_TURNS]
+
+
+class ContextRegistry:
+    """Per-process contexts keyed by conversation id, evicted when idle or least recently used."""
+    def __init__(self, idle_ttl=IDLE_TTL, max_contexts=MAX_CONTEXTS):
+        self.idle_ttl = idle_ttl
+        self.max_contexts = max_contexts
+        self._contexts = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "reused": 0, "evicted": 0}
+
+    def get(self, conversation_id, persona_id):
+        """The conversation's context, created (seeded with the persona) when missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            context = self._contexts.get(conversation_id)
+            if context is not None and context.persona_id == persona_id:
+                self._contexts.move_to_end(conversation_id)
+                self._stats["reused"] += 1
+            else:
+                self._contexts.pop(conversation_id, None)
+                while len(self._contexts) >= self.max_contexts:
+                    self._contexts.popitem(last=False)
+                    self._stats["evicted"] += 1
+                context = self._contexts[conversation_id] = ChatContext(persona_id)
+                self._stats["created"] += 1
+            context.last_used = now
+            return context
+
+    def peek(self, conversation_id):
+        """The conversation's live context, or None, without touching its recency or the stats."""
+        with self._lock:
+            return self._contexts.get(conversation_id)
+
+    def discard(self, conversation_id):
+        """Drops a finished conversation's context."""
+        with self._lock:
+            self._contexts.pop(conversation_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "live": len(self._contexts)}
+
+    def _evict(self, now):
+        # Least recently used first, so stop at the first context that is still fresh
+        while self._contexts:
+            conversation_id, context = next(iter(self._contexts.items()))
+            if now - context.last_used < self.idle_ttl:
+                break
+            del self._contexts[conversation_id]
+            self._stats["evicted"] += 1
+
+
+CONTEXTS = ContextRegistry()
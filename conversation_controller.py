@@ -1,28 +1,172 @@
 from persona_engine import PersonaEngine
-from gemini_client import GeminiClient
-from prompts import QUESTION_GENERATION_PROMPT, INTERVIEWER_PERSONA_PROMPT, RESPONSE_ANALYSIS_PROMPT
+from gemini_client import GeminiClient, AsyncGeminiClient, CLIENT_POOL
+from prompts import QUESTION_GENERATION_PROMPT, QUESTION_TURN_PROMPT, RESPONSE_ANALYSIS_PROMPT, RESULT_GENERATION_PROMPT
+import prompt_templates
+import analysis_batcher
+import chat_context
+import fast_path
+import speculation
+from signals import SignalAggregator
+from token_budget import TranscriptBuffer, TOKEN_BUDGET, clip_text
+import metrics
+from metrics import log, span
+import question_pool
+import question_index
+import resilience
+import analytics
+import asyncio
+import contextvars
+import time
+
+# Dimensions rotated across interview questions
+DIMENSIONS = ["Logical Thinking", "Communication", "Adaptability"]
+# Questions asked when the LLM is unavailable and the question index has nothing suitable
+FALLBACK_QUESTIONS = {
+    "Logical Thinking": [
+        "Walk me through how you would break down a problem you have never seen before.",
+        "Tell me about a decision you made based on data. How did you check your reasoning?",
+        "How would you find the cause of a problem that only happens some of the time?",
+    ],
+    "Communication": [
+        "How would you explain a technical decision you made to someone outside your field?",
+        "Tell me about a time a misunderstanding caused a problem. How did you resolve it?",
+        "How do you make sure a handover or piece of documentation is actually understood?",
+    ],
+    "Adaptability": [
+        "Tell me about a time your plan changed halfway through. What did you do?",
+        "How do you get productive quickly with an unfamiliar tool or codebase?",
+        "Describe a situation where you had to work with incomplete information.",
+    ],
+}
+# Hybrid approach: number of interview questions before the report
+MAX_QUESTIONS = 5
+# Version of the to_dict() format (2: ranked signal aggregators instead of phrase lists)
+STATE_VERSION = 2
+# Distinct observed strengths/weaknesses kept per conversation
+MAX_SIGNALS = 20
+# Top-ranked strengths/weaknesses put into the question prompt
+PROMPT_SIGNALS = 3
+# Length of the candidate's answer quoted in a turn summary
+SUMMARY_ANSWER_TOKENS = 40
+# Start of the report summary appended to the chat
+REPORT_HEADER = "\n\n--- ASSESSMENT REPORT ---\n"
+
+def persona_question_vars(persona_data):
+    """The QUESTION_GENERATION_PROMPT variables that depend only on the persona."""
+    return {
+        "persona_name": persona_data.get('persona_name', 'Interviewer'),
+        "target_users": persona_data.get('target_users', 'Candidates'),
+        "expected_skills": ", ".join(persona_data.get('what_persona_should_be_good_at', [])),
+        "struggles": ", ".join(persona_data.get('what_persona_may_struggle_with', [])),
+        "start_difficulty": persona_data.get('difficulty_level', {}).get('start_level', 'Medium'),
+    }
+
+
+def first_question_context(persona_data):
+    """
+    Initial Context for First Question.
+    Depends only on the persona, which is what lets question_pool pre-generate it.
+    """
+    context = persona_question_vars(persona_data)
+    context.update({
+        "target_dimension": "Logical Thinking", # Start with Logical Thinking
+        "last_answer": "I am ready to begin.", 
+        "strengths": "Not yet observed",
+        "weaknesses": "Not yet observed",
+        "difficulty": persona_data.get('starting_difficulty', 'Medium'),
+        "adaptive_instruction": "Start with a simple question relevant to the persona."
+    })
+    return context
+
 
 class ConversationController:
     """
     Manages the state and flow of the conversation.
     Acts as the State Machine described in the architecture.
     """
-    def __init__(self, persona_engine_state=None):
+    client_class = GeminiClient
+
+    def __init__(self, persona_engine_state=None, gemini_client=None):
         self.state = "IDLE"  # IDLE, PROFILING, ACTIVE, ENDED
         self.history = []
         self.persona_engine = PersonaEngine(state_dict=persona_engine_state)
-        self.gemini_client = GeminiClient()
+        # Shared per-process client unless one is injected
+        self.gemini_client = gemini_client if gemini_client is not None else CLIENT_POOL.get(self.client_class)
         self.question_count = 0 
         
         # State tracking for adaptive logic
         self.current_difficulty = "Medium"
-        self.observed_strengths = []
-        self.observed_weaknesses = []
+        self.observed_strengths = SignalAggregator(capacity=MAX_SIGNALS)
+        self.observed_weaknesses = SignalAggregator(capacity=MAX_SIGNALS)
         self.latest_analysis = {}
+        
+        # When set, end_conversation skips the report call and leaves it to report_job()
+        self.defer_report = False
+        self.report_pending = False
+        self.report = None
+        # Why the deferred report could not be generated (set by report_failed)
+        self.report_error = None
+        # Unix times of start_conversation() and of the report, for the analytics export
+        self.started_at = None
+        self.completed_at = None
+        # Number of history entries already persisted by the conversation store
+        self.saved_messages = 0
+        # Store key of the conversation, set by the caller; keys the chat context (CHAT_CONTEXT=1)
+        self.conversation_id = None
+        
+        # Incremental transcript + per-turn summaries, so prompts stay under the token budget
+        self.transcript = TranscriptBuffer()
+        self.budget = TOKEN_BUDGET
+
+    def to_dict(self):
+        """
+        Serializes the full controller state, except the history, which is stored
+        message by message (see conversation_store).
+        """
+        return {
+            "v": STATE_VERSION,
+            "state": self.state,
+            "question_count": self.question_count,
+            "current_difficulty": self.current_difficulty,
+            "observed_strengths": self.observed_strengths.to_state(),
+            "observed_weaknesses": self.observed_weaknesses.to_state(),
+            "latest_analysis": self.latest_analysis,
+            "persona_engine": self.persona_engine.to_dict(),
+            "summaries": self.transcript.summaries,
+            "report_pending": self.report_pending,
+            "report": self.report,
+            "report_error": self.report_error,
+            "started_at": self.started_at,
+            "completed_at": self.completed_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data, history=None, gemini_client=None):
+        """Restores a controller serialized by to_dict()."""
+        version = data.get("v", 1)
+        if version > STATE_VERSION:
+            raise ValueError(f"Unsupported conversation state version {version}")
+        controller = cls(persona_engine_state=data.get("persona_engine"), gemini_client=gemini_client)
+        controller.history = list(history or [])
+        controller.state = data.get("state", "IDLE")
+        controller.question_count = data.get("question_count", 0)
+        controller.current_difficulty = data.get("current_difficulty", "Medium")
+        # Version 1 stored plain phrase lists, which from_state() replays
+        controller.observed_strengths = SignalAggregator.from_state(data.get("observed_strengths"), capacity=MAX_SIGNALS)
+        controller.observed_weaknesses = SignalAggregator.from_state(data.get("observed_weaknesses"), capacity=MAX_SIGNALS)
+        controller.latest_analysis = data.get("latest_analysis", {})
+        controller.transcript.summaries = data.get("summaries", [])
+        controller.report_pending = data.get("report_pending", False)
+        controller.report = data.get("report")
+        controller.report_error = data.get("report_error")
+        controller.started_at = data.get("started_at")
+        controller.completed_at = data.get("completed_at")
+        return controller
 
     def start_conversation(self):
         """Initializes the conversation and starts profiling."""
         self.state = "PROFILING"
+        self.started_at = time.time()
         # Start with the first profiling question
         first_q = self.persona_engine.get_next_question()
         welcome_message = f"Hello! I am your AI Interviewer. To tailor this assessment for you, I need to ask a few setting-the-stage questions.\n\n{first_q}"
@@ -43,13 +187,87 @@ class ConversationController:
             return self.end_conversation()
 
         if self.state == "PROFILING":
-            return self._handle_profiling(user_input)
+            with span("profiling"):
+                return self._handle_profiling(user_input)
         
         if self.state == "ACTIVE":
             return self._handle_active_interview(user_input)
 
         return "Error: Unknown State"
 
+    def handle_response_stream(self, user_input):
+        """
+        Streaming variant of handle_response.
+        Yields the reply in chunks as Gemini generates it. The full reply is only
+        added to the history once the stream has been consumed to the end.
+        """
+        if self.state not in ("PROFILING", "ACTIVE") or user_input.lower() in ["bye", "exit", "quit"]:
+            yield self.handle_response(user_input)
+            return
+            
+        self.history.append({"role": "user", "content": user_input})
+        
+        if self.state == "PROFILING":
+            self.persona_engine.process_answer(user_input)
+            if not self.persona_engine.profiling_complete:
+                yield self._next_profiling_question()
+                return
+            header, context = self._begin_interview()
+            yield header
+            pooled = question_pool.take(self.persona_engine.profile.get('persona_id'))
+            if pooled is not None:
+                yield pooled
+                self.history.append({"role": "system", "content": header + pooled})
+                return
+            yield from self._stream_reply(self.gemini_client.generate_content_stream(QUESTION_GENERATION_PROMPT, context), prefix=header, fallback=context)
+            return
+        
+        analysis_context = self._analysis_context(user_input)
+        analysis_result = self._fast_analysis(analysis_context)
+        if analysis_result is None:
+            analysis_result = self._analyze(analysis_context)
+        adaptive_instruction, should_advance_topic, _ = self._apply_analysis(analysis_result, user_input)
+        context = self._next_question_context(user_input, adaptive_instruction, should_advance_topic)
+        if context is None:
+            yield self.end_conversation()
+            return
+        indexed = self._indexed_question(context, should_advance_topic)
+        if indexed is not None:
+            yield indexed
+            self.history.append({"role": "system", "content": indexed})
+        elif not (yield from self._stream_reply(self._generate_question_stream(context), fallback=context)):
+            self._index_question(context, self.history[-1]["content"], should_advance_topic)
+        self._commit_question(context, self.history[-1]["content"])
+
+    def _stream_reply(self, chunks, prefix="", fallback=None):
+        """
+        Passes chunks through and commits the joined reply to the history when done.
+        If the LLM becomes unavailable, a fallback question for the `fallback` question
+        context is sent instead (after the text already sent). Returns True in that case.
+        """
+        parts = [prefix]
+        fell_back = False
+        try:
+            with span("question_generation"):
+                try:
+                    for chunk in chunks:
+                        parts.append(chunk)
+                        yield chunk
+                except resilience.LLMUnavailableError as e:
+                    if fallback is None:
+                        raise
+                    question = self._fallback_question(fallback, e)
+                    if len(parts) > 1:
+                        question = "\n\n" + question
+                    parts.append(question)
+                    fell_back = True
+                    yield question
+        finally:
+            # Runs on early close too, so the upstream call is cancelled
+            chunks.close()
+        self.history.append({"role": "system", "content": "".join(parts)})
+        return fell_back
+
     def _handle_profiling(self, user_input):
         """Handles the initial set of questions to build the user profile."""
         # Process the answer to the current question
@@ -57,181 +275,567 @@ class ConversationController:
         
         # Check if profiling is done
         if self.persona_engine.profiling_complete:
-            self.state = "ACTIVE"
-            self.question_count = 1
-            
-            # Transition to the actual interview
-            # Generate the first question using the Initial Persona Prompt or Question Generator
-            # We'll use the Question Generator with a "start" signal for consistency
-            
-            persona_data = self.persona_engine.profile['assigned_persona']
-            candidate_name = self.persona_engine.profile.get('candidate_name', 'Candidate')
-            background = f"{self.persona_engine.profile.get('role_focus')} with {self.persona_engine.profile.get('years_experience')} years experience"
-            
-            # Set initial difficulty from persona
-            self.current_difficulty = persona_data.get('starting_difficulty', 'Medium')
+            header, context = self._begin_interview()
             
-            # Initial Context for First Question
-            context = {
-                "persona_name": persona_data.get('persona_name', 'Interviewer'),
-                "target_users": persona_data.get('target_users', 'Candidates'),
-                "education": persona_data.get('background_assumptions', {}).get('education', 'N/A'),
-                "experience_level": persona_data.get('background_assumptions', {}).get('experience_level', 'N/A'),
-                "domain_exposure": persona_data.get('background_assumptions', {}).get('domain_exposure', 'N/A'),
-                "expected_skills": ", ".join(persona_data.get('what_persona_should_be_good_at', [])),
-                "struggles": ", ".join(persona_data.get('what_persona_may_struggle_with', [])),
-                "start_difficulty": persona_data.get('difficulty_level', {}).get('start_level', 'Medium'),
-                "max_difficulty": persona_data.get('difficulty_level', {}).get('max_level', 'Hard'),
-                "target_dimension": "Logical Thinking", # Start with Logical Thinking
-                "last_answer": "I am ready to begin.", 
-                "strengths": "Not yet observed",
-                "weaknesses": "Not yet observed",
-                "difficulty": self.current_difficulty,
-                "adaptive_instruction": "Start with a simple question relevant to the persona."
-            }
-            
-            # Generate first question
-            first_interview_question = self.gemini_client.generate_content(QUESTION_GENERATION_PROMPT, context)
+            # Serve a pre-generated first question when one is ready, else generate it
+            first_interview_question = question_pool.take(self.persona_engine.profile.get('persona_id'))
+            if first_interview_question is None:
+                try:
+                    first_interview_question = self.gemini_client.generate_content(QUESTION_GENERATION_PROMPT, context)
+                except resilience.LLMUnavailableError as e:
+                    first_interview_question = self._fallback_question(context, e)
             
-            transition_msg = (
-                f"Thank you, {candidate_name}. Based on your profile, I will be conducting a {persona_data['title']} interview.\n"
-                f"Let's begin.\n\n"
-                f"{first_interview_question}"
-            )
+            transition_msg = header + first_interview_question
             self.history.append({"role": "system", "content": transition_msg})
             return transition_msg
         else:
-            # Get the next profiling question
-            next_q = self.persona_engine.get_next_question()
-            self.history.append({"role": "system", "content": next_q})
-            return next_q
+            return self._next_profiling_question()
+
+    def _next_profiling_question(self):
+        """Get the next profiling question"""
+        next_q = self.persona_engine.get_next_question()
+        self.history.append({"role": "system", "content": next_q})
+        return next_q
+
+    def _begin_interview(self):
+        """
+        Switches to the ACTIVE state once profiling is complete.
+        Returns the transition message header and the context for the first question.
+        """
+        self.state = "ACTIVE"
+        self.question_count = 1
+        
+        # Transition to the actual interview
+        # Generate the first question using the Initial Persona Prompt or Question Generator
+        # We'll use the Question Generator with a "start" signal for consistency
+        
+        persona_data = self.persona_engine.profile['assigned_persona']
+        candidate_name = self.persona_engine.profile.get('candidate_name', 'Candidate')
+        
+        # Set initial difficulty from persona
+        self.current_difficulty = persona_data.get('starting_difficulty', 'Medium')
+        context = first_question_context(persona_data)
+        
+        header = (
+            f"Thank you, {candidate_name}. Based on your profile, I will be conducting a {persona_data['title']} interview.\n"
+            f"Let's begin.\n\n"
+        )
+        return header, context
 
     def _handle_active_interview(self, user_input):
         """Generates the next question using Gemini after analyzing the response."""
         
+        # --- PHASE 4: Response Analysis ---
+        analysis_context = self._analysis_context(user_input)
+        
+        # Trivial answers are classified locally, with no analysis call or speculation
+        analysis_result = self._fast_analysis(analysis_context)
+        if analysis_result is None:
+            branches = speculation.max_branches()
+            if branches:
+                return self._handle_active_speculative(user_input, analysis_context, branches)
+            
+            # Analyze the user's response
+            analysis_result = self._analyze(analysis_context)
+        
+        adaptive_instruction, should_advance_topic, _ = self._apply_analysis(analysis_result, user_input)
+        return self._ask_next_question(user_input, adaptive_instruction, should_advance_topic)
+
+    def _handle_active_speculative(self, user_input, analysis_context, branches):
+        """
+        Runs the analysis call and question generation for the most likely
+        suggested_action branches at the same time, then keeps the candidate that
+        matches the analysis and discards the rest.
+        Speculative questions only see the signals observed before this turn.
+        """
+        executor = speculation.get_executor()
+        # Calls run in the executor with this turn's context, so they log under its trace id
+        analysis_future = executor.submit(contextvars.copy_context().run, self._analyze, analysis_context)
+        
+        candidates = {
+            action: executor.submit(contextvars.copy_context().run, self._generate_question, context)
+            for action, context in self._speculation_plan(user_input, branches).items()
+        }
+        
+        analysis_result = analysis_future.result()
+        adaptive_instruction, should_advance_topic, action = self._apply_analysis(analysis_result, user_input)
+        
+        chosen = candidates.pop(action, None)
+        if self._ends_interview(should_advance_topic):
+            # No next question is asked, so no branch could have been used
+            for future in [chosen, *candidates.values()]:
+                if future is not None:
+                    future.cancel()
+            return self._ask_next_question(user_input, adaptive_instruction, should_advance_topic)
+        wasted = cancelled = 0
+        for future in candidates.values():
+            if future.cancel():
+                cancelled += 1
+            else:
+                wasted += 1
+        speculation.STATS.record(action, chosen is not None, len(candidates) + (chosen is not None), wasted, cancelled)
+        
+        return self._ask_next_question(user_input, adaptive_instruction, should_advance_topic, speculative=chosen)
+
+    def _speculation_plan(self, user_input, branches):
+        """Returns {action: question context} for the likely branches that still need a question."""
+        plan = {}
+        for action in speculation.STATS.likely_branches(branches):
+            difficulty, adaptive_instruction, should_advance_topic = self._adapt(action, self.current_difficulty)
+            question_count = self.question_count + (1 if should_advance_topic else 0)
+            if question_count > MAX_QUESTIONS:
+                continue  # This branch ends the interview, no question needed
+            plan[action] = self._question_context(user_input, DIMENSIONS[question_count % 3], difficulty, adaptive_instruction)
+        return plan
+
+    def _analyze(self, analysis_context):
+        """Runs the response analysis, batched with other conversations when analysis batching is on."""
+        batcher = analysis_batcher.get_batcher()
+        with span("analysis"):
+            try:
+                if batcher is None:
+                    result = self.gemini_client.generate_json(self._analysis_template(), analysis_context)
+                else:
+                    result = batcher.analyze(self._analysis_template(), analysis_context, self._analysis_persona_name(), self.gemini_client)
+            except resilience.LLMUnavailableError as e:
+                return self._fallback_analysis(analysis_context, e)
+        fast_path.shadow(analysis_context["last_question"], analysis_context["user_response"], result)
+        return result
+
+    @staticmethod
+    def _fallback_analysis(analysis_context, error):
+        """Degraded analysis while the LLM is unavailable: the fast-path heuristic at any confidence, else none."""
+        result, _, reason = fast_path.analyze(analysis_context["last_question"], analysis_context["user_response"])
+        kind = "heuristic_analysis" if result is not None else "no_analysis"
+        metrics.LLM_FALLBACKS.inc(kind=kind)
+        log(f"Analysis unavailable ({error}); using {kind} ({reason}).")
+        return result or {}
+
+    def _fallback_question(self, context, error):
+        """
+        Degraded question while the LLM is unavailable: the closest novel question in the
+        question index (any similarity), else a canned one for the target dimension.
+        """
+        asked = [message["content"] for message in self.history if message["role"] == "system"]
+        question = question_index.retrieve(
+            self.persona_engine.profile.get('persona_id'), context["target_dimension"], context["difficulty"], context["last_answer"], asked
+        )
+        kind = "indexed_question"
+        if question is None:
+            kind = "canned_question"
+            candidates = FALLBACK_QUESTIONS.get(context["target_dimension"], FALLBACK_QUESTIONS[DIMENSIONS[0]])
+            question = next((q for q in candidates if not any(q in message for message in asked)), candidates[0])
+        metrics.LLM_FALLBACKS.inc(kind=kind)
+        log(f"Question generation unavailable ({error}); serving a {kind.replace('_', ' ')}.")
+        return question
+
+    @staticmethod
+    def _fast_analysis(analysis_context):
+        """The heuristic analysis for trivial answers (FAST_PATH=on), or None to call the LLM."""
+        return fast_path.pre_analyze(analysis_context["last_question"], analysis_context["user_response"])
+
+    def _analysis_persona_name(self):
         persona_data = self.persona_engine.profile['assigned_persona']
+        return f"{persona_data['title']} ({persona_data['tone']})"
+
+    def _analysis_template(self):
+        """RESPONSE_ANALYSIS_PROMPT with the persona pre-rendered."""
+        return prompt_templates.bind_persona(RESPONSE_ANALYSIS_PROMPT, self.persona_engine.profile.get('persona_id'), {
+            "persona_name": self._analysis_persona_name(),
+        })
+
+    def _analysis_context(self, user_input):
+        """Builds the per-turn variables for _analysis_template()."""
         last_system_message = self.history[-2]['content'] if len(self.history) >= 2 else "Start of Interview"
-        
-        # --- PHASE 4: Response Analysis ---
-        analysis_context = {
-            "persona_name": f"{persona_data['title']} ({persona_data['tone']})",
+        return self.budget.fit(self._analysis_template(), {
             "difficulty": self.current_difficulty,
             "last_question": last_system_message,
             "user_response": user_input
-        }
+        }, elastic=("last_question", "user_response"))
+
+    @staticmethod
+    def _adapt(action, difficulty):
+        """
+        --- PHASE 5: Adaptive Logic ---
+        Maps a suggested_action to (next difficulty, adaptive instruction, should_advance_topic).
+        """
+        if action == "increase_difficulty":
+            difficulty = "Hard" if difficulty == "Medium" else "Medium"
+            return difficulty, "Candidate is doing well. Increase complexity or add constraints.", True
+            
+        if action == "decrease_difficulty":
+            difficulty = "Easy" if difficulty == "Medium" else "Medium"
+            return difficulty, "Candidate is struggling. Simplify the question or guide them.", True # Advance, but make it easier
         
-        # Analyze the user's response
-        analysis_result = self.gemini_client.generate_json(RESPONSE_ANALYSIS_PROMPT, analysis_context)
+        if action == "probe_deeper":
+            # Do NOT advance the topic controller; stay on the same dimension/topic
+            return difficulty, "Candidate's answer was surface level or vague. Ask a follow-up question to dig deeper into the SAME topic. Do not switch topics yet.", False
         
-        adaptive_instruction = "Continue with the interview flow."
-        should_advance_topic = True
+        return difficulty, "Continue with the interview flow.", True
 
-        if analysis_result:
-            self.latest_analysis = analysis_result
-            # Aggregate strengths and weaknesses
-            if "observed_strengths" in analysis_result:
-                self.observed_strengths.extend(analysis_result["observed_strengths"])
-            if "observed_weaknesses" in analysis_result:
-                self.observed_weaknesses.extend(analysis_result["observed_weaknesses"])
-                
-            # --- PHASE 5: Adaptive Logic ---
-            action = analysis_result.get("suggested_action", "maintain_difficulty")
-            
-            if action == "increase_difficulty":
-                self.current_difficulty = "Hard" if self.current_difficulty == "Medium" else "Medium"
-                adaptive_instruction = "Candidate is doing well. Increase complexity or add constraints."
-                should_advance_topic = True
-                
-            elif action == "decrease_difficulty":
-                self.current_difficulty = "Easy" if self.current_difficulty == "Medium" else "Medium"
-                adaptive_instruction = "Candidate is struggling. Simplify the question or guide them."
-                should_advance_topic = True # Advance, but make it easier
+    def _apply_analysis(self, analysis_result, user_input):
+        """
+        Records the analysis signals and applies the adaptive logic.
+        Returns (adaptive_instruction, should_advance_topic, action).
+        """
+        with span("adaptive_logic"):
+            self._summarize_turn(analysis_result, user_input)
+            action = "maintain_difficulty"
+            if analysis_result:
+                self.latest_analysis = analysis_result
+                # Aggregate strengths and weaknesses (near-duplicates merged, ranked by frequency and recency)
+                if "observed_strengths" in analysis_result:
+                    self.observed_strengths.observe(analysis_result["observed_strengths"])
+                if "observed_weaknesses" in analysis_result:
+                    self.observed_weaknesses.observe(analysis_result["observed_weaknesses"])
+                action = analysis_result.get("suggested_action", "maintain_difficulty")
+                if action not in speculation.DEFAULT_BRANCH_ORDER:
+                    action = "maintain_difficulty"
             
-            elif action == "probe_deeper":
-                # Do NOT advance the topic controller; stay on the same dimension/topic
-                should_advance_topic = False
-                adaptive_instruction = "Candidate's answer was surface level or vague. Ask a follow-up question to dig deeper into the SAME topic. Do not switch topics yet."
+            self.current_difficulty, adaptive_instruction, should_advance_topic = self._adapt(action, self.current_difficulty)
+        return adaptive_instruction, should_advance_topic, action
 
-        # --- Generate Next Question ---
-        
+    def _summarize_turn(self, analysis_result, user_input):
+        """Adds a compact summary of the turn just answered to the transcript buffer."""
+        self.transcript.sync(self.history)
+        analysis_result = analysis_result or {}
+        self.transcript.add_summary(
+            f"- Q{self.question_count} ({self.current_difficulty}): "
+            f"quality {analysis_result.get('quality_score', '?')}/5; "
+            f"strengths: {', '.join(analysis_result.get('observed_strengths', [])) or 'none'}; "
+            f"weaknesses: {', '.join(analysis_result.get('observed_weaknesses', [])) or 'none'}; "
+            f"answer: \"{clip_text(user_input, SUMMARY_ANSWER_TOKENS)}\""
+        )
+
+    def _question_template(self):
+        """QUESTION_GENERATION_PROMPT with the Persona Definition Sheet pre-rendered."""
+        persona_data = self.persona_engine.profile['assigned_persona']
+        return prompt_templates.bind_persona(QUESTION_GENERATION_PROMPT, self.persona_engine.profile.get('persona_id'), persona_question_vars(persona_data))
+
+    def _question_chat(self):
+        """This conversation's chat context when CHAT_CONTEXT=1, else None (self-contained prompts)."""
+        if not chat_context.ENABLED or self.conversation_id is None:
+            return None
+        return chat_context.CONTEXTS.get(self.conversation_id, self.persona_engine.profile.get('persona_id'))
+
+    def _generate_question(self, context):
+        """Generates a follow-up question (a coroutine with the async client); see _commit_question."""
+        chat = self._question_chat()
+        if chat is None:
+            return self.gemini_client.generate_content(self._question_template(), context)
+        return self.gemini_client.generate_content(QUESTION_TURN_PROMPT, context, chat=chat)
+
+    def _generate_question_stream(self, context):
+        chat = self._question_chat()
+        if chat is None:
+            return self.gemini_client.generate_content_stream(self._question_template(), context)
+        return self.gemini_client.generate_content_stream(QUESTION_TURN_PROMPT, context, chat=chat)
+
+    def _commit_question(self, context, question):
+        """Adds the question that was kept to the chat context, so later turns see it."""
+        if not chat_context.ENABLED or self.conversation_id is None:
+            return
+        # The context this question was generated with, unless it was evicted in the meantime
+        chat = chat_context.CONTEXTS.peek(self.conversation_id)
+        if chat is not None:
+            chat.commit(prompt_templates.get_template(QUESTION_TURN_PROMPT).render(context), question)
+
+    def _indexed_question(self, context, should_advance_topic):
+        """A previously generated question to ask instead of a new one (new-topic turns only), or None."""
+        if not should_advance_topic:
+            return None
+        asked = [message["content"] for message in self.history if message["role"] == "system"]
+        return question_index.lookup(
+            self.persona_engine.profile.get('persona_id'), context["target_dimension"], context["difficulty"], context["last_answer"], asked
+        )
+
+    def _index_question(self, context, question, should_advance_topic):
+        """Adds a generated new-topic question to the question index."""
+        if should_advance_topic:
+            question_index.add(
+                self.persona_engine.profile.get('persona_id'), context["target_dimension"], context["difficulty"], context["last_answer"], question
+            )
+
+    def _question_context(self, user_input, target_dim, difficulty, adaptive_instruction):
+        """Builds the per-turn variables for _question_template()."""
+        return self.budget.fit(self._question_template(), {
+            "target_dimension": target_dim,
+            "last_answer": user_input,
+            "strengths": ", ".join(self.observed_strengths.top(PROMPT_SIGNALS)) or "None yet",
+            "weaknesses": ", ".join(self.observed_weaknesses.top(PROMPT_SIGNALS)) or "None yet",
+            "difficulty": difficulty,
+            "adaptive_instruction": adaptive_instruction
+        }, elastic=("last_answer",))
+
+    def _ends_interview(self, should_advance_topic):
+        """Whether _next_question_context() will return None for this turn (question limit reached)."""
+        return self.question_count + (1 if should_advance_topic else 0) > MAX_QUESTIONS
+
+    def _next_question_context(self, user_input, adaptive_instruction, should_advance_topic):
+        """
+        Advances the question counter and builds the context for the next question.
+        Returns None when the question limit has been reached.
+        """
         # Only move to next dimension/question # if we aren't probing deeper
         if should_advance_topic:
             self.question_count += 1
             
         # Check if we have reached the limit (Hybrid approach: 5 questions)
-        if self.question_count > 5:
-             return self.end_conversation()
+        if self.question_count > MAX_QUESTIONS:
+            return None
         
         # Simple Logic to rotate dimensions
-        dimensions = ["Logical Thinking", "Communication", "Adaptability"]
-        # If we didn't advance, we use the same index associated with the previous question
-        current_dim_index = self.question_count if should_advance_topic else (self.question_count)
-        target_dim = dimensions[current_dim_index % 3]
-        
-        context = {
-            "persona_name": persona_data.get('persona_name', 'Interviewer'),
-            "target_users": persona_data.get('target_users', 'Candidates'),
-            "expected_skills": ", ".join(persona_data.get('what_persona_should_be_good_at', [])),
-            "struggles": ", ".join(persona_data.get('what_persona_may_struggle_with', [])),
-            "start_difficulty": persona_data.get('difficulty_level', {}).get('start_level', 'Medium'),
-            "target_dimension": target_dim,
-            "last_answer": user_input,
-            "strengths": ", ".join(list(set(self.observed_strengths))[:3]) or "None yet", # Limit to top 3 unique
-            "weaknesses": ", ".join(list(set(self.observed_weaknesses))[:3]) or "None yet",
-            "difficulty": self.current_difficulty,
-            "adaptive_instruction": adaptive_instruction
-        }
+        target_dim = DIMENSIONS[self.question_count % 3]
+        return self._question_context(user_input, target_dim, self.current_difficulty, adaptive_instruction)
+
+    def _ask_next_question(self, user_input, adaptive_instruction, should_advance_topic, speculative=None):
+        """Generates (or commits a speculated) next question, or ends the interview."""
+        context = self._next_question_context(user_input, adaptive_instruction, should_advance_topic)
+        if context is None:
+            return self.end_conversation()
         
-        next_question = self.gemini_client.generate_content(QUESTION_GENERATION_PROMPT, context)
+        with span("question_generation"):
+            next_question = self._indexed_question(context, should_advance_topic)
+            if next_question is not None:
+                if speculative is not None:
+                    speculative.cancel()
+            else:
+                try:
+                    next_question = speculative.result() if speculative is not None else self._generate_question(context)
+                    self._index_question(context, next_question, should_advance_topic)
+                except resilience.LLMUnavailableError as e:
+                    next_question = self._fallback_question(context, e)
         
+        self._commit_question(context, next_question)
         self.history.append({"role": "system", "content": next_question})
         return next_question
 
     def end_conversation(self):
         """Ends the conversation and generates the final report."""
+        closing_message = self._close_conversation()
+        if self.defer_report:
+            # The caller runs report_job() in the background
+            self.report_pending = True
+            return closing_message
+        
+        # --- PHASE 6: Result Generation ---
+        # The report is far longer than a turn's calls, so it is not held to the turn's deadline
+        resilience.clear_deadline()
+        try:
+            with span("report"):
+                report_json = self.gemini_client.generate_json(RESULT_GENERATION_PROMPT, self._report_context())
+            return closing_message + self._record_report(report_json)
+                
+        except Exception as e:
+            log(f"Error generating report: {e}")
+            return closing_message + "\n(Report generation failed due to an error)."
+
+    def report_job(self):
+        """
+        Generates a deferred report (see defer_report).
+        Returns {"report": ..., "message": summary text}; raises on an empty report so the job can be retried.
+        A retry after the report was recorded (e.g. its save failed) returns it again
+        without another call, so the summary and the analytics row are only added once.
+        """
+        if self.report and not self.report_pending:
+            return {"report": self.report, "message": self._report_message()}
+        with span("report"):
+            report_json = self.gemini_client.generate_json(RESULT_GENERATION_PROMPT, self._report_context())
+        if not report_json:
+            raise ValueError("Empty or unparseable report")
+        self.report_pending = False
+        return {"report": report_json, "message": self._record_report(report_json)}
+
+    def _report_message(self):
+        """The summary text _record_report() appended to the history ("" if there is none)."""
+        for message in reversed(self.history):
+            if message["role"] == "system" and message["content"].startswith(REPORT_HEADER):
+                return message["content"]
+        return ""
+
+    def report_failed(self, error):
+        """Records that the deferred report was given up on, so it is no longer reported as pending."""
+        self.report_pending = False
+        self.report_error = str(error)
+
+    def _close_conversation(self):
+        """Moves to ENDED and records the closing message."""
         self.state = "ENDED"
+        if self.conversation_id is not None:
+            chat_context.CONTEXTS.discard(self.conversation_id)
         
         closing_message = "Thank you for your time. The assessment is complete. Generating your feedback report..."
         self.history.append({"role": "system", "content": closing_message})
+        return closing_message
+
+    def _report_context(self):
+        """Builds the variables for RESULT_GENERATION_PROMPT."""
+        persona_data = self.persona_engine.profile.get('assigned_persona', {})
+        candidate_name = self.persona_engine.profile.get('candidate_name', 'Candidate')
+        background = f"{self.persona_engine.profile.get('role_focus', 'N/A')} with {self.persona_engine.profile.get('years_experience', 'N/A')} years"
         
-        # --- PHASE 6: Result Generation ---
-        try:
-            persona_data = self.persona_engine.profile.get('assigned_persona', {})
-            candidate_name = self.persona_engine.profile.get('candidate_name', 'Candidate')
-            background = f"{self.persona_engine.profile.get('role_focus', 'N/A')} with {self.persona_engine.profile.get('years_experience', 'N/A')} years"
+        # Readable transcript, compacted with turn summaries if it would exceed the budget
+        self.transcript.sync(self.history)
+        
+        return self.budget.fit(RESULT_GENERATION_PROMPT, {
+            "candidate_name": candidate_name,
+            "persona_name": f"{persona_data.get('title', 'Interviewer')} ({persona_data.get('tone', 'Neutral')})",
+            "background": background,
+            "full_conversation": self.transcript.render
+        }, elastic=("full_conversation",))
+
+    def _record_report(self, report_json):
+        """Stores the report and returns the summary text appended to the chat ("" if there is no report)."""
+        self.report = report_json # Store report in controller state
+        
+        # Format a simple text summary to append to the chat
+        if not report_json:
+            return ""
+        self.completed_at = time.time()
+        answers = sum(1 for message in self.history if message["role"] == "user")
+        analytics.record(report_json, self.persona_engine.profile.get('persona_id'), self.started_at, self.completed_at, self.question_count, answers)
+        summary_text = (
+            f"{REPORT_HEADER}"
+            f"**Summary**: {report_json.get('profile_summary', 'N/A')}\n\n"
+            f"**Strengths**: {', '.join(report_json.get('strengths', []))}\n"
+            f"**Areas for Improvement**: {', '.join(report_json.get('improvement_areas', []))}\n"
+            f"**Overall Recommendation**: {report_json.get('overall_recommendation', 'N/A')}"
+        )
+        self.history.append({"role": "system", "content": summary_text})
+        return summary_text
+
+
+class AsyncConversationController(ConversationController):
+    """
+    asyncio counterpart of ConversationController.
+    Shares all state handling with the sync controller; only the Gemini calls are awaited.
+    Streaming (handle_response_stream) is only available on the sync controller.
+    """
+    client_class = AsyncGeminiClient
+
+    async def handle_response(self, user_input):
+        """Async version of ConversationController.handle_response."""
+        if self.state == "ENDED":
+            return "The conversation has ended. Please refresh to start a new assessment."
             
-            # Convert history to a readable transcript string
-            transcript = ""
-            for msg in self.history:
-                role = "Interviewer" if msg['role'] == "system" else "Candidate"
-                transcript += f"{role}: {msg['content']}\n\n"
+        self.history.append({"role": "user", "content": user_input})
+        
+        if user_input.lower() in ["bye", "exit", "quit"]:
+            return await self.end_conversation()
+
+        if self.state == "PROFILING":
+            with span("profiling"):
+                return await self._handle_profiling(user_input)
+        
+        if self.state == "ACTIVE":
+            return await self._handle_active_interview(user_input)
+
+        return "Error: Unknown State"
+
+    async def _handle_profiling(self, user_input):
+        self.persona_engine.process_answer(user_input)
+        
+        if not self.persona_engine.profiling_complete:
+            return self._next_profiling_question()
             
-            context = {
-                "candidate_name": candidate_name,
-                "persona_name": f"{persona_data.get('title', 'Interviewer')} ({persona_data.get('tone', 'Neutral')})",
-                "background": background,
-                "full_conversation": transcript
+        header, context = self._begin_interview()
+        first_interview_question = question_pool.take(self.persona_engine.profile.get('persona_id'))
+        if first_interview_question is None:
+            try:
+                first_interview_question = await self.gemini_client.generate_content(QUESTION_GENERATION_PROMPT, context)
+            except resilience.LLMUnavailableError as e:
+                first_interview_question = self._fallback_question(context, e)
+        
+        transition_msg = header + first_interview_question
+        self.history.append({"role": "system", "content": transition_msg})
+        return transition_msg
+
+    async def _analyze(self, analysis_context):
+        batcher = analysis_batcher.get_batcher()
+        with span("analysis"):
+            try:
+                if batcher is None:
+                    result = await self.gemini_client.generate_json(self._analysis_template(), analysis_context)
+                else:
+                    # The batcher blocks until the batch is answered, so wait for it off the event loop
+                    # (individual fallbacks use the shared sync client)
+                    result = await asyncio.to_thread(batcher.analyze, self._analysis_template(), analysis_context, self._analysis_persona_name())
+            except resilience.LLMUnavailableError as e:
+                return self._fallback_analysis(analysis_context, e)
+        fast_path.shadow(analysis_context["last_question"], analysis_context["user_response"], result)
+        return result
+
+    async def _handle_active_interview(self, user_input):
+        analysis_context = self._analysis_context(user_input)
+        analysis_result = self._fast_analysis(analysis_context)
+        
+        # Speculative branches run as tasks alongside the analysis; losers are cancelled
+        branches = speculation.max_branches() if analysis_result is None else 0
+        candidates = {}
+        if branches:
+            candidates = {
+                action: asyncio.create_task(self._generate_question(context))
+                for action, context in self._speculation_plan(user_input, branches).items()
             }
-            
-            from prompts import RESULT_GENERATION_PROMPT
-            report_json = self.gemini_client.generate_json(RESULT_GENERATION_PROMPT, context)
-            
-            self.report = report_json # Store report in controller state
-            
-            # Format a simple text summary to append to the chat
-            if report_json:
-                summary_text = (
-                    f"\n\n--- ASSESSMENT REPORT ---\n"
-                    f"**Summary**: {report_json.get('profile_summary', 'N/A')}\n\n"
-                    f"**Strengths**: {', '.join(report_json.get('strengths', []))}\n"
-                    f"**Areas for Improvement**: {', '.join(report_json.get('improvement_areas', []))}\n"
-                    f"**Overall Recommendation**: {report_json.get('overall_recommendation', 'N/A')}"
-                )
-                self.history.append({"role": "system", "content": summary_text})
-                return closing_message + summary_text
+        
+        if analysis_result is None:
+            analysis_result = await self._analyze(analysis_context)
+        adaptive_instruction, should_advance_topic, action = self._apply_analysis(analysis_result, user_input)
+        
+        chosen = candidates.pop(action, None)
+        if branches and self._ends_interview(should_advance_topic):
+            # No next question is asked, so no branch could have been used
+            for task in [chosen, *candidates.values()]:
+                if task is not None:
+                    task.cancel()
+        elif branches:
+            wasted = cancelled = 0
+            for task in candidates.values():
+                if task.done():
+                    wasted += 1
+                else:
+                    task.cancel()
+                    cancelled += 1
+            speculation.STATS.record(action, chosen is not None, len(candidates) + (chosen is not None), wasted, cancelled)
+        
+        context = self._next_question_context(user_input, adaptive_instruction, should_advance_topic)
+        if context is None:
+            return await self.end_conversation()
+        
+        with span("question_generation"):
+            next_question = self._indexed_question(context, should_advance_topic)
+            if next_question is not None:
+                if chosen is not None:
+                    chosen.cancel()
+            else:
+                try:
+                    next_question = await chosen if chosen is not None else await self._generate_question(context)
+                    self._index_question(context, next_question, should_advance_topic)
+                except resilience.LLMUnavailableError as e:
+                    next_question = self._fallback_question(context, e)
+        
+        self._commit_question(context, next_question)
+        self.history.append({"role": "system", "content": next_question})
+        return next_question
+
+    def report_job(self):
+        """Runs on a report worker thread, so it uses the shared sync client."""
+        self.gemini_client = CLIENT_POOL.get()
+        return super().report_job()
+
+    async def end_conversation(self):
+        """Async version of ConversationController.end_conversation."""
+        closing_message = self._close_conversation()
+        if self.defer_report:
+            self.report_pending = True
+            return closing_message
+        
+        resilience.clear_deadline()
+        try:
+            with span("report"):
+                report_json = await self.gemini_client.generate_json(RESULT_GENERATION_PROMPT, self._report_context())
+            return closing_message + self._record_report(report_json)
                 
         except Exception as e:
-            print(f"Error generating report: {e}")
+            log(f"Error generating report: {e}")
             return closing_message + "\n(Report generation failed due to an error)."
-
-        return closing_message
@@ -0,0 +1,459 @@
+import asyncio
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+import metrics
+from metrics import log
+
+
+class ConversationStore:
+    """
+    Server-side conversation state in SQLite (WAL mode).
+    Each conversation has one row holding the compact controller state (see
+    ConversationController.to_dict) and an append-only table of messages, so a
+    turn only writes the state row and the messages it added. Turns submitted
+    with an idempotency key also store their result (see TurnLocks), and
+    `leases` holds the turn lock of each conversation across worker processes.
+    Use path=":memory:" for an in-process store (tests, single worker).
+    """
+    def __init__(self, path="conversations.db", ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._shared_conn = None
+        self._shared_lock = threading.Lock()
+        if path == ":memory:":
+            # A :memory: database exists per connection, so every thread shares one
+            self._shared_conn = sqlite3.connect(path, check_same_thread=False)
+
+        with self._connection() as conn:
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "  id TEXT PRIMARY KEY,"
+                "  state TEXT NOT NULL,"
+                "  message_count INTEGER NOT NULL DEFAULT 0,"
+                "  updated_at REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at);"
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "  conversation_id TEXT NOT NULL,"
+                "  seq INTEGER NOT NULL,"
+                "  role TEXT NOT NULL,"
+                "  content TEXT NOT NULL,"
+                "  PRIMARY KEY (conversation_id, seq)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "  conversation_id TEXT NOT NULL,"
+                "  turn_id TEXT NOT NULL,"
+                "  result TEXT NOT NULL,"
+                "  PRIMARY KEY (conversation_id, turn_id)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "  conversation_id TEXT PRIMARY KEY,"
+                "  owner TEXT NOT NULL,"
+                "  expires_at REAL NOT NULL);"
+            )
+
+    def load(self, conversation_id, since=0):
+        """
+        Returns (state dict, history list), or None for an unknown conversation.
+        With since > 0 the history only holds the messages from that sequence number on.
+        """
+        with self._connection() as conn:
+            row = conn.execute("SELECT state FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+            if row is None:
+                return None
+            messages = conn.execute(
+                "SELECT role, content FROM messages WHERE conversation_id = ? AND seq >= ? ORDER BY seq",
+                (conversation_id, since),
+            ).fetchall()
+        return json.loads(row[0]), [{"role": role, "content": content} for role, content in messages]
+
+    def save(self, conversation_id, state, history, saved_count=0, turns=(), lease=None):
+        """
+        Writes the state and appends history[saved_count:] (the messages not stored yet).
+        Stored messages beyond the history are removed, and with saved_count=0 (a
+        conversation written from scratch, e.g. restarted by /api/start) so are its
+        turn results. `turns` holds (turn id, result dict) pairs of the turns these
+        messages complete, written in the same transaction. With a `lease` owner (see
+        TurnLocks.lease) nothing is written, and LeaseLostError is raised, unless that
+        lease is still held. Returns the new stored message count.
+        """
+        new_messages = [
+            (conversation_id, seq, msg["role"], msg["content"])
+            for seq, msg in enumerate(history[saved_count:], start=saved_count)
+        ]
+        with self._connection() as conn:
+            if lease is not None and conn.execute(
+                "UPDATE leases SET owner = owner WHERE conversation_id = ? AND owner = ? AND expires_at >= ?",
+                (conversation_id, lease, time.time()),
+            ).rowcount != 1:
+                raise LeaseLostError(f"Conversation {conversation_id}: the turn lease expired and may be held by another worker")
+            # Messages past the new history are left over from a conversation restarted under the same id
+            conn.execute("DELETE FROM messages WHERE conversation_id = ? AND seq >= ?", (conversation_id, len(history)))
+            if saved_count == 0:
+                conn.execute("DELETE FROM turns WHERE conversation_id = ?", (conversation_id,))
+            conn.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)", new_messages)
+            conn.executemany(
+                "INSERT OR REPLACE INTO turns VALUES (?, ?, ?)",
+                [(conversation_id, turn_id, json.dumps(result, separators=(",", ":"))) for turn_id, result in turns],
+            )
+            conn.execute(
+                "INSERT INTO conversations (id, state, message_count, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET state = excluded.state, "
+                "message_count = excluded.message_count, updated_at = excluded.updated_at",
+                (conversation_id, json.dumps(state, separators=(",", ":")), len(history), time.time()),
+            )
+        return len(history)
+
+    def message_count(self, conversation_id):
+        """Number of stored messages of a conversation (0 for an unknown one)."""
+        with self._connection() as conn:
+            row = conn.execute("SELECT message_count FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        return row[0] if row else 0
+
+    def load_turn(self, conversation_id, turn_id):
+        """The result stored for an idempotency key, or None."""
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT result FROM turns WHERE conversation_id = ? AND turn_id = ?", (conversation_id, turn_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def acquire_lease(self, conversation_id, owner, ttl):
+        """Takes the conversation's turn lease for `ttl` seconds unless another owner holds an unexpired one."""
+        now = time.time()
+        with self._connection() as conn:
+            return conn.execute(
+                "INSERT INTO leases VALUES (?, ?, ?) "
+                "ON CONFLICT (conversation_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at < ?",
+                (conversation_id, owner, now + ttl, now),
+            ).rowcount == 1
+
+    def renew_lease(self, conversation_id, owner, ttl):
+        """Extends a lease held by `owner` to `ttl` seconds from now; False if another owner has it (or it is gone)."""
+        with self._connection() as conn:
+            return conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE conversation_id = ? AND owner = ?",
+                (time.time() + ttl, conversation_id, owner),
+            ).rowcount == 1
+
+    def release_lease(self, conversation_id, owner):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM leases WHERE conversation_id = ? AND owner = ?", (conversation_id, owner))
+
+    def iter_conversations(self, page_size=200):
+        """Yields (conversation id, state dict, history list) for every stored conversation, in id order, a page at a time."""
+        last_id = ""
+        while True:
+            with self._connection() as conn:
+                rows = conn.execute(
+                    "SELECT id FROM conversations WHERE id > ? ORDER BY id LIMIT ?", (last_id, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            for (conversation_id,) in rows:
+                loaded = self.load(conversation_id)
+                if loaded is not None:  # Expired since the page was read
+                    yield (conversation_id, *loaded)
+            last_id = rows[-1][0]
+
+    def delete(self, conversation_id):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+            conn.execute("DELETE FROM turns WHERE conversation_id = ?", (conversation_id,))
+            conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    def expire(self, max_age=None):
+        """Deletes every conversation idle for longer than max_age seconds (default: ttl). Returns the count."""
+        cutoff = time.time() - (self.ttl if max_age is None else max_age)
+        with self._connection() as conn:
+            for table in ("messages", "turns"):
+                conn.execute(
+                    f"DELETE FROM {table} WHERE conversation_id IN "
+                    "(SELECT id FROM conversations WHERE updated_at < ?)", (cutoff,)
+                )
+            conn.execute("DELETE FROM leases WHERE expires_at < ?", (time.time(),))
+            return conn.execute("DELETE FROM conversations WHERE updated_at < ?", (cutoff,)).rowcount
+
+    def start_expiry(self, interval=600):
+        """Runs expire() every `interval` seconds on a daemon thread."""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    removed = self.expire()
+                    if removed:
+                        log(f"Expired {removed} conversations.")
+                except sqlite3.Error as e:
+                    log(f"Error expiring conversations: {e}")
+
+        thread = threading.Thread(target=run, name="conversation-expiry", daemon=True)
+        thread.start()
+        return thread
+
+    @contextmanager
+    def _connection(self):
+        """Yields a connection inside a transaction (one connection per thread for file databases)."""
+        if self._shared_conn is not None:
+            with self._shared_lock, self._shared_conn:
+                yield self._shared_conn
+            return
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        with conn:
+            yield conn
+
+
+class Checkpointer:
+    """
+    Saves a live conversation from a background thread, for transports that keep one
+    controller in memory across turns (the WebSocket endpoint). Snapshots are coalesced:
+    when turns arrive faster than the store writes, only the latest one is written.
+    """
+    def __init__(self, store, conversation_id, saved_count=0):
+        self.store = store
+        self.conversation_id = conversation_id
+        self.saved_count = saved_count
+        self._pending = None
+        self._turns = []
+        self._writing = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="conversation-checkpoint", daemon=True)
+        self._thread.start()
+
+    def submit(self, state, history, turns=(), lease=None):
+        """
+        Queues a snapshot. `history` is read later, so pass a copy of the controller's list.
+        Turn results and the lease (see ConversationStore.save) are kept until a snapshot is written.
+        """
+        with self._cond:
+            self._pending = (state, history, lease)
+            self._turns.extend(turns)
+            self._cond.notify_all()
+
+    def flush(self):
+        """Blocks until every submitted snapshot is written; returns the stored message count."""
+        with self._cond:
+            while self._pending is not None or self._writing:
+                self._cond.wait()
+            return self.saved_count
+
+    def close(self):
+        """Writes what is pending and stops the thread."""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                state, history, lease = self._pending
+                turns, self._turns = self._turns, []
+                self._pending = None
+                self._writing = True
+            saved_count = self.saved_count
+            try:
+                saved_count = self.store.save(self.conversation_id, state, history, saved_count, turns, lease)
+            except LeaseLostError as e:
+                # Another worker may have run turns meanwhile; the next turn reloads the stored state
+                log(f"Dropped checkpoint: {e}")
+            except sqlite3.Error as e:
+                # The messages stay unsaved and go out with the next snapshot
+                log(f"Error checkpointing conversation {self.conversation_id}: {e}")
+                with self._cond:
+                    self._turns[:0] = turns
+            with self._cond:
+                self.saved_count = saved_count
+                self._writing = False
+                self._cond.notify_all()
+
+
+# Polling interval bounds (seconds) while a turn waits for a lock held elsewhere
+LOCK_POLL_MIN = 0.01
+LOCK_POLL_MAX = 0.2
+
+
+class ConversationBusyError(Exception):
+    """Raised when another turn of the conversation holds its lock for longer than the wait allows."""
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LeaseLostError(ConversationBusyError):
+    """Raised by ConversationStore.save when the turn's lease ran out before the turn was saved."""
+
+
+# (conversation id, lease owner) of the turn lock held by the running turn
+_lease = contextvars.ContextVar("turn_lease", default=None)
+
+
+class TurnLocks:
+    """
+    Runs the turns of a conversation one at a time: a lock per conversation among the
+    threads of this process, then a lease row in the store among worker processes.
+    The lease expires after `ttl` seconds, so a crashed worker cannot block a
+    conversation for longer than that; a heartbeat thread renews the leases of running
+    turns every ttl/3 seconds, and saves made with lease() fail if one was lost anyway.
+    A turn that cannot get the lock within `wait` seconds raises ConversationBusyError.
+    """
+    def __init__(self, store, ttl=60.0, wait=30.0):
+        self.store = store
+        self.ttl = ttl
+        self.wait = wait
+        self._locks = {}  # conversation id -> [lock, holders and waiters]
+        self._leases = {}  # owner -> conversation id, for the heartbeat
+        self._heartbeat = None
+        self._lock = threading.Lock()
+
+    def lease(self, conversation_id):
+        """
+        The lease owner of the turn lock this context holds on the conversation, or None
+        (also in a copy of the context that outlived the turn, e.g. a report job).
+        """
+        held = _lease.get()
+        if held is None or held[0] != conversation_id:
+            return None
+        with self._lock:
+            return held[1] if held[1] in self._leases else None
+
+    @contextmanager
+    def hold(self, conversation_id):
+        """Holds the conversation's turn lock; yields True if it had to wait for another turn."""
+        started = time.monotonic()
+        entry = self._ref(conversation_id)
+        try:
+            contended = not entry[0].acquire(blocking=False)
+            if contended and not entry[0].acquire(timeout=self.wait):
+                raise ConversationBusyError(f"Conversation {conversation_id} is busy with another turn", retry_after=self.wait)
+            try:
+                owner = uuid.uuid4().hex
+                delay = LOCK_POLL_MIN
+                while not self.store.acquire_lease(conversation_id, owner, self.ttl):
+                    # Held by another worker process
+                    contended = True
+                    pause, delay = self._backoff(conversation_id, started, delay, "in another worker")
+                    time.sleep(pause)
+                metrics.TURN_LOCK_WAIT_SECONDS.observe(time.monotonic() - started)
+                token = self._start_lease(conversation_id, owner)
+                try:
+                    yield contended
+                finally:
+                    self._end_lease(conversation_id, owner, token)
+            finally:
+                entry[0].release()
+        finally:
+            self._unref(conversation_id, entry)
+
+    @asynccontextmanager
+    async def hold_async(self, conversation_id):
+        """
+        hold() for coroutines: the process lock and the lease are polled with
+        asyncio.sleep, so waiting for another turn does not block the event loop.
+        """
+        started = time.monotonic()
+        entry = self._ref(conversation_id)
+        try:
+            contended = False
+            delay = LOCK_POLL_MIN
+            while not entry[0].acquire(blocking=False):
+                contended = True
+                pause, delay = self._backoff(conversation_id, started, delay, "with another turn")
+                await asyncio.sleep(pause)
+            try:
+                owner = uuid.uuid4().hex
+                while not self.store.acquire_lease(conversation_id, owner, self.ttl):
+                    contended = True
+                    pause, delay = self._backoff(conversation_id, started, delay, "in another worker")
+                    await asyncio.sleep(pause)
+                metrics.TURN_LOCK_WAIT_SECONDS.observe(time.monotonic() - started)
+                token = self._start_lease(conversation_id, owner)
+                try:
+                    yield contended
+                finally:
+                    self._end_lease(conversation_id, owner, token)
+            finally:
+                entry[0].release()
+        finally:
+            self._unref(conversation_id, entry)
+
+    def _start_lease(self, conversation_id, owner):
+        """Registers a taken lease with the heartbeat and as this context's lease(); returns the context token."""
+        with self._lock:
+            self._leases[owner] = conversation_id
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._renew_leases, name="turn-lease-heartbeat", daemon=True)
+                self._heartbeat.start()
+        return _lease.set((conversation_id, owner))
+
+    def _end_lease(self, conversation_id, owner, token):
+        _lease.reset(token)
+        with self._lock:
+            del self._leases[owner]
+        self.store.release_lease(conversation_id, owner)
+
+    def _renew_leases(self):
+        """Heartbeat: keeps the leases of running turns from expiring, however long the turn takes."""
+        while True:
+            time.sleep(self.ttl / 3)
+            with self._lock:
+                leases = list(self._leases.items())
+            for owner, conversation_id in leases:
+                try:
+                    if not self.store.renew_lease(conversation_id, owner, self.ttl) and owner in self._leases:
+                        log(f"Lost the turn lease of conversation {conversation_id}")
+                except sqlite3.Error as e:
+                    log(f"Error renewing the turn lease of conversation {conversation_id}: {e}")
+
+    def _backoff(self, conversation_id, started, delay, where):
+        """(seconds to sleep, next delay) while polling, or ConversationBusyError once `wait` has passed."""
+        left = self.wait - (time.monotonic() - started)
+        if left <= 0:
+            raise ConversationBusyError(f"Conversation {conversation_id} is busy {where}", retry_after=self.wait)
+        return min(delay, left), min(delay * 2, LOCK_POLL_MAX)
+
+    def _ref(self, conversation_id):
+        """The conversation's process lock entry, counted as in use until _unref()."""
+        with self._lock:
+            entry = self._locks.setdefault(conversation_id, [threading.Lock(), 0])
+            entry[1] += 1
+        return entry
+
+    def _unref(self, conversation_id, entry):
+        with self._lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[conversation_id]
+
+
+def from_env():
+    """Creates the store from CONVERSATION_DB (path or :memory:) and CONVERSATION_TTL (seconds)."""
+    return ConversationStore(
+        path=os.environ.get("CONVERSATION_DB", "conversations.db"),
+        ttl=float(os.environ.get("CONVERSATION_TTL", "86400")),
+    )
+
+
+def turn_locks_from_env(store):
+    """Creates the turn locks for a store from TURN_LOCK_TTL and TURN_LOCK_WAIT (seconds)."""
+    return TurnLocks(
+        store,
+        ttl=float(os.environ.get("TURN_LOCK_TTL", "60")),
+        wait=float(os.environ.get("TURN_LOCK_WAIT", "30")),
+    )
@@ -0,0 +1,99 @@
+import os
+import re
+
+import metrics
+from metrics import log
+
+# "off": always call the LLM; "on": skip it when the heuristic is confident;
+# "shadow": always call the LLM and log whether the heuristic would have agreed
+MODE = os.environ.get("FAST_PATH", "off")
+# Minimum heuristic confidence (0-1) to skip the RESPONSE_ANALYSIS_PROMPT call
+THRESHOLD = float(os.environ.get("FAST_PATH_THRESHOLD", "0.8"))
+
+WORD = re.compile(r"[a-z0-9']+")
+
+# Whole answers that mean "no attempt", after lowercasing and dropping punctuation and fillers
+STOCK_PHRASES = {
+    "i don't know", "i dont know", "don't know", "dont know", "idk", "no idea", "i have no idea",
+    "not sure", "i'm not sure", "im not sure", "pass", "skip", "next", "next question", "no clue",
+    "n a", "na", "none", "nothing", "no", "yes", "ok", "okay", "maybe", "i can't answer", "i cant answer",
+    "can't say", "cant say", "no comment",
+}
+FILLERS = {"sorry", "honestly", "um", "uh", "hmm", "well", "really", "i", "guess"}
+# Words that signal an explained answer, so a short reply is not judged on length alone
+REASONING_MARKERS = {
+    "because", "since", "so", "therefore", "first", "then", "example", "instance", "tradeoff",
+    "trade", "depends", "if", "would", "measure", "test", "why", "how",
+}
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "is", "are", "was", "it", "you",
+    "your", "would", "how", "what", "do", "does", "did", "can", "could", "with", "this", "that",
+}
+
+DECISIONS = metrics.Counter("fast_path_decisions_total", "Heuristic analyzer outcomes (skipped_llm or deferred), by reason.", ("reason", "outcome"))
+SHADOW = metrics.Counter("fast_path_shadow_total", "Shadow-mode comparisons with the LLM analysis, by reason.", ("reason", "agree"))
+
+
+def analyze(last_question, answer):
+    """
+    Classifies trivial answers locally. Returns (analysis dict or None, confidence, reason);
+    the dict has the same shape as a RESPONSE_ANALYSIS_PROMPT result.
+    """
+    words = WORD.findall(answer.lower())
+    if not words:
+        return _result(1, "No answer given", "decrease_difficulty"), 0.99, "empty"
+
+    normalized = " ".join(words)
+    core = " ".join(word for word in words if word not in FILLERS)
+    if normalized in STOCK_PHRASES or core in STOCK_PHRASES:
+        return _result(1, "Did not attempt the question", "decrease_difficulty"), 0.95, "stock_phrase"
+
+    content = [word for word in words if word not in STOPWORDS]
+    question_words = set(WORD.findall(last_question.lower()))
+    if len(content) >= 3 and sum(word in question_words for word in content) / len(content) >= 0.9:
+        return _result(1, "Repeated the question instead of answering", "probe_deeper"), 0.9, "copied_question"
+
+    if len(words) <= 12 and not REASONING_MARKERS.intersection(words):
+        # The shorter the reply, the surer it is surface-level
+        confidence = 0.85 if len(words) <= 3 else 0.7 if len(words) <= 7 else 0.55
+        return _result(2, "Answer too brief to show reasoning", "probe_deeper"), confidence, "one_liner"
+
+    return None, 0.0, "substantive"
+
+
+def pre_analyze(last_question, answer):
+    """In "on" mode, returns the heuristic analysis when it is confident enough, else None."""
+    if MODE != "on":
+        return None
+    result, confidence, reason = analyze(last_question, answer)
+    if result is None or confidence < THRESHOLD:
+        DECISIONS.inc(reason=reason, outcome="deferred")
+        return None
+    DECISIONS.inc(reason=reason, outcome="skipped_llm")
+    log(f"[fast-path] {reason} (confidence {confidence:.2f}): {result['suggested_action']}, LLM analysis skipped")
+    return result
+
+
+def shadow(last_question, answer, llm_result):
+    """In "shadow" mode, logs and counts whether the heuristic agrees with the LLM's suggested_action."""
+    if MODE != "shadow" or not llm_result:
+        return
+    result, confidence, reason = analyze(last_question, answer)
+    if result is None:
+        return
+    agree = result["suggested_action"] == llm_result.get("suggested_action")
+    SHADOW.inc(reason=reason, agree=agree)
+    log(
+        f"[fast-path shadow] {reason} (confidence {confidence:.2f}, would skip: {confidence >= THRESHOLD}): "
+        f"heuristic={result['suggested_action']}/{result['quality_score']} "
+        f"llm={llm_result.get('suggested_action')}/{llm_result.get('quality_score')} agree={agree}"
+    )
+
+
+def _result(quality_score, weakness, action):
+    return {
+        "quality_score": quality_score,
+        "observed_strengths": [],
+        "observed_weaknesses": [weakness],
+        "suggested_action": action,
+    }
@@ -1,80 +1,394 @@
-import google.generativeai as genai
+import asyncio
+import datetime
 import os
 import json
+import re
+import threading
+import time
 from dotenv import load_dotenv
+from metrics import log
+from prompts import prompt_name
+from token_budget import estimate_tokens
+import metrics
+import prompt_templates
+import rate_scheduler
+import resilience
+import response_cache
 
 load_dotenv()
 
+# Attempts per call when Gemini answers with 429 Rate Limit
+MAX_RETRIES = 5
+
+# Using gemini-2.5-flash unless overridden
+MODEL_NAME = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+
+# "gemini" for the real API, "stub" for the offline stand-in in stub_backend.py
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")
+
+# Lifetime of the explicit Gemini context cache holding a chat context's system instruction (0 = never create one)
+CONTEXT_CACHE_TTL = float(os.environ.get("CHAT_CONTEXT_CACHE_TTL", "0"))
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def load_sdk():
+    """
+    Imports and configures google.generativeai on first use.
+    The SDK pulls in the whole gRPC stack, so it is kept out of module import
+    to let a worker boot and serve static pages before it is loaded.
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                
+                api_key = os.environ.get("GEMINI_API_KEY")
+                if not api_key:
+                    # Fallback or error logging can go here.
+                    # In production, we'd raise an error.
+                    log("Warning: GEMINI_API_KEY not found in environment variables.")
+                else:
+                    genai.configure(api_key=api_key)
+                _genai = genai
+    return _genai
+
+
+def create_model(model_name, generation_config=None, backend=LLM_BACKEND, system_instruction=None):
+    """
+    Builds the model object a client sends its prompts to. Any backend provides
+    generate_content(prompt, stream=False) and generate_content_async(prompt),
+    returning responses (or, when streaming, an iterable of chunks) with a `.text`.
+    The prompt is a string or a list of chat contents ({"role", "parts"} dicts).
+    """
+    if backend == "stub":
+        import stub_backend
+        return stub_backend.StubModel(model_name, generation_config, system_instruction=system_instruction)
+    if backend != "gemini":
+        raise ValueError(f"Unknown LLM_BACKEND {backend!r} (expected 'gemini' or 'stub')")
+    genai = load_sdk()
+    if system_instruction and CONTEXT_CACHE_TTL > 0:
+        try:
+            # Store the prefix server-side so turns only send their own tokens
+            cached = genai.caching.CachedContent.create(
+                model=f"models/{model_name}",
+                system_instruction=system_instruction,
+                ttl=datetime.timedelta(seconds=CONTEXT_CACHE_TTL),
+            )
+            return genai.GenerativeModel.from_cached_content(cached, generation_config=generation_config)
+        except Exception as e:
+            # E.g. a prefix below the model's minimum cache size; fall back to implicit prefix caching
+            log(f"Context cache unavailable, sending the system instruction with each call: {e}")
+    return genai.GenerativeModel(model_name, generation_config=generation_config, system_instruction=system_instruction)
+
+
 class GeminiClient:
     """
     Wrapper for Google's Gemini API to handle prompt execution.
+    Instances are thread-safe; use CLIENT_POOL.get() to share one per process.
     """
-    def __init__(self):
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            # Fallback or error logging can go here.
-            # In production, we'd raise an error.
-            print("Warning: GEMINI_API_KEY not found in environment variables.")
-        else:
-            genai.configure(api_key=api_key)
-            
-        # Using gemini-1.5-flash per user request
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+    # Whether CLIENT_POOL may hand the same instance to every caller
+    shared = True
+
+    def __init__(self, model_name=MODEL_NAME, cache=None, generation_config=None, scheduler=None, backend=LLM_BACKEND, breaker=None):
+        self.model_name = model_name
+        self.backend = backend
+        # Optional ResponseCache shared by the clients of CLIENT_POOL
+        self.cache = cache
+        # Optional rate_scheduler.AdmissionScheduler every call waits on before it is sent
+        self.scheduler = scheduler
+        # Optional resilience.CircuitBreaker shared by the clients of CLIENT_POOL
+        self.breaker = breaker
+        self.generation_config = generation_config or {}
+        self._model = None
+        self._model_lock = threading.Lock()
+        # System instruction -> (model, created at), for calls made in a chat_context.ChatContext
+        self._context_models = {}
+
+    @property
+    def model(self):
+        """The backend model, created (and the SDK imported) on first use."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = create_model(self.model_name, self.generation_config or None, self.backend)
+        return self._model
 
-    def generate_content(self, prompt, context_vars=None):
+    def generate_content(self, prompt, context_vars=None, use_cache=True, priority=None, chat=None):
         """
         Substitutes variables into the prompt and calls the Gemini API.
         
         Args:
-            prompt (str): The raw prompt template.
+            prompt (str | PromptTemplate): The raw prompt template.
             context_vars (dict): Dictionary of variables to replace in the template.
+            use_cache (bool): Set to False to always make a live call.
+            priority (int): rate_scheduler priority class (defaults to the prompt's class).
+            chat (chat_context.ChatContext): Send the prompt as the next turn of this context
+                (after its system instruction and recent exchanges) instead of on its own.
             
         Returns:
             str: The generated text response.
+        
+        Raises:
+            rate_scheduler.SchedulerBusyError: The call could not be admitted in time.
+            resilience.LLMUnavailableError: The call failed, ran past the turn deadline or the circuit is open.
         """
-        if context_vars:
-            for key, value in context_vars.items():
-                prompt = prompt.replace(f"{{{{{key}}}}}", str(value))
+        started = time.perf_counter()
+        cache_key, prompt, priority, name = self._prepare(prompt, context_vars, use_cache and chat is None, priority)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return self._observe(name, started, prompt, cached, "cache")
+        model, payload, prompt = self._request(prompt, chat, name)
+
+        def send():
+            return model.generate_content(payload, **resilience.request_options())
+
+        def duplicate():
+            self._admit(prompt, priority, chat)
+            return send()
         
         # Retry loop for 429 Rate Limit
-        max_retries = 5
-        import time
-        import re
-        
-        for attempt in range(max_retries):
+        for attempt in range(MAX_RETRIES):
+            self._begin_attempt(name, started, prompt, priority, chat)
+            attempt_started = time.perf_counter()
             try:
-                # Disable safety settings for interview context if needed, but default is usually fine.
-                response = self.model.generate_content(prompt)
-                return response.text.strip()
+                response = resilience.hedged(name, send, duplicate, hedge=priority <= rate_scheduler.ANALYSIS)
+                text = self._store(cache_key, response.text.strip())
+                self._succeed(name, attempt_started)
+                return self._observe(name, started, prompt, text, "ok")
             except Exception as e:
-                error_str = str(e)
-                # Check for 429 error
-                if "429" in error_str:
-                    if attempt < max_retries - 1:
-                        # Try to parse wait time from error message
-                        wait_match = re.search(r'retry in (\d+(\.\d+)?)s', error_str)
-                        if wait_match:
-                            wait_time = float(wait_match.group(1)) + 1 # Add 1s buffer
-                        else:
-                            wait_time = (attempt + 1) * 5  # Fallback backoff: 5, 10, 15...
-                        
-                        print(f"Rate limit hit. Retrying in {wait_time:.1f} seconds...")
-                        time.sleep(wait_time)
+                wait_time = self._retry_wait(str(e), attempt)
+                if wait_time is not None and self._backoff_allowed(wait_time):
+                    self._note_retry(name, wait_time)
+                    self._backoff(wait_time)
+                    continue
+                raise self._give_up(name, started, prompt, e) from e
+
+    def generate_content_stream(self, prompt, context_vars=None, use_cache=True, priority=None, chat=None):
+        """
+        Streaming variant of generate_content. Yields the response text chunk by chunk.
+        Closing the generator early (e.g. the client disconnected) cancels the upstream call.
+        Failures raise like generate_content, before or between chunks.
+        """
+        started = time.perf_counter()
+        cache_key, prompt, priority, name = self._prepare(prompt, context_vars, use_cache and chat is None, priority)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield self._observe(name, started, prompt, cached, "cache")
+                return
+        model, payload, prompt = self._request(prompt, chat, name)
+        
+        response = chunks = None
+        parts = []
+        outcome = "cancelled"
+        try:
+            # 429s can only be retried before the first chunk has been handed out
+            for attempt in range(MAX_RETRIES):
+                outcome = None  # Failures are observed by _give_up
+                self._begin_attempt(name, started, prompt, priority, chat)
+                outcome = "cancelled"
+                attempt_started = time.perf_counter()
+                try:
+                    response = model.generate_content(payload, stream=True, **resilience.request_options())
+                    break
+                except Exception as e:
+                    wait_time = self._retry_wait(str(e), attempt)
+                    if wait_time is not None and self._backoff_allowed(wait_time):
+                        self._note_retry(name, wait_time)
+                        self._backoff(wait_time)
                         continue
-                
-                # If not 429 or retries exhausted:
-                error_msg = f"Gemini API Error: {error_str}\n"
-                print(error_msg)
-                # Keep error silent in UI but log it
-                return f"DEBUG ERROR: {error_str}"
+                    outcome = None
+                    raise self._give_up(name, started, prompt, e) from e
+            
+            try:
+                chunks = iter(response)
+                for chunk in chunks:
+                    text = chunk.text
+                    if not parts:
+                        text = text.lstrip()
+                    if text:
+                        parts.append(text)
+                        yield text
+            except Exception as e:
+                outcome = None
+                raise self._give_up(name, started, prompt, e) from e
+            self._store(cache_key, "".join(parts).strip())
+            self._succeed(name, attempt_started)
+            outcome = "ok"
+        finally:
+            self._close_stream(response, chunks)
+            if outcome is not None:
+                self._observe(name, started, prompt, "".join(parts), outcome)
 
-    def generate_json(self, prompt, context_vars=None):
+    def _prepare(self, prompt, context_vars, use_cache, priority=None):
+        """Renders the prompt and returns (cache key or None, rendered prompt, priority class, prompt name)."""
+        cache_key = None
+        name = prompt_name(prompt)
+        rendered = self._render(prompt, context_vars)
+        if use_cache and self.cache is not None and self.cache.is_cacheable(name):
+            cache_key = self.cache.make_key(rendered, self.model_name, self.generation_config)
+        if priority is None:
+            priority = rate_scheduler.priority_for(name)
+        return cache_key, rendered, priority, name
+
+    @staticmethod
+    def _observe(name, started, rendered, text, outcome):
+        """Records the latency and prompt/response sizes of a finished call; returns text."""
+        metrics.LLM_CALL_SECONDS.observe(time.perf_counter() - started, prompt=name, outcome=outcome)
+        metrics.LLM_PROMPT_TOKENS.observe(estimate_tokens(rendered), prompt=name)
+        metrics.LLM_RESPONSE_TOKENS.observe(estimate_tokens(text), prompt=name)
+        return text
+
+    @staticmethod
+    def _note_retry(name, wait_time):
+        log(f"Rate limit hit. Retrying in {wait_time:.1f} seconds...")
+        metrics.LLM_RETRIES.inc(prompt=name)
+        metrics.LLM_BACKOFF_SECONDS.inc(wait_time, prompt=name)
+
+    def _request(self, rendered, chat, name):
+        """
+        Returns (model, payload, sent text) for a rendered prompt: the shared model and the
+        prompt itself, or for a chat context its persona model and the context's contents.
+        The sent text excludes the system instruction, which is the reused prefix.
+        """
+        if chat is None:
+            return self.model, rendered, rendered
+        contents = chat.contents(rendered)
+        metrics.LLM_CONTEXT_PREFIX_TOKENS.inc(estimate_tokens(chat.system_instruction), prompt=name)
+        return self._context_model(chat.system_instruction), contents, "\n".join(part for content in contents for part in content["parts"])
+
+    def _context_model(self, system_instruction):
+        """The model for a chat context's system instruction, one per persona (rebuilt when its context cache expires)."""
+        entry = self._context_models.get(system_instruction)
+        # Renew an explicit context cache a minute before it expires
+        if entry is None or (CONTEXT_CACHE_TTL > 0 and time.monotonic() - entry[1] > CONTEXT_CACHE_TTL - 60):
+            with self._model_lock:
+                entry = self._context_models.get(system_instruction)
+                if entry is None or (CONTEXT_CACHE_TTL > 0 and time.monotonic() - entry[1] > CONTEXT_CACHE_TTL - 60):
+                    model = create_model(self.model_name, self.generation_config or None, self.backend, system_instruction)
+                    entry = self._context_models[system_instruction] = (model, time.monotonic())
+        return entry[0]
+
+    def _admit(self, sent, priority, chat=None):
+        """Waits for the scheduler to admit the call, at most until the turn's deadline (no-op without a scheduler)."""
+        if self.scheduler is not None:
+            # The rate budget counts the whole input, reused prefix included
+            self.scheduler.acquire(priority, sent if chat is None else chat.system_instruction + sent, timeout=resilience.remaining())
+
+    def _begin_attempt(self, name, started, sent, priority, chat=None):
+        """Checks the turn's deadline and the circuit breaker, then waits for admission."""
+        try:
+            resilience.check(name)
+            if self.breaker is not None:
+                self.breaker.allow()
+        except resilience.LLMUnavailableError as e:
+            raise self._give_up(name, started, sent, e, attempted=False) from None
+        try:
+            self._admit(sent, priority, chat)
+        except BaseException:
+            if self.breaker is not None:
+                self.breaker.release()
+            raise
+
+    def _succeed(self, name, attempt_started):
+        """Records a successful attempt with the breaker and the hedge latency tracker."""
+        if self.breaker is not None:
+            self.breaker.record_success()
+        resilience.TRACKER.record(name, time.perf_counter() - attempt_started)
+
+    def _give_up(self, name, started, sent, error, attempted=True):
+        """
+        Records a call that failed for good and returns the LLMUnavailableError to raise.
+        Failed attempts count towards the circuit breaker; calls stopped before an
+        attempt (deadline passed, circuit open) do not.
+        """
+        if isinstance(error, resilience.CircuitOpenError):
+            outcome = "circuit_open"
+        elif isinstance(error, resilience.DeadlineExceeded) or resilience.remaining() == 0:
+            outcome = "timeout"
+            if not isinstance(error, resilience.DeadlineExceeded):
+                metrics.LLM_DEADLINE_EXCEEDED.inc(prompt=name)
+                error = resilience.DeadlineExceeded(f"Turn deadline exceeded during the {name} call: {error}")
+        else:
+            outcome = "error"
+            error = error if isinstance(error, resilience.LLMUnavailableError) else resilience.LLMUnavailableError(f"Gemini API Error: {error}")
+        if attempted and self.breaker is not None:
+            self.breaker.record_failure()
+        log(f"{error}\n")
+        self._observe(name, started, sent, "", outcome)
+        return error
+
+    def _backoff_allowed(self, wait_time):
+        """Whether a 429 backoff of wait_time seconds still ends before the turn's deadline."""
+        left = resilience.remaining()
+        if self.breaker is not None:
+            self.breaker.release()
+        return left is None or wait_time < left
+
+    def _backoff(self, wait_time):
+        """After a 429: pause the shared scheduler so every caller backs off, or just sleep."""
+        if self.scheduler is not None:
+            self.scheduler.backoff(wait_time)
+        else:
+            time.sleep(wait_time)
+
+    def _store(self, cache_key, text):
+        """Caches a successful response (if caching applies) and returns it."""
+        if cache_key:
+            self.cache.set(cache_key, text)
+        return text
+
+    @staticmethod
+    def _render(prompt, context_vars):
+        """Fills the {{key}} placeholders of a prompt string or PromptTemplate (raises PromptRenderError on a mismatch)."""
+        return prompt_templates.get_template(prompt).render(context_vars)
+
+    @staticmethod
+    def _retry_wait(error_str, attempt):
+        """Returns the seconds to wait before retrying a 429, or None if the call should not be retried."""
+        if "429" not in error_str or attempt >= MAX_RETRIES - 1:
+            return None
+        # Try to parse wait time from error message
+        wait_match = re.search(r'retry in (\d+(\.\d+)?)s', error_str)
+        if wait_match:
+            return float(wait_match.group(1)) + 1 # Add 1s buffer
+        return (attempt + 1) * 5  # Fallback backoff: 5, 10, 15...
+
+    @staticmethod
+    def _close_stream(response, chunks):
+        """Stops reading a streamed response and cancels its streaming RPC if it is still open."""
+        close = getattr(chunks, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                log(f"Error closing Gemini stream: {e}")
+        # Closing the chunk iterator only ends the SDK's wrapper generator: the gRPC call behind
+        # it keeps streaming (and holding its connection and quota) until the response is
+        # garbage-collected. The SDK has no public handle on the call, so cancel() is looked up
+        # on its stream iterator; responses without one (other SDK versions, the stub backend)
+        # are left to the close above.
+        cancel = getattr(getattr(response, "_iterator", None), "cancel", None)
+        if callable(cancel):
+            try:
+                cancel()
+            except Exception as e:
+                log(f"Error cancelling Gemini stream: {e}")
+
+    def generate_json(self, prompt, context_vars=None, use_cache=True, priority=None):
         """
         Generates content and attempts to parse it as JSON.
         Useful for Evaluation and Result Generation.
         """
-        text_response = self.generate_content(prompt, context_vars)
-        
+        return self._parse_json(self.generate_content(prompt, context_vars, use_cache, priority))
+
+    @staticmethod
+    def _parse_json(text_response):
+        """Parses a JSON response, tolerating markdown code fences. Returns {} on failure."""
         # Strip markdown code blocks if present
         if text_response.startswith("```json"):
             text_response = text_response[7:]
@@ -86,5 +400,112 @@ class GeminiClient:
         try:
             return json.loads(text_response.strip())
         except json.JSONDecodeError:
-            print(f"JSON Parse Error. Raw output: {text_response}")
+            log(f"JSON Parse Error. Raw output: {text_response}")
             return {}
+
+
+class AsyncGeminiClient(GeminiClient):
+    """
+    asyncio counterpart of GeminiClient.
+    Calls and 429 backoff are awaited, so a waiting call does not hold a thread.
+    """
+    # grpc.aio channels are bound to the event loop that created them, so async
+    # clients are not shared across requests (the SDK import and config still are)
+    shared = False
+
+    async def generate_content(self, prompt, context_vars=None, use_cache=True, priority=None, chat=None):
+        """Async version of GeminiClient.generate_content."""
+        started = time.perf_counter()
+        cache_key, prompt, priority, name = self._prepare(prompt, context_vars, use_cache and chat is None, priority)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return self._observe(name, started, prompt, cached, "cache")
+        model, payload, prompt = self._request(prompt, chat, name)
+
+        def send():
+            return model.generate_content_async(payload, **resilience.request_options())
+
+        async def duplicate():
+            await self._admit_async(prompt, priority, chat)
+            return await send()
+        
+        for attempt in range(MAX_RETRIES):
+            try:
+                resilience.check(name)
+                if self.breaker is not None:
+                    self.breaker.allow()
+            except resilience.LLMUnavailableError as e:
+                raise self._give_up(name, started, prompt, e, attempted=False) from None
+            try:
+                await self._admit_async(prompt, priority, chat)
+            except BaseException:
+                if self.breaker is not None:
+                    self.breaker.release()
+                raise
+            attempt_started = time.perf_counter()
+            try:
+                response = await resilience.hedged_async(name, send, duplicate, hedge=priority <= rate_scheduler.ANALYSIS)
+                text = self._store(cache_key, response.text.strip())
+                self._succeed(name, attempt_started)
+                return self._observe(name, started, prompt, text, "ok")
+            except Exception as e:
+                wait_time = self._retry_wait(str(e), attempt)
+                if wait_time is not None and self._backoff_allowed(wait_time):
+                    self._note_retry(name, wait_time)
+                    if self.scheduler is not None:
+                        self.scheduler.backoff(wait_time)
+                    else:
+                        await asyncio.sleep(wait_time)
+                    continue
+                raise self._give_up(name, started, prompt, e) from e
+
+    async def _admit_async(self, sent, priority, chat=None):
+        if self.scheduler is not None:
+            # Admission blocks, so wait for it off the event loop
+            await asyncio.to_thread(self._admit, sent, priority, chat)
+
+    async def generate_json(self, prompt, context_vars=None, use_cache=True, priority=None):
+        """Async version of GeminiClient.generate_json."""
+        return self._parse_json(await self.generate_content(prompt, context_vars, use_cache, priority))
+
+
+class GeminiClientPool:
+    """
+    Process-wide registry of clients, one per (client class, model name).
+    GenerativeModel is safe to share between threads and keeps its transport
+    connection warm, so controllers get a pooled client instead of building one per request.
+    """
+    def __init__(self, cache=None, scheduler=None, breaker=None):
+        self._clients = {}
+        self._lock = threading.Lock()
+        # One response cache for every client handed out (None when caching is off)
+        self.cache = cache
+        # One admission scheduler for every client, so all calls share the quota (None when unlimited)
+        self.scheduler = scheduler
+        # One circuit breaker for every client, so all calls see the upstream's health (None when off)
+        self.breaker = breaker
+
+    def get(self, client_class=GeminiClient, model_name=MODEL_NAME):
+        """Returns the shared client for this class and model (a fresh one for unshared classes)."""
+        if not client_class.shared:
+            return client_class(model_name, cache=self.cache, scheduler=self.scheduler, breaker=self.breaker)
+        key = (client_class, model_name)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = client_class(model_name, cache=self.cache, scheduler=self.scheduler, breaker=self.breaker)
+            return client
+
+    def warm(self, model_name=MODEL_NAME):
+        """Imports the SDK and builds the shared model ahead of the first request."""
+        self.get(GeminiClient, model_name).model
+
+    def warm_in_background(self, model_name=MODEL_NAME):
+        """Runs warm() on a daemon thread so it does not delay startup."""
+        thread = threading.Thread(target=self.warm, args=(model_name,), name="gemini-warmup", daemon=True)
+        thread.start()
+        return thread
+
+
+CLIENT_POOL = GeminiClientPool(cache=response_cache.from_env(), scheduler=rate_scheduler.from_env(), breaker=resilience.breaker_from_env())
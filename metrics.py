@@ -0,0 +1,157 @@
+import bisect
+import contextvars
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from cache hits to slow report calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Size buckets in (estimated) tokens
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+# Trace id of the turn being handled, attached to log lines and the X-Trace-Id header
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+class _Metric:
+    """A metric family keyed by label values. Updates take one lock and a dict lookup."""
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _label_text(self, key, extra=""):
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_values(items))
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_values(self, items):
+        return [f"{self.name}{self._label_text(key)} {_number(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last one is +Inf), then the sum
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def _render_values(self, items):
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), state[:-1]):
+                cumulative += count
+                le = 'le="{}"'.format(bound if bound == "+Inf" else _number(bound))
+                lines.append(f"{self.name}_bucket{self._label_text(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_number(state[-1])}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = []
+
+REQUEST_SECONDS = Histogram("interview_request_seconds", "HTTP request latency by endpoint and status.", ("endpoint", "status"))
+PHASE_SECONDS = Histogram(
+    "interview_phase_seconds",
+    "Time spent per phase: session_load, session_save, profiling, analysis, adaptive_logic, question_generation, report.",
+    ("phase",),
+)
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_seconds", "LLM call latency including retries, by prompt and outcome (ok, cache, error, timeout, circuit_open).", ("prompt", "outcome")
+)
+LLM_RETRIES = Counter("llm_retries_total", "LLM calls retried after a 429, by prompt.", ("prompt",))
+LLM_BACKOFF_SECONDS = Counter("llm_backoff_seconds_total", "Backoff requested after 429s, by prompt.", ("prompt",))
+LLM_PROMPT_TOKENS = Histogram("llm_prompt_tokens", "Estimated prompt size, by prompt.", ("prompt",), TOKEN_BUCKETS)
+LLM_RESPONSE_TOKENS = Histogram("llm_response_tokens", "Estimated response size, by prompt.", ("prompt",), TOKEN_BUCKETS)
+LLM_CONTEXT_PREFIX_TOKENS = Counter(
+    "llm_context_prefix_tokens_total", "Estimated system-instruction tokens reused as a cached prefix in chat-context mode, by prompt.", ("prompt",)
+)
+ADMISSION_WAIT_SECONDS = Histogram("llm_admission_wait_seconds", "Time waiting for the rate scheduler, by priority.", ("priority",))
+LLM_HEDGES = Counter("llm_hedged_requests_total", "Calls that sent a hedged duplicate, by prompt and the attempt that answered first.", ("prompt", "winner"))
+LLM_DEADLINE_EXCEEDED = Counter("llm_deadline_exceeded_total", "LLM calls given up at the turn deadline, by prompt.", ("prompt",))
+LLM_CIRCUIT_TRANSITIONS = Counter("llm_circuit_transitions_total", "Circuit breaker state changes, by new state.", ("state",))
+LLM_FALLBACKS = Counter("llm_fallbacks_total", "Turns served by the degraded path while the LLM was unavailable, by kind.", ("kind",))
+TURN_LOCK_WAIT_SECONDS = Histogram("chat_turn_lock_wait_seconds", "Time a chat turn waited for its conversation's lock.")
+TURNS_DEDUPLICATED = Counter(
+    "chat_turns_deduplicated_total",
+    "Chat turns answered with the result of an earlier submission of the same idempotency key, by whether that one was still running (in_flight) or done (completed).",
+    ("source",),
+)
+
+
+@contextmanager
+def span(phase):
+    """Times the block into interview_phase_seconds{phase=...}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_SECONDS.observe(time.perf_counter() - start, phase=phase)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def new_trace():
+    """Starts a trace for the current turn and returns its id."""
+    trace_id = uuid.uuid4().hex[:16]
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+def current_trace():
+    return _trace_id.get()
+
+
+def log(message):
+    """print() with the current trace id, so the lines of one turn can be grepped together."""
+    trace_id = _trace_id.get()
+    print(f"[trace={trace_id}] {message}" if trace_id else message)
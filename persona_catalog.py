@@ -0,0 +1,148 @@
+"""
+Persona catalog: seniority tiers and role domains loaded from a JSON file
+(personas.json, or PERSONA_CATALOG).
+
+A persona id is "<seniority>-<domain>". Roles are matched against the domain
+keywords with a precompiled alias index, and each persona definition is built
+once, frozen and shared by every session that uses it; sessions only store the id.
+"""
+import json
+import os
+import re
+from types import MappingProxyType
+
+CATALOG_PATH = os.environ.get("PERSONA_CATALOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "personas.json"))
+
+# Role text and aliases are split into the same tokens ("Node.js" -> "node js", "C++" -> "c++")
+TOKEN = re.compile(r"[a-z0-9+#]+")
+
+
+def _phrase(text):
+    return " ".join(TOKEN.findall(text.lower()))
+
+
+class RoleMatcher:
+    """
+    Multi-pattern alias index. match() walks the role tokens once, extending a
+    phrase from each token only while it is still the prefix of some alias, so
+    the cost depends on the length of the role, not the size of the catalog.
+    Each domain scores the number of words of the distinct aliases it matched
+    (a two-word alias is more specific than one word); the highest score wins,
+    then the domain mentioned first in the role, then catalog order.
+    """
+    def __init__(self, domains):
+        self._aliases = {}
+        self._prefixes = set()
+        for priority, (domain_id, keywords) in enumerate(domains):
+            for keyword in keywords:
+                phrase = _phrase(keyword)
+                if not phrase or phrase in self._aliases:
+                    continue  # An alias belongs to the first domain that lists it
+                words = phrase.split(" ")
+                self._aliases[phrase] = (priority, domain_id, len(words))
+                for end in range(1, len(words)):
+                    self._prefixes.add(" ".join(words[:end]))
+
+    def match(self, role, default=None):
+        """Returns the id of the best matching domain, or default when no alias occurs in the role."""
+        tokens = TOKEN.findall(role.lower())
+        seen = set()
+        scores = {}  # domain id -> [score, first token position, catalog priority]
+        for start, token in enumerate(tokens):
+            phrase = token
+            end = start + 1
+            while True:
+                hit = self._aliases.get(phrase)
+                if hit is not None and phrase not in seen:
+                    seen.add(phrase)
+                    priority, domain_id, weight = hit
+                    entry = scores.setdefault(domain_id, [0, start, priority])
+                    entry[0] += weight
+                if phrase not in self._prefixes or end == len(tokens):
+                    break
+                phrase = f"{phrase} {tokens[end]}"
+                end += 1
+        if not scores:
+            return default
+        return min(scores, key=lambda domain_id: (-scores[domain_id][0], scores[domain_id][1], scores[domain_id][2]))
+
+
+class PersonaCatalog:
+    """Seniority tiers x domains, with role matching and interned persona definitions."""
+    def __init__(self, data):
+        self.tiers = sorted(data["seniority_levels"], key=lambda tier: tier["min_years"], reverse=True)
+        self.levels = {tier["id"]: tier for tier in self.tiers}
+        self.domains = {domain["id"]: domain for domain in data["domains"]}
+        self.default_domain = data.get("default_domain", "general")
+        self.matcher = RoleMatcher((domain["id"], domain.get("keywords", ())) for domain in data["domains"])
+        self.persona_ids = [f"{level}-{domain}" for level in self.levels for domain in self.domains]
+        self._personas = {}
+
+    @classmethod
+    def load(cls, path=CATALOG_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def assign(self, role, years):
+        """The persona id for a role description and whole years of experience."""
+        level = next((tier["id"] for tier in self.tiers if years >= tier["min_years"]), self.tiers[-1]["id"])
+        return f"{level}-{self.matcher.match(role, self.default_domain)}"
+
+    def __contains__(self, persona_id):
+        level, _, domain = persona_id.partition("-")
+        return level in self.levels and domain in self.domains
+
+    def get(self, persona_id):
+        """The shared, read-only persona definition for an id; raises KeyError for unknown ids."""
+        persona = self._personas.get(persona_id)
+        if persona is None:
+            # Two threads may build the same persona; setdefault keeps the first one
+            persona = self._personas.setdefault(persona_id, _freeze(self._build(persona_id)))
+        return persona
+
+    def _build(self, persona_id):
+        level_key, _, domain_key = persona_id.partition("-")
+        level = self.levels[level_key]
+        domain_info = self.domains[domain_key]
+        seniority = level["seniority"]
+        domain = domain_info["domain"]
+
+        return {
+            "persona_name": f"{seniority} {domain} Interviewer",
+            "target_users": f"Candidates aiming for {seniority} {domain} roles",
+            "background_assumptions": {
+                "education": domain_info["education"],
+                "experience_level": level["experience_level"],
+                "domain_exposure": domain
+            },
+            "what_persona_should_be_good_at": domain_info["expected_skills"],
+            "what_persona_may_struggle_with": domain_info["struggles"],
+            "assessment_focus": {
+                "dimension_1": "Logical Thinking",
+                "dimension_2": "Communication",
+                "dimension_3": "Adaptability"
+            },
+            "difficulty_level": {
+                "start_level": level["difficulty_start"],
+                "max_level": "Hard"
+            },
+            # Keep legacy fields for compatibility with existing prompts/controller until fully migrated
+            "title": f"{seniority} {domain} Interviewer",
+            "tone": level["tone"],
+            "philosophy": "Reasoning over syntax. Ask 'why' more than 'how'.",
+            "starting_difficulty": level["difficulty_start"],
+            "expected_skills": domain_info["expected_skills"],
+            "behavioral_traits": level["behavioral_focus"]
+        }
+
+
+def _freeze(value):
+    """Read-only copy: dicts become mappingproxies and lists tuples (use dict()/list() to get a mutable copy)."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+CATALOG = PersonaCatalog.load()
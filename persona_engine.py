@@ -1,3 +1,9 @@
+from persona_catalog import CATALOG
+
+# Every persona the engine can assign
+PERSONA_IDS = CATALOG.persona_ids
+
+
 class PersonaEngine:
     """
     Handles the profiling and persona assignment logic.
@@ -30,17 +36,26 @@ class PersonaEngine:
 
     def to_dict(self):
         """Serializes the engine state to a dictionary."""
+        profile = self.profile
+        if "persona_id" in profile:
+            # The persona is rebuilt from its id on load, no need to store the whole definition
+            profile = {key: value for key, value in profile.items() if key != "assigned_persona"}
         return {
-            "profile": self.profile,
+            "profile": profile,
             "profiling_complete": self.profiling_complete,
             "current_step": self.current_step
         }
 
     def from_dict(self, data):
         """Restores the engine state from a dictionary."""
-        self.profile = data.get("profile", {})
+        self.profile = dict(data.get("profile", {}))
         self.profiling_complete = data.get("profiling_complete", False)
         self.current_step = data.get("current_step", 0)
+        if "persona_id" in self.profile and "assigned_persona" not in self.profile:
+            if self.profile["persona_id"] not in CATALOG:
+                # The catalog changed since this session was saved; match the role again
+                self.assign_persona()
+            self.profile["assigned_persona"] = self.build_persona(self.profile["persona_id"])
 
     def get_next_question(self):
         """Returns the next profiling question or None if complete."""
@@ -64,7 +79,8 @@ class PersonaEngine:
 
     def assign_persona(self):
         """
-        Rule-based logic to assign an interviewer persona based on the profile.
+        Rule-based logic to assign an interviewer persona based on the profile,
+        using the tiers and role keywords of the persona catalog.
         """
         role = self.profile.get("role_focus", "").lower()
         years = self.profile.get("years_experience", "0")
@@ -75,75 +91,15 @@ class PersonaEngine:
         except ValueError:
             years_int = 0
 
-        # Determine Seniority & Base Profile
-        if years_int > 5:
-            experience_level = "Experienced"
-            seniority = "Senior"
-            tone = "peer-to-peer, architectural, high-level"
-            difficulty_start = "Hard"
-            behavioral_focus = ["Leadership", "System Design", "Mentorship"]
-        elif years_int > 2:
-            experience_level = "Mid-Level"
-            seniority = "Mid-Level"
-            tone = "practical, hands-on, balanced"
-            difficulty_start = "Medium"
-            behavioral_focus = ["Problem Solving", "Code Quality", "Collaboration"]
-        else:
-            experience_level = "Fresher"
-            seniority = "Junior"
-            tone = "mentorship, fundamental, encouraging"
-            difficulty_start = "Easy"
-            behavioral_focus = ["Curiosity", "Logic", "Learning Agility"]
-
-        # Determine Domain & Skills
-        if "python" in role or "backend" in role or "django" in role or "flask" in role:
-            domain = "Backend Engineering"
-            expected_skills = ["Data Structures", "Algorithms", "Database Design"]
-            struggles = ["System Design", "Scalability", "Microservices"]
-            educational_background = "Computer Science or related field"
-        elif "react" in role or "frontend" in role or "javascript" in role or "css" in role:
-            domain = "Frontend Engineering"
-            expected_skills = ["UI/UX Principles", "JavaScript/TypeScript", "State Management"]
-            struggles = ["Performance Optimization", "Webpack/Build Tools", "Security"]
-            educational_background = "Computer Science, Design, or self-taught portfolio"
-        elif "devops" in role or "cloud" in role or "aws" in role:
-            domain = "DevOps & Infrastructure"
-            expected_skills = ["CI/CD", "Cloud Services (AWS/Azure)", "Infrastructure as Code"]
-            struggles = ["Complex Networking", "Security Compliance", "Cost Optimization"]
-            educational_background = "Engineering or IT Certifications"
-        else:
-            domain = "General Software Engineering"
-            expected_skills = ["Programming Fundamentals", "Problem Solving", "Debugging"]
-            struggles = ["Complex Logic", "Design Patterns", "Testing"]
-            educational_background = "STEM degree or relevant experience"
+        # Seniority from the catalog tiers, domain from the role keywords
+        persona_id = CATALOG.assign(role, years_int)
+        self.profile["persona_id"] = persona_id
+        self.profile["assigned_persona"] = self.build_persona(persona_id)
 
-        self.profile["assigned_persona"] = {
-            "persona_name": f"{seniority} {domain} Interviewer",
-            "target_users": f"Candidates aiming for {seniority} {domain} roles",
-            "background_assumptions": {
-                "education": educational_background,
-                "experience_level": experience_level,
-                "domain_exposure": domain
-            },
-            "what_persona_should_be_good_at": expected_skills,
-            "what_persona_may_struggle_with": struggles,
-            "assessment_focus": {
-                "dimension_1": "Logical Thinking",
-                "dimension_2": "Communication",
-                "dimension_3": "Adaptability"
-            },
-            "difficulty_level": {
-                "start_level": difficulty_start,
-                "max_level": "Hard" 
-            },
-            # Keep legacy fields for compatibility with existing prompts/controller until fully migrated
-            "title": f"{seniority} {domain} Interviewer",
-            "tone": tone,
-            "philosophy": "Reasoning over syntax. Ask 'why' more than 'how'.",
-            "starting_difficulty": difficulty_start,
-            "expected_skills": expected_skills,
-            "behavioral_traits": behavioral_focus
-        }
+    @staticmethod
+    def build_persona(persona_id):
+        """The shared, read-only persona definition for a "<seniority>-<domain>" id (see PERSONA_IDS)."""
+        return CATALOG.get(persona_id)
 
     def get_persona_context(self):
         """Returns the text description of the assigned persona."""
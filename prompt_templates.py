@@ -0,0 +1,111 @@
+import re
+import threading
+from functools import lru_cache
+
+# {{variable}} placeholders used by the prompts in prompts.py
+PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+
+
+class PromptRenderError(ValueError):
+    """Raised when a template is rendered with missing or unknown variables."""
+
+
+class PromptTemplate:
+    """
+    A prompt compiled once into a list of segments: literals at even positions,
+    variable names at odd positions. Rendering is a single join, and every
+    variable must be supplied exactly (no more, no less).
+    """
+    __slots__ = ("name", "variables", "_segments")
+
+    def __init__(self, text, name="CUSTOM"):
+        self.name = name
+        self._set_segments(PLACEHOLDER.split(text))
+
+    def _set_segments(self, segments):
+        self._segments = segments
+        self.variables = frozenset(segments[1::2])
+
+    def render(self, context_vars=None):
+        """Fills every variable from context_vars and returns the prompt text."""
+        context_vars = context_vars or {}
+        self._check(context_vars, partial=False)
+        segments = self._segments[:]
+        for i in range(1, len(segments), 2):
+            segments[i] = str(context_vars[segments[i]])
+        return "".join(segments)
+
+    def partial(self, context_vars):
+        """Returns a new template with the given variables bound and the rest left open."""
+        self._check(context_vars, partial=True)
+        segments = [self._segments[0]]
+        for i in range(1, len(self._segments), 2):
+            var, literal = self._segments[i], self._segments[i + 1]
+            if var in context_vars:
+                # Bound values are merged into the surrounding literal, never re-parsed
+                segments[-1] += str(context_vars[var]) + literal
+            else:
+                segments += [var, literal]
+        bound = PromptTemplate.__new__(PromptTemplate)
+        bound.name = self.name
+        bound._set_segments(segments)
+        return bound
+
+    def _check(self, context_vars, partial):
+        unknown = context_vars.keys() - self.variables
+        missing = set() if partial else self.variables - context_vars.keys()
+        if unknown or missing:
+            details = []
+            if missing:
+                details.append(f"missing {sorted(missing)}")
+            if unknown:
+                details.append(f"unknown {sorted(unknown)}")
+            raise PromptRenderError(f"Cannot render {self.name}: {', '.join(details)}")
+
+    def __repr__(self):
+        return f"<PromptTemplate {self.name} vars={sorted(self.variables)}>"
+
+
+# Template text -> compiled template, filled by prompts.py at import
+_registry = {}
+# (template name, persona id) -> template with the persona variables pre-rendered
+_persona_templates = {}
+_persona_lock = threading.Lock()
+
+
+def register(name, text):
+    """Compiles a named template once and makes it available to get_template()."""
+    template = _registry[text] = PromptTemplate(text, name)
+    return template
+
+
+def get_template(prompt):
+    """Returns the compiled template for a PromptTemplate, a registered text or any other string."""
+    if isinstance(prompt, PromptTemplate):
+        return prompt
+    template = _registry.get(prompt)
+    if template is None:
+        template = _compile_custom(prompt)
+    return template
+
+
+@lru_cache(maxsize=128)
+def _compile_custom(text):
+    return PromptTemplate(text)
+
+
+def bind_persona(prompt, persona_id, persona_vars):
+    """
+    Returns the template with its persona-only variables pre-rendered.
+    The result is cached per persona id; pass persona_id=None to skip the cache.
+    """
+    template = get_template(prompt)
+    if persona_id is None:
+        return template.partial(persona_vars)
+    key = (template.name, persona_id)
+    bound = _persona_templates.get(key)
+    if bound is None:
+        bound = template.partial(persona_vars)
+        with _persona_lock:
+            bound = _persona_templates.setdefault(key, bound)
+    return bound
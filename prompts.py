@@ -1,3 +1,5 @@
+import prompt_templates
+
 INTERVIEWER_PERSONA_PROMPT = """
 You are a professional interviewer conducting a persona-based conversational assessment.
 Your primary responsibility is to uncover the candidate’s real skills, reasoning ability, and behavioral traits through natural conversation.
@@ -126,6 +128,63 @@ OUTPUT:
 Return ONLY the next question. No explanations, no formatting, no additional text.
 """
 
+# Chat-context mode (see chat_context.py): appended to the rendered INTERVIEWER_PERSONA_PROMPT
+# to form the system instruction, so only QUESTION_TURN_PROMPT is sent per turn
+QUESTION_TURN_RULES = """
+Each user message gives you the candidate's latest answer and the signals for the next turn.
+
+QUESTION GENERATION RULES:
+1. Generate ONLY ONE open-ended question.
+2. The question MUST be strictly related to the candidate’s persona and background.
+3. Do NOT ask factual recall or MCQ-style questions.
+4. Do NOT provide hints, examples, or answers unless explicitly required.
+
+ADAPTIVE LOGIC (MANDATORY):
+
+• If the previous response is very short, vague, or one-line:
+  - Rephrase the question in a different way.
+  - Ask the candidate to explain their thinking process in detail.
+  - Encourage elaboration without revealing the answer.
+
+• If the previous response is correct but casual or surface-level:
+  - Ask a follow-up “why” or “how” question.
+  - Request a small, practical example to support their explanation.
+
+• If the previous response is clear, structured, and thoughtful:
+  - Increase the difficulty slightly.
+  - Introduce a new constraint or variation relevant to the persona.
+
+• If the response appears generic or memorized:
+  - Ask the candidate to explain the idea in their own words using a real-world or personal scenario.
+
+IMPORTANT CONSTRAINTS:
+- Ask ONE question at a time.
+- Maintain a professional and neutral interviewer tone.
+- The question should naturally continue the conversation.
+- The question must evaluate the target dimension of the turn explicitly or implicitly.
+- **KEEP IT BRIEF**: The question must be short and concise (under 3 sentences).
+
+OUTPUT:
+Return ONLY the next question. No explanations, no formatting, no additional text.
+"""
+
+# The per-turn delta sent in chat-context mode (same variables as the turn part of QUESTION_GENERATION_PROMPT)
+QUESTION_TURN_PROMPT = """
+Target assessment dimension for this turn:
+{{target_dimension}}
+
+Candidate’s previous response:
+"{{last_answer}}"
+
+Assessment signals observed so far:
+- Strengths: {{strengths}}
+- Weaknesses: {{weaknesses}}
+- Current difficulty level: {{difficulty}}
+
+Specific Adaptive Instruction:
+{{adaptive_instruction}}
+"""
+
 EVALUATION_PROMPT = """
 You are an assessment evaluator reviewing a completed persona-based interview.
 
@@ -288,3 +347,55 @@ Output valid JSON only:
   "suggested_action": "increase_difficulty" | "maintain_difficulty" | "decrease_difficulty" | "probe_deeper"
 }
 """
+
+
+# Several RESPONSE_ANALYSIS_PROMPT turns from different conversations in one call (see analysis_batcher.py)
+RESPONSE_ANALYSIS_BATCH_PROMPT = """
+You are an expert interviewer assistant evaluating candidates' latest responses.
+Your goal is to provide immediate feedback signals to the Interviewer Engine to adapt the next question.
+
+Below are {{count}} independent interview turns, each from a different candidate.
+Evaluate every item on its own; never compare candidates or let one item influence another.
+
+Target Dimensions: Logical Thinking, Communication, Adaptability
+
+{{items}}
+Analyze each candidate's response based on:
+1. Relevance: Did they answer the specific question asked?
+2. Depth: Did they provide reasoning, examples, or just a surface-level answer?
+3. Clarity: Was the communication clear and structured?
+
+Output a valid JSON array only, with exactly {{count}} objects in item order:
+[
+  {
+    "item": 1,
+    "quality_score": 1-5,
+    "observed_strengths": ["list", "of", "short", "points"],
+    "observed_weaknesses": ["list", "of", "short", "points"],
+    "suggested_action": "increase_difficulty" | "maintain_difficulty" | "decrease_difficulty" | "probe_deeper"
+  }
+]
+"""
+
+# One turn inside RESPONSE_ANALYSIS_BATCH_PROMPT
+RESPONSE_ANALYSIS_BATCH_ITEM = """--- Item {{index}} ---
+Candidate Persona: {{persona_name}}
+Current Difficulty: {{difficulty}}
+Interviewer Asked: "{{last_question}}"
+Candidate Answered: "{{user_response}}"
+
+"""
+
+
+# Template text -> constant name, used to configure behaviour per prompt type (e.g. caching)
+PROMPT_NAMES = {value: name for name, value in list(globals().items()) if name.endswith("_PROMPT")}
+
+# Compiled once at import; rendering goes through prompt_templates.get_template()
+TEMPLATES = {name: prompt_templates.register(name, text) for text, name in PROMPT_NAMES.items()}
+
+
+def prompt_name(prompt):
+    """Returns the constant name of a template from this module, or "CUSTOM"."""
+    if isinstance(prompt, prompt_templates.PromptTemplate):
+        return prompt.name
+    return PROMPT_NAMES.get(prompt, "CUSTOM")
@@ -0,0 +1,262 @@
+"""
+Local retrieval index of previously generated interview questions.
+
+Questions are indexed under (persona id, target dimension, difficulty) together
+with the answer they followed. Before a new-topic question is generated, the
+candidate's last answer is compared against the indexed ones with MinHash
+(estimated Jaccard similarity of their stemmed content words, with LSH banding
+so a lookup only scores likely matches). The best match above QUESTION_INDEX_THRESHOLD
+that is novel for the conversation (not too similar to anything already asked)
+is served without an LLM call. Otherwise the question is generated as usual and
+added to the index.
+
+Probe-deeper follow-ups are neither served nor indexed: they have to quote the
+answer they follow. Entries are kept in memory (at most QUESTION_INDEX_MAX per
+key, oldest evicted first) and, with QUESTION_INDEX_DB, appended to a SQLite
+file that every worker loads at startup.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import struct
+import threading
+from collections import deque
+from functools import lru_cache
+
+import metrics
+from metrics import log
+
+# "off": always generate; "on": serve indexed questions above the threshold;
+# "shadow": always generate, and log what the index would have served
+MODE = os.environ.get("QUESTION_INDEX", "off")
+# Minimum estimated similarity (0-1) between the last answer and an indexed entry to serve it
+THRESHOLD = float(os.environ.get("QUESTION_INDEX_THRESHOLD", "0.35"))
+# Highest similarity (0-1) to a question already asked in the conversation for a match to count as novel
+NOVELTY = float(os.environ.get("QUESTION_INDEX_NOVELTY", "0.5"))
+
+# MinHash signature length (16 hashes per 64-byte blake2b digest), split into BANDS bands for LSH
+PERMUTATIONS = 64
+BANDS = 32
+ROWS = PERMUTATIONS // BANDS
+# Fixed salts, so signatures stored by one process match in every other
+SALTS = [f"question-index-{i}".encode() for i in range(PERMUTATIONS // 16)]
+
+WORD = re.compile(r"[a-z0-9+#]+")
+STOPWORDS = frozenset((
+    "a", "an", "the", "and", "or", "but", "of", "to", "in", "on", "at", "for", "with", "by", "from", "as",
+    "is", "are", "was", "were", "be", "been", "it", "its", "this", "that", "these", "those", "there",
+    "i", "me", "my", "we", "our", "us", "you", "your", "they", "them", "their", "he", "she",
+    "would", "could", "should", "will", "can", "do", "does", "did", "have", "has", "had",
+    "how", "what", "why", "when", "where", "which", "who", "if", "then", "so", "not", "no", "yes",
+    "about", "into", "some", "any", "all", "just", "also", "very", "really", "more", "most", "like",
+))
+SUFFIXES = ("ing", "ed", "es", "ly", "s", "e")
+
+LOOKUPS = metrics.Counter("question_index_lookups_total", "Question index lookups, by outcome (hit, miss, not_novel).", ("outcome",))
+
+
+def terms(text):
+    """Stemmed content words of a text ("caching", "cached" and "cache" all become "cach")."""
+    words = set()
+    for word in WORD.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        for suffix in SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)]
+                break
+        words.add(word)
+    return words
+
+
+@lru_cache(maxsize=65536)
+def _word_hashes(word):
+    """PERMUTATIONS independent 32-bit hashes of a word."""
+    data = word.encode()
+    digests = b"".join(hashlib.blake2b(data, digest_size=64, salt=salt).digest() for salt in SALTS)
+    return struct.unpack(f"<{PERMUTATIONS}I", digests)
+
+
+def signature(words):
+    """MinHash signature of a set of words: the minimum of each hash over the set."""
+    if not words:
+        return _word_hashes("")
+    return tuple(map(min, zip(*map(_word_hashes, words))))
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / PERMUTATIONS
+
+
+def _bands(sig):
+    return [(band, sig[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+class QuestionIndex:
+    """Questions per (persona id, dimension, difficulty), searchable by answer similarity."""
+    def __init__(self, max_per_key=500, db_path=None):
+        self.max_per_key = max_per_key
+        self.db_path = db_path
+        self._entries = {}  # entry id -> (key, question, question words, signature)
+        self._order = {}  # key -> deque of entry ids, oldest first
+        self._buckets = {}  # (key, band, rows) -> set of entry ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"hit": 0, "miss": 0, "not_novel": 0, "added": 0, "evicted": 0}
+
+        if db_path:
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS questions ("
+                    "persona_id TEXT NOT NULL, dimension TEXT NOT NULL, difficulty TEXT NOT NULL,"
+                    "answer TEXT NOT NULL, question TEXT NOT NULL)"
+                )
+            rows = self._connection().execute(
+                "SELECT persona_id, dimension, difficulty, answer, question FROM questions ORDER BY rowid"
+            ).fetchall()
+            for persona_id, dimension, difficulty, answer, question in rows:
+                self._insert((persona_id, dimension, difficulty), question, *_entry_words(answer, question))
+
+    def lookup(self, key, answer, asked=(), threshold=None):
+        """
+        (question, similarity) for the key's entry that best matches the answer, or None.
+        `asked` holds the questions already asked in the conversation; matches too
+        similar to any of them are skipped, as are matches below `threshold` (default THRESHOLD).
+        """
+        threshold = THRESHOLD if threshold is None else threshold
+        query = signature(terms(answer))
+        asked_words = [terms(question) for question in asked]
+        with self._lock:
+            candidate_ids = set()
+            for band in _bands(query):
+                candidate_ids |= self._buckets.get((key, *band), set())
+            # Most similar first; ties go to the oldest entry
+            candidates = sorted(
+                (-similarity(query, self._entries[entry_id][3]), entry_id, *self._entries[entry_id][1:3])
+                for entry_id in candidate_ids
+            )
+        outcome, served = "miss", None
+        for negative_score, _, question, words in candidates:
+            if -negative_score < threshold:
+                break
+            if any(_jaccard(words, other) > NOVELTY for other in asked_words):
+                outcome = "not_novel"
+                continue
+            outcome, served = "hit", (question, -negative_score)
+            break
+        LOOKUPS.inc(outcome=outcome)
+        with self._lock:
+            self._stats[outcome] += 1
+        return served
+
+    def add(self, key, answer, question):
+        """Indexes a generated question under its key and the answer it followed."""
+        words, sig = _entry_words(answer, question)
+        with self._lock:
+            self._insert(key, question, words, sig)
+        if self.db_path:
+            try:
+                with self._connection() as conn:
+                    conn.execute("INSERT INTO questions VALUES (?, ?, ?, ?, ?)", (*key, answer, question))
+            except sqlite3.Error as e:
+                log(f"[question-index] Error storing question: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["keys"] = len(self._order)
+        lookups = stats["hit"] + stats["miss"] + stats["not_novel"]
+        stats["hit_rate"] = stats["hit"] / lookups if lookups else 0.0
+        return stats
+
+    def _insert(self, key, question, words, sig):
+        """Adds an entry, evicting the key's oldest one beyond max_per_key (caller holds the lock)."""
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (key, question, words, sig)
+        for band in _bands(sig):
+            self._buckets.setdefault((key, *band), set()).add(entry_id)
+        order = self._order.setdefault(key, deque())
+        order.append(entry_id)
+        self._stats["added"] += 1
+        while len(order) > self.max_per_key:
+            self._remove(order.popleft())
+
+    def _remove(self, entry_id):
+        key, _, _, sig = self._entries.pop(entry_id)
+        for band in _bands(sig):
+            bucket = self._buckets.get((key, *band))
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[(key, *band)]
+        self._stats["evicted"] += 1
+
+    def _connection(self):
+        """One SQLite connection per thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def _entry_words(answer, question):
+    """The question's words (for novelty checks) and the signature of the answer it followed (for relevance)."""
+    return terms(question), signature(terms(answer))
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def from_env():
+    """Builds the index when QUESTION_INDEX is "on" or "shadow", else returns None."""
+    if MODE not in ("on", "shadow"):
+        return None
+    return QuestionIndex(
+        max_per_key=int(os.environ.get("QUESTION_INDEX_MAX", "500")),
+        db_path=os.environ.get("QUESTION_INDEX_DB") or None,
+    )
+
+
+INDEX = from_env()
+
+
+def lookup(persona_id, dimension, difficulty, answer, asked):
+    """The question to serve instead of generating one (None in "off" and "shadow" modes or on a miss)."""
+    if INDEX is None or persona_id is None:
+        return None
+    match = INDEX.lookup((persona_id, dimension, difficulty), answer, asked)
+    if match is None:
+        return None
+    question, score = match
+    if MODE == "shadow":
+        log(f"[question-index shadow] would serve (similarity {score:.2f}): {question[:80]!r}")
+        return None
+    log(f"[question-index] served an indexed question (similarity {score:.2f})")
+    return question
+
+
+def retrieve(persona_id, dimension, difficulty, answer, asked):
+    """
+    The closest novel indexed question at any similarity, or None. The degraded path
+    while the LLM is unavailable; works in "shadow" mode too.
+    """
+    if INDEX is None or persona_id is None:
+        return None
+    match = INDEX.lookup((persona_id, dimension, difficulty), answer, asked, threshold=0.0)
+    return match[0] if match else None
+
+
+def add(persona_id, dimension, difficulty, answer, question):
+    """Indexes a freshly generated question."""
+    if INDEX is None or persona_id is None or not question:
+        return
+    INDEX.add((persona_id, dimension, difficulty), answer, question)
@@ -0,0 +1,130 @@
+import os
+import queue
+import threading
+from collections import deque
+
+from persona_engine import PersonaEngine, PERSONA_IDS
+from prompts import QUESTION_GENERATION_PROMPT
+import rate_scheduler
+from metrics import log
+
+
+class FirstQuestionPool:
+    """
+    Pre-generated first interview questions, one rotating pool per persona id.
+    The first question only depends on the persona, so a background warmer fills
+    the pools of `warm_ids` at boot; any other persona gets its pool on first use,
+    so the calls spent grow with the personas actually served rather than with the
+    catalog. Pools are topped up as questions are served. An empty pool returns
+    None and the controller falls back to a live call.
+    """
+    def __init__(self, client, size=3, warm_ids=()):
+        self.client = client
+        self.size = size
+        self._known = set(PERSONA_IDS)
+        self._pools = {persona_id: deque() for persona_id in warm_ids if persona_id in self._known}
+        self._lock = threading.Lock()
+        self._refills = queue.Queue()
+        self._thread = None
+        self._stats = {"hits": 0, "misses": 0, "generated": 0, "errors": 0}
+
+    def take(self, persona_id):
+        """Returns a pre-generated first question for the persona, or None if none is ready."""
+        refills = 1
+        with self._lock:
+            pool = self._pools.get(persona_id)
+            if pool is None and persona_id in self._known:
+                # First use of this persona: warm its pool
+                pool = self._pools[persona_id] = deque()
+                refills = self.size
+            if not pool:
+                self._stats["misses"] += 1
+                question = None
+            else:
+                self._stats["hits"] += 1
+                question = pool.popleft()
+        if pool is not None:
+            for _ in range(refills):
+                self._refills.put(persona_id)
+        return question
+
+    def start(self):
+        """Starts the background warmer (idempotent)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="first-question-warmer", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["ready"] = {persona_id: len(pool) for persona_id, pool in self._pools.items()}
+        return stats
+
+    def _run(self):
+        # Initial fill: one question per boot persona per round so every pool gets warm early
+        with self._lock:
+            warm_ids = list(self._pools)
+        for _ in range(self.size):
+            for persona_id in warm_ids:
+                self._fill(persona_id)
+        while True:
+            self._fill(self._refills.get())
+
+    def _fill(self, persona_id):
+        with self._lock:
+            if len(self._pools[persona_id]) >= self.size:
+                return
+        question = self._generate(persona_id)
+        if question is not None:
+            with self._lock:
+                self._pools[persona_id].append(question)
+
+    def _generate(self, persona_id):
+        from conversation_controller import first_question_context
+
+        context = first_question_context(PersonaEngine.build_persona(persona_id))
+        try:
+            # Bypass the response cache, otherwise every pooled question would be identical
+            question = self.client.generate_content(QUESTION_GENERATION_PROMPT, context, use_cache=False, priority=rate_scheduler.OFFLINE)
+        except Exception as e:
+            log(f"First question warmer failed for {persona_id}: {e}")
+            with self._lock:
+                self._stats["errors"] += 1
+            return None
+        with self._lock:
+            self._stats["generated"] += 1
+        return question
+
+
+_pool = None
+
+
+def start_from_env(client):
+    """
+    Creates and starts the process-wide pool when FIRST_QUESTION_POOL_SIZE > 0, warming
+    the comma-separated persona ids of FIRST_QUESTION_POOL_PERSONAS at boot ("all" for
+    the whole catalog). Returns the pool, or None when pooling is off.
+    """
+    global _pool
+    size = int(os.environ.get("FIRST_QUESTION_POOL_SIZE", "0"))
+    if size > 0 and _pool is None:
+        warm = os.environ.get("FIRST_QUESTION_POOL_PERSONAS", "").strip()
+        warm_ids = PERSONA_IDS if warm == "all" else [persona_id.strip() for persona_id in warm.split(",") if persona_id.strip()]
+        unknown = [persona_id for persona_id in warm_ids if persona_id not in PERSONA_IDS]
+        if unknown:
+            log(f"FIRST_QUESTION_POOL_PERSONAS: ignoring unknown persona ids {', '.join(unknown)}")
+        _pool = FirstQuestionPool(client, size=size, warm_ids=warm_ids)
+        _pool.start()
+    return _pool
+
+
+def get_pool():
+    return _pool
+
+
+def take(persona_id):
+    """Returns a pooled first question for the persona, or None (no pool, empty pool or unknown persona)."""
+    if _pool is None or persona_id is None:
+        return None
+    return _pool.take(persona_id)
@@ -0,0 +1,256 @@
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from metrics import ADMISSION_WAIT_SECONDS
+from token_budget import estimate_tokens
+
+# Priority classes, most urgent first
+INTERACTIVE = 0  # live question generation, the candidate is waiting on it
+ANALYSIS = 1     # response analysis
+REPORT = 2       # final report generation
+OFFLINE = 3      # pre-generation and batch work
+PRIORITY_NAMES = {INTERACTIVE: "interactive", ANALYSIS: "analysis", REPORT: "report", OFFLINE: "offline"}
+
+# Default class per prompt name (see prompts.prompt_name); anything else runs as OFFLINE
+PROMPT_PRIORITIES = {
+    "QUESTION_GENERATION_PROMPT": INTERACTIVE,
+    "QUESTION_TURN_PROMPT": INTERACTIVE,
+    "RESPONSE_ANALYSIS_PROMPT": ANALYSIS,
+    "RESPONSE_ANALYSIS_BATCH_PROMPT": ANALYSIS,
+    "RESULT_GENERATION_PROMPT": REPORT,
+}
+
+# Tokens reserved for the response on top of the prompt estimate
+OUTPUT_TOKEN_ESTIMATE = 512
+
+
+def priority_for(prompt_name):
+    return PROMPT_PRIORITIES.get(prompt_name, OFFLINE)
+
+
+class SchedulerBusyError(Exception):
+    """Raised when a call cannot be admitted in time (queue too deep or budget exhausted)."""
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket(ABC):
+    """
+    Requests/min and tokens/min budgets refilled continuously (0 disables a budget).
+    A pause (set after a 429) blocks every admission until it ends.
+    Subclasses decide where the bucket levels live.
+    """
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+
+    @abstractmethod
+    def try_take(self, tokens):
+        """Takes one request and `tokens` if available. Returns 0, or the seconds to wait before trying again."""
+
+    @abstractmethod
+    def pause(self, seconds):
+        """Stops admissions for `seconds` (the quota told us to back off)."""
+
+    def _take(self, state, now, tokens):
+        """Refills and debits `state` ([requests, tokens, paused_until, updated_at]) in place; returns the wait."""
+        elapsed = max(0.0, now - state[3])
+        state[3] = now
+        if self.rpm:
+            state[0] = min(self.rpm, state[0] + elapsed * self.rpm / 60)
+        if self.tpm:
+            state[1] = min(self.tpm, state[1] + elapsed * self.tpm / 60)
+            # A prompt larger than the whole budget waits for a full bucket instead of forever
+            tokens = min(tokens, self.tpm)
+        if state[2] > now:
+            return state[2] - now
+
+        wait = 0.0
+        if self.rpm and state[0] < 1:
+            wait = max(wait, (1 - state[0]) * 60 / self.rpm)
+        if self.tpm and state[1] < tokens:
+            wait = max(wait, (tokens - state[1]) * 60 / self.tpm)
+        if wait:
+            return wait
+        state[0] -= 1
+        state[1] -= tokens
+        return 0.0
+
+
+class LocalBucket(TokenBucket):
+    """Bucket for a single process."""
+    def __init__(self, rpm, tpm):
+        super().__init__(rpm, tpm)
+        self._state = [float(rpm), float(tpm), 0.0, time.time()]
+        self._lock = threading.Lock()
+
+    def try_take(self, tokens):
+        with self._lock:
+            return self._take(self._state, time.time(), tokens)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._state[2] = max(self._state[2], time.time() + seconds)
+
+
+class SQLiteBucket(TokenBucket):
+    """
+    Bucket kept in a SQLite file, so every worker process on the host draws on the same quota.
+    Each take is one IMMEDIATE transaction on a single row.
+    """
+    def __init__(self, rpm, tpm, db_path, name="gemini"):
+        super().__init__(rpm, tpm)
+        self.db_path = db_path
+        self.name = name
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                "name TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, "
+                "paused_until REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO rate_buckets VALUES (?, ?, ?, 0, ?)", (name, rpm, tpm, time.time())
+            )
+
+    def try_take(self, tokens):
+        with self._connection() as conn:
+            state = self._load(conn)
+            wait = self._take(state, time.time(), tokens)
+            self._save(conn, state)
+        return wait
+
+    def pause(self, seconds):
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE rate_buckets SET paused_until = MAX(paused_until, ?) WHERE name = ?",
+                (time.time() + seconds, self.name),
+            )
+
+    def _load(self, conn):
+        row = conn.execute(
+            "SELECT requests, tokens, paused_until, updated_at FROM rate_buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        return list(row)
+
+    def _save(self, conn, state):
+        conn.execute(
+            "UPDATE rate_buckets SET requests = ?, tokens = ?, paused_until = ?, updated_at = ? WHERE name = ?",
+            (*state, self.name),
+        )
+
+    @contextmanager
+    def _connection(self):
+        """Yields this thread's connection inside a write transaction."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+class AdmissionScheduler:
+    """
+    Admits Gemini calls against a shared TokenBucket, most urgent priority first
+    (FIFO within a class). Calls beyond `max_queue` waiting, or that would wait
+    longer than `max_wait` seconds, fail fast with SchedulerBusyError.
+    Priorities are ordered within a process; across processes the bucket is shared.
+    """
+    def __init__(self, bucket, max_queue=64, max_wait=30.0):
+        self.bucket = bucket
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (priority, ticket number)
+        self._tickets = itertools.count()
+        self._metrics = {
+            name: {"admitted": 0, "rejected": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+
+    def acquire(self, priority, prompt, timeout=None):
+        """
+        Blocks until a call with this rendered prompt may be sent, for at most max_wait
+        seconds (or `timeout`, e.g. what is left of the turn's deadline, if shorter).
+        Raises SchedulerBusyError.
+        """
+        tokens = estimate_tokens(prompt) + OUTPUT_TOKEN_ESTIMATE
+        max_wait = self.max_wait if timeout is None else min(self.max_wait, timeout)
+        metrics = self._metrics[PRIORITY_NAMES[priority]]
+        start = time.monotonic()
+        with self._cond:
+            if len(self._waiting) >= self.max_queue:
+                metrics["rejected"] += 1
+                raise SchedulerBusyError(f"Gemini scheduler queue is full ({self.max_queue} calls waiting)")
+            entry = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, entry)
+            # A more urgent call may have to take over the head of the queue
+            self._cond.notify_all()
+            try:
+                while True:
+                    head = self._waiting[0] == entry
+                    wait = self.bucket.try_take(tokens) if head else None
+                    if head and not wait:
+                        break
+                    remaining = max_wait - (time.monotonic() - start)
+                    if remaining <= 0 or (head and wait > remaining):
+                        metrics["rejected"] += 1
+                        retry_after = wait if head else 1.0
+                        raise SchedulerBusyError(f"Gemini quota exhausted, next slot in {retry_after:.1f}s", retry_after)
+                    self._cond.wait(wait if head else remaining)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            ADMISSION_WAIT_SECONDS.observe(waited, priority=PRIORITY_NAMES[priority])
+            metrics["admitted"] += 1
+            metrics["wait_total"] += waited
+            metrics["wait_max"] = max(metrics["wait_max"], waited)
+
+    def backoff(self, seconds):
+        """Pauses every admission after a 429, so waiting calls do not retry in lockstep."""
+        self.bucket.pause(seconds)
+
+    def metrics(self):
+        with self._cond:
+            metrics = {"queue_depth": len(self._waiting)}
+            for name, counters in self._metrics.items():
+                counters = dict(counters)
+                counters["avg_wait_seconds"] = counters["wait_total"] / counters["admitted"] if counters["admitted"] else 0.0
+                metrics[name] = counters
+        return metrics
+
+
+def from_env():
+    """
+    Creates the scheduler from GEMINI_RPM and GEMINI_TPM (0 disables a budget),
+    SCHEDULER_DB (SQLite file shared by workers; unset for a per-process bucket),
+    SCHEDULER_MAX_QUEUE and SCHEDULER_MAX_WAIT. Returns None when both budgets are 0.
+    """
+    rpm = int(os.environ.get("GEMINI_RPM", "60"))
+    tpm = int(os.environ.get("GEMINI_TPM", "1000000"))
+    if not rpm and not tpm:
+        return None
+    db_path = os.environ.get("SCHEDULER_DB")
+    bucket = SQLiteBucket(rpm, tpm, db_path) if db_path else LocalBucket(rpm, tpm)
+    return AdmissionScheduler(
+        bucket,
+        max_queue=int(os.environ.get("SCHEDULER_MAX_QUEUE", "64")),
+        max_wait=float(os.environ.get("SCHEDULER_MAX_WAIT", "30")),
+    )
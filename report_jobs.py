@@ -0,0 +1,151 @@
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import log
+
+
+class QueueFullError(Exception):
+    """Raised by ReportJobQueue.submit when the queue is at capacity."""
+
+
+class ReportJob:
+    """One report generation request and its outcome."""
+    def __init__(self, job_id, fn, on_failure=None):
+        self.id = job_id
+        self.fn = fn
+        self.on_failure = on_failure
+        self.status = "queued"  # queued, running, retrying, done, failed
+        self.attempts = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class ReportJobQueue:
+    """
+    Bounded worker pool for report generation, so the long RESULT_GENERATION_PROMPT
+    call runs outside the /api/chat request. Failed jobs are retried with a short
+    backoff; finished jobs are kept for `retention` seconds for polling.
+    """
+    def __init__(self, workers=2, max_queue=100, max_attempts=3, retry_delay=2.0, retention=3600):
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retention = retention
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "retries": 0, "running": 0}
+        self._wait_total = 0.0
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"report-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, job_id, fn, on_failure=None):
+        """
+        Queues fn() under job_id and returns the job. fn returns the result or raises to trigger a retry.
+        on_failure(error) is called once the last attempt has failed, to record the failure
+        beyond the retention window. Raises QueueFullError when the queue is at capacity.
+        """
+        job = ReportJob(job_id, fn, on_failure)
+        with self._lock:
+            self._expire()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._metrics["rejected"] += 1
+                raise QueueFullError(f"Report queue is full ({self._queue.maxsize} jobs)")
+            self._jobs[job_id] = job
+            self._jobs.move_to_end(job_id)
+            self._metrics["submitted"] += 1
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            started = metrics["completed"] + metrics["failed"] + metrics["running"]
+            metrics["avg_queue_wait_seconds"] = (self._wait_total / started) if started else 0.0
+        metrics["queue_depth"] = self._queue.qsize()
+        return metrics
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                job.status = "running"
+                job.started_at = time.time()
+                self._wait_total += job.started_at - job.created_at
+                self._metrics["running"] += 1
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self._metrics["running"] -= 1
+                    job.finished_at = time.time()
+                self._queue.task_done()
+
+    def _run(self, job):
+        while True:
+            job.attempts += 1
+            try:
+                result = job.fn()
+            except Exception as e:
+                job.error = str(e)
+                if job.attempts < self.max_attempts:
+                    log(f"Report job {job.id} failed (attempt {job.attempts}): {e}. Retrying...")
+                    with self._lock:
+                        job.status = "retrying"
+                        self._metrics["retries"] += 1
+                    time.sleep(self.retry_delay * job.attempts)
+                    continue
+                log(f"Report job {job.id} failed after {job.attempts} attempts: {e}")
+                if job.on_failure is not None:
+                    try:
+                        job.on_failure(e)
+                    except Exception as hook_error:
+                        log(f"Report job {job.id}: recording the failure failed: {hook_error}")
+                with self._lock:
+                    job.status = "failed"
+                    self._metrics["failed"] += 1
+                return
+            with self._lock:
+                job.result = result
+                job.error = None
+                job.status = "done"
+                self._metrics["completed"] += 1
+            return
+
+    def _expire(self):
+        """Drops finished jobs older than the retention window (caller holds the lock)."""
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+def from_env():
+    """Creates the report queue from REPORT_WORKERS, REPORT_QUEUE_SIZE and REPORT_MAX_ATTEMPTS."""
+    return ReportJobQueue(
+        workers=int(os.environ.get("REPORT_WORKERS", "2")),
+        max_queue=int(os.environ.get("REPORT_QUEUE_SIZE", "100")),
+        max_attempts=int(os.environ.get("REPORT_MAX_ATTEMPTS", "3")),
+    )
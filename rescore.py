@@ -0,0 +1,205 @@
+"""
+Offline bulk re-scoring of finished interviews.
+
+Streams transcripts from a JSONL file or the conversation store, renders
+EVALUATION_PROMPT (or RESULT_GENERATION_PROMPT with --prompt report) for each
+one, and runs them through a bounded pool of workers. Calls go through the
+shared Gemini client at OFFLINE priority, so they respect GEMINI_RPM/GEMINI_TPM
+(and yield to live interviews when both use the same SCHEDULER_DB).
+
+Every result is appended to the output JSONL as soon as it is ready. The output
+doubles as the checkpoint: running the same command again skips the
+conversations already scored and retries the ones that failed. Use a new output
+file for each rubric change.
+
+Input JSONL lines:
+    {"id": "...", "history": [{"role": "system" | "user", "content": "..."}, ...]}
+with optional "persona_id" or "persona_name", "candidate_name", "role_focus"
+and "years_experience".
+
+Usage:
+    python rescore.py --jsonl transcripts.jsonl --output scores.jsonl [--prompt evaluation] [--workers 8]
+    python rescore.py --store conversations.db --output scores.jsonl
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import conversation_store
+import rate_scheduler
+import resilience
+from gemini_client import CLIENT_POOL
+from persona_catalog import CATALOG
+from prompts import EVALUATION_PROMPT, RESULT_GENERATION_PROMPT
+from token_budget import TOKEN_BUDGET, TranscriptBuffer
+
+PROMPTS = {"evaluation": EVALUATION_PROMPT, "report": RESULT_GENERATION_PROMPT}
+# Seconds between progress lines
+PROGRESS_INTERVAL = 5
+# Shortest wait before calling again while the circuit is open (the trial call may still be running)
+CIRCUIT_RETRY_MIN = 1.0
+
+
+def read_jsonl(path):
+    """Yields the transcript records of a JSONL file, skipping lines that are not valid JSON."""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"[rescore] {path}:{number}: skipped, {e}")
+
+
+def read_store(path):
+    """Yields a transcript record for every finished conversation in the store."""
+    store = conversation_store.ConversationStore(path)
+    for conversation_id, state, history in store.iter_conversations():
+        if state.get("state") != "ENDED":
+            continue
+        profile = state.get("persona_engine", {}).get("profile", {})
+        yield {"id": conversation_id, "history": history, "summaries": state.get("summaries"), **profile}
+
+
+def load_checkpoint(path):
+    """Ids already scored in an existing output file (the latest line per id wins)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A line cut short by a crash
+            if "result" in entry:
+                done.add(entry["id"])
+            else:
+                done.discard(entry["id"])
+    return done
+
+
+def persona_name(record):
+    if record.get("persona_name"):
+        return record["persona_name"]
+    persona_id = record.get("persona_id")
+    if persona_id and persona_id in CATALOG:
+        persona = CATALOG.get(persona_id)
+        return f"{persona['title']} ({persona['tone']})"
+    return "Interviewer"
+
+
+def prompt_context(prompt, record):
+    """The prompt variables for one record, with the transcript compacted to the token budget."""
+    transcript = TranscriptBuffer(record.get("summaries"))
+    transcript.sync(record["history"])
+    context = {"persona_name": persona_name(record), "full_conversation": transcript.render}
+    if prompt == RESULT_GENERATION_PROMPT:
+        context["candidate_name"] = record.get("candidate_name", "Candidate")
+        context["background"] = f"{record.get('role_focus', 'N/A')} with {record.get('years_experience', 'N/A')} years"
+    return TOKEN_BUDGET.fit(prompt, context, elastic=("full_conversation",))
+
+
+class Rescorer:
+    """Bounded worker pool that scores records and appends each result to the output file."""
+    def __init__(self, prompt, output, workers=8, client=None):
+        self.prompt = PROMPTS[prompt]
+        self.prompt_key = prompt
+        self.client = client or CLIENT_POOL.get()
+        self.workers = workers
+        self._output = open(output, "a", encoding="utf-8")
+        self._write_lock = threading.Lock()
+        # At most two records per worker are read ahead of the pool
+        self._slots = threading.BoundedSemaphore(workers * 2)
+        self.counts = {"scored": 0, "failed": 0, "skipped": 0}
+        self._started = self._last_report = time.perf_counter()
+
+    def run(self, records, done=()):
+        seen = set(done)
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rescore")
+        try:
+            for record in records:
+                if record.get("id") is None or record["id"] in seen:
+                    self.counts["skipped"] += 1
+                    continue
+                seen.add(record["id"])
+                self._slots.acquire()
+                executor.submit(self._score, record).add_done_callback(lambda _: self._slots.release())
+            executor.shutdown(wait=True)
+        except KeyboardInterrupt:
+            print("[rescore] Interrupted, finishing the calls in flight (run again to resume)...")
+            executor.shutdown(wait=True, cancel_futures=True)
+        finally:
+            self._output.close()
+        self._report(final=True)
+
+    def _score(self, record):
+        entry = {"id": record["id"], "prompt": self.prompt_key}
+        try:
+            result = self._call(prompt_context(self.prompt, record))
+            if result:
+                entry["result"] = result
+            else:
+                entry["error"] = "Empty or unparseable response"
+        except Exception as e:
+            entry["error"] = str(e)
+        entry["scored_at"] = time.time()
+        self._write(entry)
+
+    def _call(self, context):
+        """
+        generate_json at OFFLINE priority, waiting out busy responses from the scheduler
+        and the cooldown of an open circuit (an upstream outage) instead of failing the record.
+        """
+        while True:
+            try:
+                return self.client.generate_json(self.prompt, context, priority=rate_scheduler.OFFLINE)
+            except rate_scheduler.SchedulerBusyError as e:
+                time.sleep(e.retry_after)
+            except resilience.CircuitOpenError as e:
+                # Only one trial call is let through once the cooldown is over; the rest find the circuit open again
+                time.sleep(max(e.retry_after, CIRCUIT_RETRY_MIN))
+
+    def _write(self, entry):
+        with self._write_lock:
+            self._output.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._output.flush()
+            os.fsync(self._output.fileno())
+            self.counts["failed" if "error" in entry else "scored"] += 1
+            if time.perf_counter() - self._last_report >= PROGRESS_INTERVAL:
+                self._report()
+
+    def _report(self, final=False):
+        now = time.perf_counter()
+        self._last_report = now
+        elapsed = now - self._started
+        finished = self.counts["scored"] + self.counts["failed"]
+        print(
+            f"[rescore] {'done: ' if final else ''}{self.counts['scored']} scored, {self.counts['failed']} failed, "
+            f"{self.counts['skipped']} skipped in {elapsed:.1f}s ({finished / elapsed if elapsed else 0:.2f}/s)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--jsonl", help="Transcripts, one JSON object per line")
+    source.add_argument("--store", help="Conversation store (SQLite file); only finished interviews are scored")
+    parser.add_argument("--output", required=True, help="Results JSONL, appended to and used to resume")
+    parser.add_argument("--prompt", choices=sorted(PROMPTS), default="evaluation")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    done = load_checkpoint(args.output)
+    if done:
+        print(f"[rescore] Resuming: {len(done)} conversations already scored in {args.output}")
+    records = read_jsonl(args.jsonl) if args.jsonl else read_store(args.store)
+    Rescorer(args.prompt, args.output, args.workers).run(records, done)
+
+
+if __name__ == "__main__":
+    main()
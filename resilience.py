@@ -0,0 +1,291 @@
+"""
+Deadlines, hedged requests and a circuit breaker for LLM calls.
+
+Deadline: every chat turn gets TURN_DEADLINE seconds (a context variable, like
+the trace id, so it follows the turn into speculation threads). LLM calls
+check it before each attempt, pass what is left to the backend as the request
+timeout, and never back off past it.
+
+Hedging: once HEDGE_MIN_SAMPLES calls of a prompt have been timed, a latency-
+sensitive call still unanswered after the prompt's HEDGE_PERCENTILE latency
+gets a duplicate request, and whichever answers first is used.
+
+Circuit breaker: BREAKER_FAILURES failed calls in a row open the circuit, and
+for BREAKER_COOLDOWN seconds calls fail at once with CircuitOpenError instead
+of queuing on a failing upstream. Then one trial call is let through; its
+success closes the circuit again.
+
+A call that fails for good raises LLMUnavailableError (or a subclass), and the
+conversation controller serves its degraded path (an indexed or canned
+question, a heuristic analysis).
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+from metrics import log
+
+# Seconds a chat turn may spend on LLM calls (0 = no deadline)
+TURN_DEADLINE = float(os.environ.get("TURN_DEADLINE", "20"))
+# Latency percentile of a prompt after which a duplicate request is sent (0 = no hedging)
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "0"))
+# Timed calls of a prompt needed before it is hedged
+HEDGE_MIN_SAMPLES = 20
+# Shortest hedge delay in seconds, so fast prompts are not duplicated on jitter
+HEDGE_MIN_DELAY = 0.05
+# Consecutive failed calls that open the circuit (0 = no breaker)
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", "5"))
+# Seconds the circuit stays open before a trial call is let through
+BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", "30"))
+
+# Monotonic time by which the current turn must be answered
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class LLMUnavailableError(Exception):
+    """An LLM call failed for good (upstream error, deadline or open circuit); the caller should degrade."""
+
+
+class DeadlineExceeded(LLMUnavailableError):
+    pass
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Raised without calling upstream while the circuit is open; retry_after is the rest of the cooldown."""
+    def __init__(self, message, retry_after=0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def start_deadline(seconds=TURN_DEADLINE):
+    """Starts the deadline for the current turn (no deadline for seconds <= 0)."""
+    _deadline.set(time.monotonic() + seconds if seconds > 0 else None)
+
+
+def clear_deadline():
+    """Lifts the deadline, e.g. for a report job that outlives the turn that queued it."""
+    _deadline.set(None)
+
+
+def remaining():
+    """Seconds left before the turn's deadline, or None when there is none."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def check(name):
+    """Raises DeadlineExceeded when the turn's deadline has passed."""
+    if remaining() == 0:
+        metrics.LLM_DEADLINE_EXCEEDED.inc(prompt=name)
+        raise DeadlineExceeded(f"Turn deadline exceeded before the {name} call")
+
+
+def request_options():
+    """Keyword arguments that bound a backend call by the deadline (none without one)."""
+    left = remaining()
+    return {} if left is None else {"request_options": {"timeout": max(left, 0.001)}}
+
+
+class LatencyTracker:
+    """Recent successful call latencies per prompt, for the hedge delay."""
+    def __init__(self, percentile=HEDGE_PERCENTILE, window=200, min_samples=HEDGE_MIN_SAMPLES):
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+        self._delays = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            samples = self._samples.setdefault(name, deque(maxlen=self.window))
+            samples.append(seconds)
+            # The percentile is recomputed every tenth sample, not on every lookup
+            if len(samples) >= self.min_samples and len(samples) % 10 == 0:
+                ordered = sorted(samples)
+                index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+                self._delays[name] = max(HEDGE_MIN_DELAY, ordered[index])
+
+    def hedge_delay(self, name):
+        """Seconds to wait before hedging a call of this prompt, or None (hedging off or too few samples)."""
+        if self.percentile <= 0:
+            return None
+        with self._lock:
+            return self._delays.get(name)
+
+
+TRACKER = LatencyTracker()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=int(os.environ.get("HEDGE_WORKERS", "32")), thread_name_prefix="llm-hedge")
+    return _executor
+
+
+def hedged(name, call, duplicate, hedge=True):
+    """
+    Runs call() and returns its result. When hedging applies and call()
+    is still running after it, duplicate() (which admits itself) is started too and
+    the first successful result wins. Raises DeadlineExceeded when the turn's deadline
+    passes first; the abandoned calls end at their own request timeout.
+    """
+    delay = TRACKER.hedge_delay(name) if hedge else None
+    if delay is None:
+        return call()
+    executor = _get_executor()
+    started = time.monotonic()
+    primary = executor.submit(contextvars.copy_context().run, call)
+    attempts = {primary: "primary"}
+    pending = {primary}
+    error = None
+    while pending:
+        left = remaining()
+        timeout = left if len(attempts) > 1 else delay - (time.monotonic() - started)
+        if left is not None:
+            timeout = min(timeout, left)
+        done, pending = wait(pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if len(attempts) > 1:
+                    metrics.LLM_HEDGES.inc(prompt=name, winner=attempts[future])
+                return future.result()
+            error = error or future.exception()
+        if done:
+            continue
+        if remaining() == 0:
+            metrics.LLM_DEADLINE_EXCEEDED.inc(prompt=name)
+            raise DeadlineExceeded(f"Turn deadline exceeded waiting for the {name} call")
+        if len(attempts) == 1:
+            log(f"[hedge] {name} slower than {delay * 1000:.0f}ms, sending a duplicate request")
+            future = executor.submit(contextvars.copy_context().run, duplicate)
+            attempts[future] = "hedge"
+            pending.add(future)
+    if len(attempts) > 1:
+        metrics.LLM_HEDGES.inc(prompt=name, winner="none")
+    raise error
+
+
+async def hedged_async(name, call, duplicate, hedge=True):
+    """
+    Async version of hedged(): call and duplicate return awaitables, the losing attempt is
+    cancelled, and the deadline is enforced here even when the call is not hedged.
+    """
+    delay = TRACKER.hedge_delay(name) if hedge else None
+    left = remaining()
+    if delay is None:
+        try:
+            return await asyncio.wait_for(call(), left) if left is not None else await call()
+        except asyncio.TimeoutError:
+            metrics.LLM_DEADLINE_EXCEEDED.inc(prompt=name)
+            raise DeadlineExceeded(f"Turn deadline exceeded waiting for the {name} call") from None
+    started = time.monotonic()
+    primary = asyncio.ensure_future(call())
+    attempts = {primary: "primary"}
+    pending = {primary}
+    error = None
+    try:
+        while pending:
+            left = remaining()
+            timeout = left if len(attempts) > 1 else delay - (time.monotonic() - started)
+            if left is not None:
+                timeout = min(timeout, left)
+            done, pending = await asyncio.wait(pending, timeout=max(timeout, 0), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if len(attempts) > 1:
+                        metrics.LLM_HEDGES.inc(prompt=name, winner=attempts[task])
+                    return task.result()
+                error = error or task.exception()
+            if done:
+                continue
+            if remaining() == 0:
+                metrics.LLM_DEADLINE_EXCEEDED.inc(prompt=name)
+                raise DeadlineExceeded(f"Turn deadline exceeded waiting for the {name} call")
+            if len(attempts) == 1:
+                log(f"[hedge] {name} slower than {delay * 1000:.0f}ms, sending a duplicate request")
+                task = asyncio.ensure_future(duplicate())
+                attempts[task] = "hedge"
+                pending.add(task)
+    finally:
+        for task in attempts:
+            task.cancel()
+    if len(attempts) > 1:
+        metrics.LLM_HEDGES.inc(prompt=name, winner="none")
+    raise error
+
+
+class CircuitBreaker:
+    """
+    Shared by every client of CLIENT_POOL. "closed" lets calls through; `failures`
+    failed calls in a row make it "open" (calls fail fast) for `cooldown` seconds,
+    then "half_open" lets one trial call through, whose outcome closes or reopens it.
+    """
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def allow(self):
+        """Raises CircuitOpenError unless a call may be sent now."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self._transition("half_open")
+            if self.state == "closed" or (self.state == "half_open" and not self._trial_running):
+                self._trial_running = self.state == "half_open"
+                return
+            self._stats["rejected"] += 1
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(f"LLM circuit open after {self.failures} failed calls (trial call in {retry_in:.0f}s)", retry_after=retry_in)
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._trial_running = False
+            if self.state != "closed":
+                self._transition("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            self._trial_running = False
+            if self.state == "half_open" or (self.state == "closed" and self._consecutive >= self.failures):
+                self._opened_at = time.monotonic()
+                self._stats["opened"] += 1
+                self._transition("open")
+
+    def release(self):
+        """Ends an allowed call that neither succeeded nor failed (e.g. rejected by the scheduler)."""
+        with self._lock:
+            self._trial_running = False
+
+    def metrics(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._consecutive, **self._stats}
+
+    def _transition(self, state):
+        log(f"[circuit] {self.state} -> {state}")
+        self.state = state
+        metrics.LLM_CIRCUIT_TRANSITIONS.inc(state=state)
+
+
+def breaker_from_env():
+    """The process-wide breaker, or None when BREAKER_FAILURES is 0."""
+    return CircuitBreaker() if BREAKER_FAILURES > 0 else None
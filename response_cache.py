@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Opt-in cache of Gemini responses keyed on the rendered prompt, model name and generation config.
+    A bounded in-memory LRU with TTL sits in front of an optional SQLite file,
+    which survives restarts and is shared by every worker pointing at the same path.
+    """
+    def __init__(self, max_entries=1024, ttl=3600, db_path=None, excluded_prompts=()):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.excluded_prompts = set(excluded_prompts)
+
+        self._entries = OrderedDict()  # key -> (expires_at, response)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"hits": 0, "persistent_hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "stores": 0}
+
+        if db_path:
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+
+    @staticmethod
+    def make_key(prompt, model_name, generation_config=None):
+        """Hash of everything that determines the response."""
+        digest = hashlib.sha256()
+        digest.update(model_name.encode())
+        digest.update(b"\0")
+        digest.update(json.dumps(generation_config or {}, sort_keys=True).encode())
+        digest.update(b"\0")
+        digest.update(prompt.encode())
+        return digest.hexdigest()
+
+    def is_cacheable(self, prompt_name):
+        return prompt_name not in self.excluded_prompts
+
+    def get(self, key):
+        """Returns the cached response or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+        if self.db_path:
+            row = self._connection().execute(
+                "SELECT response, expires_at FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                self._remember(key, row[0], row[1])
+                with self._lock:
+                    self._stats["persistent_hits"] += 1
+                return row[0]
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, key, response):
+        expires_at = time.time() + self.ttl
+        self._remember(key, response, expires_at)
+        with self._lock:
+            self._stats["stores"] += 1
+        if self.db_path:
+            with self._connection() as conn:
+                conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, response, expires_at))
+
+    def purge_expired(self):
+        """Drops expired entries from the persistent tier. Returns the number removed."""
+        if not self.db_path:
+            return 0
+        with self._connection() as conn:
+            return conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["persistent_hits"] + stats["misses"]
+        stats["hit_rate"] = ((stats["hits"] + stats["persistent_hits"]) / lookups) if lookups else 0.0
+        return stats
+
+    def _remember(self, key, response, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _connection(self):
+        """One SQLite connection per thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def from_env():
+    """
+    Builds the cache from environment variables, or returns None when caching is off.
+
+    RESPONSE_CACHE=1 enables it; RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL (seconds),
+    RESPONSE_CACHE_DB (SQLite path for the persistent tier) and RESPONSE_CACHE_EXCLUDE
+    (comma-separated prompt names, e.g. QUESTION_GENERATION_PROMPT) tune it.
+    """
+    if os.environ.get("RESPONSE_CACHE", "0") != "1":
+        return None
+    excluded = [name.strip() for name in os.environ.get("RESPONSE_CACHE_EXCLUDE", "").split(",") if name.strip()]
+    return ResponseCache(
+        max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", "1024")),
+        ttl=float(os.environ.get("RESPONSE_CACHE_TTL", "3600")),
+        db_path=os.environ.get("RESPONSE_CACHE_DB") or None,
+        excluded_prompts=excluded,
+    )
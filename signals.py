@@ -0,0 +1,137 @@
+"""
+Bounded, frequency- and recency-ranked aggregation of analysis signals.
+
+Every response analysis reports a few observed strengths and weaknesses as
+free-text phrases ("clear communication", "Communicates clearly", ...). A
+SignalAggregator folds near-duplicate phrases into one entry, weights each
+entry by how often and how recently it was observed, and keeps at most
+`capacity` entries, evicting the long tail. top() is deterministic, so the
+same observations always put the same phrases, in the same order, into the
+question prompt.
+"""
+import re
+
+# Weight kept per turn by an entry that is not observed again (recency)
+DECAY = 0.95
+# Token-set Jaccard similarity at which two phrases count as the same signal
+SIMILARITY = 0.6
+# Characters of a word kept by stem()
+STEM_LENGTH = 6
+
+WORD = re.compile(r"[a-z0-9+#]+")
+# Words that do not change what a signal is about
+STOPWORDS = frozenset((
+    "a", "an", "the", "of", "and", "or", "in", "on", "at", "to", "for", "with", "about", "when", "while",
+    "is", "are", "was", "be", "shows", "showed", "demonstrates", "demonstrated", "has", "had", "some",
+    "very", "really", "quite", "somewhat", "fairly", "rather", "highly", "overall", "candidate", "their",
+))
+
+
+def stem(word):
+    """Prefix stemming: "communicates", "communication" and "communicating" all become "commun"."""
+    if word.endswith("ly") and len(word) > 5:
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        word = word[:-1]
+    return word if any(char.isdigit() for char in word) else word[:STEM_LENGTH]
+
+
+def normalize(phrase):
+    """The set of stemmed content words of a phrase (empty for blank phrases)."""
+    words = WORD.findall(phrase.lower())
+    return frozenset(stem(word) for word in words if word not in STOPWORDS) or frozenset(words)
+
+
+class SignalAggregator:
+    """
+    Ranked signals for one conversation.
+    Each entry is [label, count, weight, last_turn, first_turn]: the first phrase seen
+    for the signal, how often it was observed, its decayed weight as of last_turn, and
+    the turns it was last and first observed in.
+    """
+    def __init__(self, capacity=20, decay=DECAY, similarity=SIMILARITY):
+        self.capacity = capacity
+        self.decay = decay
+        self.similarity = similarity
+        self.turn = 0
+        self._entries = []
+        self._keys = []  # normalize(label) of each entry, in the same order
+
+    def observe(self, phrases):
+        """Records the phrases of one analysis (one turn); repeats within the turn count once."""
+        self.turn += 1
+        seen = set()
+        for phrase in phrases:
+            if not isinstance(phrase, str) or not phrase.strip():
+                continue
+            key = normalize(phrase)
+            index = self._find(key)
+            if index is None:
+                self._entries.append([phrase.strip(), 1, 1.0, self.turn, self.turn])
+                self._keys.append(key)
+                seen.add(len(self._entries) - 1)
+            elif index not in seen:
+                seen.add(index)
+                entry = self._entries[index]
+                entry[1] += 1
+                entry[2] = round(self._weight(entry) + 1.0, 6)
+                entry[3] = self.turn
+        self._trim()
+
+    def top(self, k=3):
+        """
+        The labels of the k highest-ranked signals, listed in the order they were first
+        observed, so a reshuffle among the top k does not change the prompt.
+        """
+        selected = sorted(self._entries, key=self._rank)[:k]
+        return [entry[0] for entry in sorted(selected, key=lambda entry: (entry[4], entry[0]))]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def to_state(self):
+        """Compact JSON-ready state: {"t": turn, "e": [[label, count, weight, last_turn, first_turn], ...]}."""
+        return {"t": self.turn, "e": [list(entry) for entry in self._entries]}
+
+    @classmethod
+    def from_state(cls, data, capacity=20):
+        """Restores to_state() output; a plain list of phrases (the old format) is replayed one turn each."""
+        aggregator = cls(capacity=capacity)
+        if isinstance(data, list):
+            for phrase in data:
+                aggregator.observe([phrase])
+            return aggregator
+        data = data or {}
+        aggregator.turn = data.get("t", 0)
+        aggregator._entries = [list(entry) for entry in data.get("e", [])]
+        aggregator._keys = [normalize(entry[0]) for entry in aggregator._entries]
+        aggregator._trim()
+        return aggregator
+
+    def _weight(self, entry):
+        """The entry's weight decayed to the current turn."""
+        return entry[2] * self.decay ** (self.turn - entry[3])
+
+    def _rank(self, entry):
+        # Heaviest first; ties go to the more frequent, then the older, then the alphabetically first signal
+        return (-round(self._weight(entry), 6), -entry[1], entry[4], entry[0])
+
+    def _find(self, key):
+        """Index of the entry the key belongs to: an exact match, else the most similar one above the threshold."""
+        best, best_score = None, self.similarity
+        for index, other in enumerate(self._keys):
+            if other == key:
+                return index
+            score = len(key & other) / len(key | other) if key or other else 0.0
+            if score >= best_score and (best is None or score > best_score):
+                best, best_score = index, score
+        return best
+
+    def _trim(self):
+        """Evicts the lowest-ranked entries beyond capacity."""
+        if len(self._entries) <= self.capacity:
+            return
+        kept = sorted(range(len(self._entries)), key=lambda i: self._rank(self._entries[i]))[:self.capacity]
+        kept.sort()  # Keep insertion order, so the state stays stable between turns
+        self._entries = [self._entries[i] for i in kept]
+        self._keys = [self._keys[i] for i in kept]
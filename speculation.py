@@ -0,0 +1,80 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Branches in the order we guess them before any real actions have been observed.
+DEFAULT_BRANCH_ORDER = ["maintain_difficulty", "probe_deeper", "increase_difficulty", "decrease_difficulty"]
+
+
+class SpeculationStats:
+    """
+    Process-wide counters for speculative question generation.
+    Also tracks how often each suggested_action is returned so the most likely
+    branches are the ones we speculate on.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.hits = 0
+        self.misses = 0
+        self.launched = 0
+        self.wasted_calls = 0
+        self.cancelled = 0
+        self.action_counts = {action: 0 for action in DEFAULT_BRANCH_ORDER}
+
+    def likely_branches(self, limit):
+        """Returns up to `limit` actions, most frequently observed first."""
+        with self._lock:
+            counts = dict(self.action_counts)
+        ranked = sorted(DEFAULT_BRANCH_ORDER, key=lambda a: (-counts[a], DEFAULT_BRANCH_ORDER.index(a)))
+        return ranked[:max(0, limit)]
+
+    def record(self, action, hit, launched, wasted, cancelled):
+        with self._lock:
+            self.turns += 1
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.launched += launched
+            self.wasted_calls += wasted
+            self.cancelled += cancelled
+            if action in self.action_counts:
+                self.action_counts[action] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / self.turns) if self.turns else 0.0,
+                "launched": self.launched,
+                "wasted_calls": self.wasted_calls,
+                "cancelled": self.cancelled,
+                "action_counts": dict(self.action_counts),
+            }
+
+
+STATS = SpeculationStats()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def max_branches():
+    """Number of question branches to speculate per turn (0 disables speculation)."""
+    try:
+        return max(0, int(os.environ.get("SPECULATIVE_BRANCHES", "0")))
+    except ValueError:
+        return 0
+
+
+def get_executor():
+    """Shared thread pool for the analysis call and speculative question calls."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.environ.get("SPECULATION_WORKERS", "16"))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculation")
+        return _executor
@@ -0,0 +1,203 @@
+"""
+Offline stand-in for the Gemini GenerativeModel (LLM_BACKEND=stub).
+
+Answers every prompt in prompts.py with plausible, schema-valid output chosen
+deterministically from the prompt text, after a simulated latency, and can
+inject 429s in the same format Gemini uses. Used for load tests and local runs
+without an API key; no network access is made.
+
+Configuration:
+    STUB_LATENCY_MS     median latency, either one number ("400") or per call kind
+                        ("question=600,analysis=300,report=2500,default=400")
+    STUB_LATENCY_SIGMA  spread of the log-normal latency (0 for a fixed latency)
+    STUB_429_RATE       probability of a call failing with a 429 (0 to 1)
+    STUB_ERROR_RATE     probability of a call failing with a 500, which is not retried (0 to 1)
+    STUB_SEED           seed for latencies and injected errors
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+# Call kinds, recognised from the rendered prompt
+KIND_MARKERS = (
+    ("analysis_batch", "Output a valid JSON array only"),
+    ("analysis", "evaluating the candidate's latest response"),
+    ("report", "generating a candidate profile report"),
+    ("evaluation", "reviewing a completed persona-based interview"),
+)
+DIMENSION_KEYS = ("logical_thinking", "communication", "adaptability")
+ACTIONS = ("increase_difficulty", "maintain_difficulty", "decrease_difficulty", "probe_deeper")
+
+QUESTIONS = (
+    "Walk me through how you would diagnose a service whose latency doubled overnight without any deploys.",
+    "Describe a time you had to change your approach halfway through a task. What made you change course?",
+    "How would you explain the trade-offs of your last major design decision to a non-technical stakeholder?",
+    "If the requirements for a feature you were building changed the day before release, how would you handle it?",
+    "Tell me about a bug that took you the longest to find. How did you finally narrow it down?",
+    "How would you split a slow, monolithic job into pieces that can fail and retry independently?",
+    "What would you check first if a teammate reported that your change broke their workflow?",
+    "How do you decide when a piece of code is good enough to ship versus worth another iteration?",
+)
+STRENGTHS = ("structured reasoning", "clear examples", "considers trade-offs", "concise communication",
+             "adapts to constraints", "asks clarifying questions")
+WEAKNESSES = ("limited depth", "few concrete examples", "skips edge cases", "vague on testing",
+              "unstructured explanation", "does not state assumptions")
+TRAITS = ("analytical", "pragmatic", "methodical", "collaborative", "curious", "cautious")
+
+
+class StubResponse:
+    """Mimics the parts of a Gemini response the client uses."""
+    def __init__(self, text):
+        self.text = text
+
+
+class LatencyModel:
+    """Log-normal latency per call kind (median in milliseconds)."""
+    def __init__(self, medians, sigma=0.4):
+        self.medians = medians
+        self.sigma = sigma
+
+    @classmethod
+    def parse(cls, spec, sigma):
+        medians = {}
+        for part in spec.split(","):
+            kind, _, value = part.strip().rpartition("=")
+            medians[kind or "default"] = float(value)
+        medians.setdefault("default", 400.0)
+        return cls(medians, sigma)
+
+    def sample(self, kind, rng):
+        median = self.medians.get(kind, self.medians["default"]) / 1000
+        if self.sigma <= 0:
+            return median
+        return rng.lognormvariate(0, self.sigma) * median
+
+
+class StubModel:
+    """
+    Drop-in for google.generativeai.GenerativeModel: generate_content(prompt, stream=False)
+    and generate_content_async(prompt). A request_options timeout shorter than the drawn
+    latency fails the call with a 504 after the timeout, as the real API does.
+    """
+    def __init__(self, model_name="stub", generation_config=None, latency=None, error_rate=None, seed=None, system_instruction=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.latency = latency or LatencyModel.parse(
+            os.environ.get("STUB_LATENCY_MS", "400"), float(os.environ.get("STUB_LATENCY_SIGMA", "0.4"))
+        )
+        self.error_rate = float(os.environ.get("STUB_429_RATE", "0")) if error_rate is None else error_rate
+        self.server_error_rate = float(os.environ.get("STUB_ERROR_RATE", "0"))
+        self._rng = random.Random(int(os.environ.get("STUB_SEED", "0")) if seed is None else seed)
+        self._rng_lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        prompt = self._prompt_text(prompt)
+        kind = self._kind(prompt)
+        delay = self._before_call(kind)
+        timeout = self._timeout(request_options)
+        if timeout is not None and timeout < delay:
+            time.sleep(timeout)
+            raise Exception("504 Deadline Exceeded (stub)")
+        time.sleep(delay)
+        text = self.respond(prompt, kind)
+        if stream:
+            return self._stream(text)
+        return StubResponse(text)
+
+    async def generate_content_async(self, prompt, request_options=None):
+        prompt = self._prompt_text(prompt)
+        kind = self._kind(prompt)
+        delay = self._before_call(kind)
+        timeout = self._timeout(request_options)
+        if timeout is not None and timeout < delay:
+            await asyncio.sleep(timeout)
+            raise Exception("504 Deadline Exceeded (stub)")
+        await asyncio.sleep(delay)
+        return StubResponse(self.respond(prompt, kind))
+
+    def respond(self, prompt, kind=None):
+        """The response text for a prompt; the same prompt always gets the same answer."""
+        kind = kind or self._kind(prompt)
+        rng = random.Random(hashlib.sha256(prompt.encode()).digest())
+        if kind == "analysis":
+            return json.dumps(self._analysis(rng))
+        if kind == "analysis_batch":
+            match = re.search(r"exactly (\d+) objects", prompt)
+            count = int(match.group(1)) if match else 1
+            return json.dumps([{"item": index, **self._analysis(rng)} for index in range(1, count + 1)])
+        if kind in ("report", "evaluation"):
+            return "```json\n" + json.dumps(self._report(rng, kind), indent=2) + "\n```"
+        return rng.choice(QUESTIONS)
+
+    def _prompt_text(self, prompt):
+        """The prompt as text: a string as is, chat contents joined after the system instruction."""
+        if isinstance(prompt, str):
+            return prompt
+        turns = "\n".join(part for content in prompt for part in content["parts"])
+        return f"{self.system_instruction}\n{turns}" if self.system_instruction else turns
+
+    @staticmethod
+    def _timeout(request_options):
+        return (request_options or {}).get("timeout")
+
+    def _before_call(self, kind):
+        """Draws the latency for this call and raises an injected 429 or 500 after it."""
+        with self._rng_lock:
+            delay = self.latency.sample(kind, self._rng)
+            fail = self._rng.random() < self.error_rate
+            server_error = self._rng.random() < self.server_error_rate
+            retry_in = round(self._rng.uniform(0.5, 2.0), 1)
+        if server_error:
+            time.sleep(min(delay, 0.05))
+            raise Exception("500 An internal error has occurred (stub).")
+        if fail:
+            time.sleep(min(delay, 0.05))
+            raise Exception(f"429 Resource has been exhausted (stub). Please retry in {retry_in}s.")
+        return delay
+
+    def _stream(self, text):
+        """Yields the text in word-sized chunks, spreading a little latency over them."""
+        words = re.findall(r"\S+\s*", text)
+        for start in range(0, len(words), 4):
+            time.sleep(0.01)
+            yield StubResponse("".join(words[start:start + 4]))
+
+    @staticmethod
+    def _kind(prompt):
+        for kind, marker in KIND_MARKERS:
+            if marker in prompt:
+                return kind
+        return "question"
+
+    @staticmethod
+    def _analysis(rng):
+        return {
+            "quality_score": rng.randint(1, 5),
+            "observed_strengths": rng.sample(STRENGTHS, 2),
+            "observed_weaknesses": rng.sample(WEAKNESSES, 1),
+            "suggested_action": rng.choice(ACTIONS),
+        }
+
+    @staticmethod
+    def _report(rng, kind):
+        scores = {
+            key: {"score": rng.randint(2, 5), "justification": f"Consistent {key.replace('_', ' ')} across the answers."}
+            for key in DIMENSION_KEYS
+        }
+        report = {
+            "scores": scores,
+            "strengths": rng.sample(STRENGTHS, 2),
+            "improvement_areas": rng.sample(WEAKNESSES, 2),
+        }
+        if kind == "evaluation":
+            report["overall_assessment"] = "The candidate reasoned through most questions and responded well to follow-ups."
+            return report
+        report["profile_summary"] = "Practical engineer who explains decisions clearly and adapts when constraints change."
+        report["behavioral_traits"] = rng.sample(TRAITS, 3)
+        report["overall_recommendation"] = rng.choice(("Recommended", "Recommended with reservations", "Not recommended yet"))
+        return report
@@ -0,0 +1,122 @@
+import os
+
+from metrics import log
+import prompt_templates
+from prompts import prompt_name
+
+# Rough estimate for English prose with Gemini's tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def clip_text(text, max_tokens):
+    """Cuts text to roughly max_tokens, marking the cut."""
+    max_chars = max(0, max_tokens) * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    marker = " ...[truncated]"
+    return text[:max(0, max_chars - len(marker))] + marker
+
+
+class TranscriptBuffer:
+    """
+    Interview transcript built incrementally from the history, plus one compact
+    summary per analysed turn. When the full transcript does not fit a budget,
+    older turns are replaced by their summaries and the latest turns stay verbatim.
+    """
+    def __init__(self, summaries=None):
+        self.lines = []
+        # [index of the first line after the summarised turn, summary text]
+        self.summaries = summaries or []
+
+    def sync(self, history):
+        """Formats any history entries not seen yet."""
+        for msg in history[len(self.lines):]:
+            role = "Interviewer" if msg['role'] == "system" else "Candidate"
+            self.lines.append(f"{role}: {msg['content']}\n\n")
+
+    def add_summary(self, summary):
+        """Summarises every line up to now (call after syncing the answer being analysed)."""
+        self.summaries.append([len(self.lines), summary])
+
+    def render(self, max_tokens=None):
+        """The transcript, compacted to fit max_tokens when given."""
+        full = "".join(self.lines)
+        if max_tokens is None or estimate_tokens(full) <= max_tokens:
+            return full
+
+        # Try cut points at turn boundaries, oldest first, so as much as possible stays verbatim
+        budget_chars = max_tokens * CHARS_PER_TOKEN
+        tail_chars = [0] * (len(self.lines) + 1)
+        for i in range(len(self.lines) - 1, -1, -1):
+            tail_chars[i] = tail_chars[i + 1] + len(self.lines[i])
+        header = "Summary of earlier turns:\n"
+        summary_chars = len(header)
+        for count, (end, summary) in enumerate(self.summaries, 1):
+            summary_chars += len(summary) + 1
+            if summary_chars + tail_chars[end] <= budget_chars:
+                return self._compose(self.summaries[:count], end)
+
+        # Even the latest turns alone do not fit: keep the newest summaries and clip the rest
+        end = self.summaries[-1][0] if self.summaries else len(self.lines)
+        tail = "".join(self.lines[end:])
+        kept = []
+        remaining = budget_chars - len(tail) - len(header)
+        for summary in reversed(self.summaries):
+            remaining -= len(summary[1]) + 1
+            if remaining < 0:
+                break
+            kept.insert(0, summary)
+        return clip_text(self._compose(kept, end), max_tokens)
+
+    def _compose(self, summaries, end):
+        parts = []
+        if summaries:
+            parts.append("Summary of earlier turns:\n")
+            parts.extend(f"{summary}\n" for _, summary in summaries)
+            parts.append("\nMost recent turns:\n\n")
+        parts.extend(self.lines[end:])
+        return "".join(parts)
+
+
+class TokenBudget:
+    """
+    Keeps every prompt the controller sends under a token ceiling by shrinking
+    its elastic variables (long answers, the transcript) and logs the estimate per prompt.
+    """
+    def __init__(self, max_tokens=None):
+        if max_tokens is None:
+            max_tokens = int(os.environ.get("PROMPT_TOKEN_BUDGET", "6000"))
+        self.max_tokens = max_tokens
+
+    def fit(self, prompt, context_vars, elastic):
+        """
+        Returns a copy of context_vars whose `elastic` variables fit the budget.
+        An elastic value may be a string (clipped) or a callable taking a token budget
+        and returning the text (e.g. TranscriptBuffer.render).
+        """
+        template = prompt_templates.get_template(prompt)
+        fitted = dict(context_vars)
+        for name in elastic:
+            fitted[name] = ""
+        remaining = self.max_tokens - estimate_tokens(template.render(fitted))
+
+        # Smallest values first, each taking at most an even share of what is left
+        values = {name: context_vars[name] for name in elastic}
+        sizes = {name: estimate_tokens(value) if isinstance(value, str) else None for name, value in values.items()}
+        order = sorted(elastic, key=lambda name: (sizes[name] is None, sizes[name] or 0))
+        for i, name in enumerate(order):
+            share = max(0, remaining // (len(order) - i))
+            value = values[name]
+            fitted[name] = value(share) if callable(value) else clip_text(value, share)
+            remaining -= estimate_tokens(fitted[name])
+
+        total = self.max_tokens - remaining
+        log(f"[token-budget] {prompt_name(prompt)}: ~{total} tokens (budget {self.max_tokens})")
+        return fitted
+
+
+TOKEN_BUDGET = TokenBudget()